@@ -13,6 +13,7 @@ import os
 from pathlib import Path
 from decouple import config, Csv
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Load environment variables from .env
@@ -47,27 +48,45 @@ AUTH_USER_MODEL = 'web_app.CustomUser'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise, async capable so ASGI requests stay on the event loop
+    'web_app.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Lets audit events recorded during a request find its user and IP
+    'web_app.audit.AuditContextMiddleware',
+    # Staff users' Django admin permissions, resolved once per session
+    'web_app.access.AdminPermissionsMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request timings (Server-Timing headers, /administrator/metrics/)
+if config('PERF_MIDDLEWARE', default=False, cast=bool):
+    MIDDLEWARE.insert(0, 'web_app.perf.PerformanceMiddleware')
+
 ROOT_URLCONF = 'Web_Base.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timed for web_app.perf.PerformanceMiddleware
+        'BACKEND': 'web_app.perf.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'web_app' / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'web_app.context_processors.template_cache',
+            ],
+            # Compile each template once per process instead of on every
+            # render (what APP_DIRS=True does implicitly, spelled out)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
@@ -79,13 +98,108 @@ WSGI_APPLICATION = 'Web_Base.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DB_POOL=True (PostgreSQL only) hands connections out from a psycopg pool
+# shared by a worker's threads; Django requires CONN_MAX_AGE=0 with it.
+# Otherwise connections persist for DB_CONN_MAX_AGE seconds. Health checks
+# replace a connection that went stale while idle instead of failing the
+# first request on it.
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+
 DATABASES = {
     'default': dj_database_url.config(
         default=config('DATABASE_URL', default='sqlite:///db.sqlite3'),
-        conn_max_age=600
+        conn_max_age=0 if DB_POOL else config('DB_CONN_MAX_AGE', default=600, cast=int),
+        conn_health_checks=config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
     )
 }
 
+if DB_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        # Seconds a request waits for a free connection before erroring
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+        'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+        'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=3600, cast=float),
+    }
+
+
+# Cache (in-process by default; point CACHE_BACKEND/CACHE_LOCATION at e.g.
+# Redis to share throttling and cached data between workers)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+# Whether every worker sees the same cache. Anything invalidated by a
+# cache write (sessions, cached users, admin permission sets, the user
+# list API's ETags) needs this: an in-process cache is only cleared in the
+# worker that made the change.
+SHARED_CACHE = config(
+    'SHARED_CACHE', default=not CACHES['default']['BACKEND'].endswith('LocMemCache'), cast=bool)
+
+
+# Where sessions live: 'db' (Django's default), 'cached_db' (the table with
+# the cache in front), 'cache' (cache only, needs SHARED_CACHE) or
+# 'signed_cookies'.
+SESSION_MODE = config('SESSION_MODE', default='db')
+if SESSION_MODE not in ('db', 'cached_db', 'cache', 'signed_cookies'):
+    raise ImproperlyConfigured(f"Unknown SESSION_MODE {SESSION_MODE!r}.")
+if SESSION_MODE == 'cache' and not SHARED_CACHE:
+    raise ImproperlyConfigured(
+        "SESSION_MODE 'cache' needs a cache shared by every worker; "
+        "set CACHE_BACKEND or use 'cached_db'.")
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_MODE}'
+
+# Seconds the logged-in user is cached for AuthenticationMiddleware
+# (web_app.backends); saves and soft deletes invalidate it sooner. 0 reads
+# the user from the database on every request, the only option without
+# SHARED_CACHE.
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=300 if SHARED_CACHE else 0, cast=int)
+if AUTH_USER_CACHE_TIMEOUT and not SHARED_CACHE:
+    raise ImproperlyConfigured(
+        "AUTH_USER_CACHE_TIMEOUT needs a cache shared by every worker, or a "
+        "deactivated user would stay logged in on the others; set it to 0.")
+
+
+# Rendered layout fragments ({% cache %} in base.html) and the anonymous
+# welcome page are cached this many seconds under TEMPLATE_CACHE_VERSION,
+# which defaults to the deployed commit so a release never serves old markup
+TEMPLATE_CACHE_TIMEOUT = config('TEMPLATE_CACHE_TIMEOUT', default=3600, cast=int)
+TEMPLATE_CACHE_VERSION = config('TEMPLATE_CACHE_VERSION', default=config('RENDER_GIT_COMMIT', default='dev'))
+
+
+# Dotted path to a web_app.search backend; empty picks one for the DB vendor
+USER_SEARCH_BACKEND = config('USER_SEARCH_BACKEND', default='')
+
+# Admin dashboard facet counts: cache lifetime in seconds, and the table
+# size (pg_class.reltuples, PostgreSQL only) above which searches are no
+# longer faceted and totals are estimated. Past that size the unsearched
+# option counts are recounted at most once per USER_FACETS_STALE_TIMEOUT
+# seconds, whatever changes in between
+USER_FACETS_CACHE_TIMEOUT = config('USER_FACETS_CACHE_TIMEOUT', default=60, cast=int)
+USER_FACETS_APPROXIMATE_OVER = config('USER_FACETS_APPROXIMATE_OVER', default=1_000_000, cast=int)
+USER_FACETS_STALE_TIMEOUT = config('USER_FACETS_STALE_TIMEOUT', default=600, cast=int)
+
+# Dashboard search typeahead: suggestions per term, and recent terms kept
+# in each worker's LRU
+USER_SUGGEST_LIMIT = config('USER_SUGGEST_LIMIT', default=10, cast=int)
+USER_SUGGEST_CACHE_SIZE = config('USER_SUGGEST_CACHE_SIZE', default=2048, cast=int)
+
+# Password hashing processes for CSV user imports (0 = hash in-process)
+USER_IMPORT_WORKERS = config('USER_IMPORT_WORKERS', default=2, cast=int)
+# Admin panel uploads are saved here and imported by a separate
+# `manage.py import_users --job` process (in the request when BACKGROUND is off)
+USER_IMPORT_DIR = config('USER_IMPORT_DIR', default=str(BASE_DIR / 'imports'))
+USER_IMPORT_BACKGROUND = config('USER_IMPORT_BACKGROUND', default=True, cast=bool)
+# Import processes allowed at once; further uploads are turned away
+USER_IMPORT_MAX_JOBS = config('USER_IMPORT_MAX_JOBS', default=1, cast=int)
+
+# Days a soft-deleted user is kept before purge_deleted_users archives and
+# hard deletes it
+USER_PURGE_RETENTION_DAYS = config('USER_PURGE_RETENTION_DAYS', default=90, cast=int)
 
 
 # Password validation
@@ -106,6 +220,59 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Django's defaults, with PBKDF2 timed for web_app.perf (same algorithm)
+PASSWORD_HASHERS = [
+    'web_app.perf.TimedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+AUTHENTICATION_BACKENDS = [
+    # ModelBackend whose async path hashes on web_app.hashing's worker pool
+    'web_app.backends.PooledModelBackend',
+]
+
+# Password hashing pool used by the async auth views: worker threads
+# (0 = one per CPU) and how many jobs may wait before requests get a 503
+PASSWORD_HASHING_WORKERS = config('PASSWORD_HASHING_WORKERS', default=0, cast=int)
+PASSWORD_HASHING_QUEUE = config('PASSWORD_HASHING_QUEUE', default=32, cast=int)
+
+# How start.sh serves the site: 'wsgi' (gunicorn sync workers) or 'asgi'
+# (gunicorn managing uvicorn workers that run Web_Base.asgi)
+SERVER_MODE = config('SERVER_MODE', default='wsgi')
+
+# Route login/register/admin login/admin create-user to their async
+# versions; serve through Web_Base.asgi to benefit from them
+ASYNC_AUTH_VIEWS = config('ASYNC_AUTH_VIEWS', default=SERVER_MODE == 'asgi', cast=bool)
+
+# Likewise for the welcome, home, logout and admin dashboard pages
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=SERVER_MODE == 'asgi', cast=bool)
+
+# Failed-login throttling (see web_app.throttle): sliding window in seconds,
+# failures allowed per IP / per username, then an exponential lockout.
+# TRUSTED_PROXIES is how many proxies (e.g. Render's) add X-Forwarded-For.
+LOGIN_THROTTLE = {
+    'CACHE': 'default',
+    'WINDOW': config('LOGIN_THROTTLE_WINDOW', default=300, cast=int),
+    'IP_LIMIT': config('LOGIN_THROTTLE_IP_LIMIT', default=20, cast=int),
+    'USERNAME_LIMIT': config('LOGIN_THROTTLE_USERNAME_LIMIT', default=5, cast=int),
+    'LOCKOUT_BASE': 30,
+    'LOCKOUT_MAX': 3600,
+    'TRUSTED_PROXIES': config('TRUSTED_PROXIES', default=0, cast=int),
+}
+
+# Audit trail (see web_app.audit): events are queued in-process and written
+# by a background thread in batches of BATCH_SIZE, at least every
+# FLUSH_INTERVAL seconds; past QUEUE_SIZE waiting events new ones are dropped
+AUDIT_LOG = {
+    'BATCH_SIZE': config('AUDIT_LOG_BATCH_SIZE', default=500, cast=int),
+    'FLUSH_INTERVAL': config('AUDIT_LOG_FLUSH_INTERVAL', default=1.0, cast=float),
+    'QUEUE_SIZE': config('AUDIT_LOG_QUEUE_SIZE', default=10000, cast=int),
+    'BACKGROUND': True,
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -130,7 +297,21 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 # Add this for Render deployment
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # Minified, content hashed and precompressed (gzip and brotli) by an
+    # incremental collectstatic; WhiteNoise serves the hashed names as immutable
+    'staticfiles': {
+        'BACKEND': 'web_app.storage.MinifiedCompressedManifestStaticFilesStorage',
+    },
+}
+
+# An asset missing from the manifest fails the page in production, so a
+# skipped collectstatic is caught instead of serving uncached plain names;
+# in development (and tests) it is linked by its plain name
+WHITENOISE_MANIFEST_STRICT = config('WHITENOISE_MANIFEST_STRICT', default=not DEBUG, cast=bool)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
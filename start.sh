@@ -3,16 +3,22 @@
 # Move to script directory
 cd "$(dirname "$0")"
 
-# Load env vars (optional)
-export $(grep -v '^#' .env | xargs)
-
-# Print for debug
-echo "DATABASE_URL is: $DATABASE_URL"
+# Load env vars (optional; on Render they come from render.yaml)
+if [ -f .env ]; then
+    export $(grep -v '^#' .env | xargs)
+fi
 
 # Run Django commands
 python manage.py migrate
+# Incremental: unchanged assets are neither copied nor recompressed
 python manage.py collectstatic --noinput
 
-# Start server
+# Start server: SERVER_MODE=asgi runs uvicorn workers (and, through
+# settings, the async views); anything else the sync WSGI workers
 PORT=${PORT:-8000}
-gunicorn Web_Base.wsgi:application --bind 0.0.0.0:$PORT
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+    gunicorn Web_Base.asgi:application --bind 0.0.0.0:$PORT \
+        --worker-class uvicorn_worker.UvicornWorker
+else
+    gunicorn Web_Base.wsgi:application --bind 0.0.0.0:$PORT
+fi
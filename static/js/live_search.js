@@ -0,0 +1,91 @@
+// ------------------ Admin Dashboard Live Search ------------------
+// Suggests users by username/email prefix while the admin types in the
+// dashboard search box. Requests wait until typing pauses, a newer request
+// aborts the one still in flight, and answers are kept per term so
+// backspacing never refetches.
+
+const SUGGEST_DELAY_MS = 150;
+
+function initLiveSearch(input) {
+    const url = input.dataset.suggestUrl;
+    const list = input.parentElement.querySelector('[data-suggest-list]');
+    const answers = new Map();
+    let timer = null;
+    let controller = null;
+
+    function hide() {
+        list.classList.add('d-none');
+        list.replaceChildren();
+    }
+
+    function pick(username) {
+        input.value = username;
+        hide();
+        input.form.submit();
+    }
+
+    function show(results) {
+        list.replaceChildren();
+        results.forEach(function (user) {
+            const item = document.createElement('button');
+            item.type = 'button';
+            item.className = 'list-group-item list-group-item-action py-1';
+            const name = document.createElement('strong');
+            name.textContent = user.username;
+            const email = document.createElement('small');
+            email.className = 'text-muted ms-2';
+            email.textContent = user.email;
+            item.append(name, email);
+            // mousedown fires before the input's blur hides the list
+            item.addEventListener('mousedown', function (event) {
+                event.preventDefault();
+                pick(user.username);
+            });
+            list.append(item);
+        });
+        list.classList.toggle('d-none', results.length === 0);
+    }
+
+    async function fetchSuggestions(term) {
+        if (answers.has(term)) {
+            show(answers.get(term));
+            return;
+        }
+        if (controller) controller.abort();
+        controller = new AbortController();
+        try {
+            const response = await fetch(url + '?q=' + encodeURIComponent(term), {
+                signal: controller.signal,
+                headers: { 'Accept': 'application/json' },
+            });
+            if (!response.ok) return;
+            const data = await response.json();
+            answers.set(data.q, data.results);
+            // A slower, older answer must not replace what is being typed now
+            if (input.value.trim() === term) show(data.results);
+        } catch (error) {
+            if (error.name !== 'AbortError') throw error;
+        }
+    }
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        const term = input.value.trim();
+        if (!term) {
+            if (controller) controller.abort();
+            hide();
+            return;
+        }
+        timer = setTimeout(function () { fetchSuggestions(term); }, SUGGEST_DELAY_MS);
+    });
+
+    input.addEventListener('keydown', function (event) {
+        if (event.key === 'Escape') hide();
+    });
+
+    input.addEventListener('blur', hide);
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('input[data-suggest-url]').forEach(initLiveSearch);
+});
@@ -0,0 +1,219 @@
+"""
+Admin access checks for the custom admin panel and Django's admin.
+
+``admin_required`` replaces the ``login_required`` + ``user_passes_test``
+stack on the admin panel views. The role comes from the flags of
+``request.user``, which AuthenticationMiddleware has already loaded, so the
+check costs no query of its own. The role is left on
+``request.admin_role`` for templates.
+
+Django's admin also asks for the model permissions of staff users who are
+not superusers. ``ModelBackend`` resolves those with two queries (user and
+group permissions) on every request. ``AdminPermissionsMiddleware``
+resolves them once per session instead, stores them under
+``ADMIN_ACCESS_SESSION_KEY`` and hands them to the backend's
+``_perm_cache`` on later admin requests. Superusers need no permission set.
+
+The stored set carries the version counters it was resolved under. One
+counter is per user and is bumped when the user's is_active, is_staff or
+is_superuser flags, groups or permissions change. The other is global and
+is bumped when any group's permissions change, or a group is deleted. A
+stale set is resolved again on the next admin request.
+
+The counters live in the cache, so a bump is only seen by every worker when
+``settings.SHARED_CACHE`` is set. Without it the middleware is not used and
+Django resolves the permissions on every request, so a revoked permission
+never outlives the request that revoked it.
+"""
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from .models import CustomUser
+
+ADMIN_ACCESS_SESSION_KEY = 'admin_access'
+
+ROLE_FLAGS = ('is_active', 'is_staff', 'is_superuser')
+
+GLOBAL_VERSION_KEY = 'admin-access:v'
+
+
+def _user_version_key(user_id):
+    return f'admin-access:v:{user_id}'
+
+
+def admin_role(user):
+    """'superuser', 'staff' or None, from the user's flags alone."""
+    if not (user.is_authenticated and user.is_active and user.is_staff):
+        return None
+    return 'superuser' if user.is_superuser else 'staff'
+
+
+def _allowed(role, required):
+    return role == 'superuser' or (role == 'staff' and required == 'staff')
+
+
+def admin_required(view=None, *, role='superuser', login_url='admin_login'):
+    """
+    Let through active staff users holding ``role`` ('superuser' or
+    'staff'); send everyone else to ``login_url`` with ``?next=``.
+    """
+    def decorator(view_func):
+        def denied(request):
+            return redirect_to_login(request.get_full_path(), login_url)
+
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _view(request, *args, **kwargs):
+                user = await request.auser()
+                request.admin_role = admin_role(user)
+                if not _allowed(request.admin_role, role):
+                    return denied(request)
+                return await view_func(request, *args, **kwargs)
+        else:
+            @wraps(view_func)
+            def _view(request, *args, **kwargs):
+                request.admin_role = admin_role(request.user)
+                if not _allowed(request.admin_role, role):
+                    return denied(request)
+                return view_func(request, *args, **kwargs)
+        return _view
+
+    return decorator if view is None else decorator(view)
+
+
+# -- the per-session permission set --------------------------------------
+
+def _new_version():
+    return time.time_ns()
+
+
+def _versions(user_id):
+    keys = [GLOBAL_VERSION_KEY, _user_version_key(user_id)]
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        # A counter evicted from the cache must not read as unchanged
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump_user(*user_ids):
+    cache.set_many({_user_version_key(user_id): _new_version() for user_id in user_ids}, timeout=None)
+
+
+def bump_all():
+    cache.set(GLOBAL_VERSION_KEY, _new_version(), timeout=None)
+
+
+def admin_permissions(request):
+    """
+    The permission set of ``request.user`` as 'app_label.codename'
+    strings, from the session while its versions are current.
+    """
+    user = request.user
+    versions = _versions(user.pk)
+    stored = request.session.get(ADMIN_ACCESS_SESSION_KEY)
+    if stored and stored['user_id'] == user.pk and stored['versions'] == versions:
+        return set(stored['perms'])
+    perms = user.get_all_permissions()
+    request.session[ADMIN_ACCESS_SESSION_KEY] = {
+        'user_id': user.pk, 'versions': versions, 'perms': sorted(perms),
+    }
+    return perms
+
+
+def prime_permissions(request):
+    """Hand the session's permission set to ModelBackend for this request."""
+    if admin_role(request.user) == 'staff':
+        request.user._perm_cache = admin_permissions(request)
+
+
+class AdminPermissionsMiddleware:
+    """Serve staff users' admin permissions from their session."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SHARED_CACHE:
+            # Other workers would never see the version bumps
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self._prefix = None
+
+    def _is_admin_path(self, request):
+        if self._prefix is None:
+            self._prefix = reverse('admin:index')
+        return request.path_info.startswith(self._prefix)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if self._is_admin_path(request):
+            prime_permissions(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        # Django's admin is sync; other paths stay on the event loop
+        if self._is_admin_path(request):
+            await sync_to_async(prime_permissions)(request)
+        return await self.get_response(request)
+
+
+# -- invalidation ----------------------------------------------------------
+
+def _flags(user):
+    # Read from __dict__ so a deferred flag is never loaded just for this
+    return tuple(user.__dict__.get(flag) for flag in ROLE_FLAGS)
+
+
+@receiver(post_init, sender=CustomUser)
+def _remember_flags(sender, instance, **kwargs):
+    instance._role_flags = _flags(instance)
+
+
+@receiver(post_save, sender=CustomUser)
+def _user_saved(sender, instance, created, **kwargs):
+    flags = _flags(instance)
+    if not created and flags != getattr(instance, '_role_flags', None):
+        bump_user(instance.pk)
+    instance._role_flags = flags
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+@receiver(m2m_changed, sender=CustomUser.user_permissions.through)
+def _memberships_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        bump_user(instance.pk)
+    elif action == 'post_clear':
+        # The cleared users are no longer known; start everyone afresh
+        bump_all()
+    elif pk_set:
+        bump_user(*pk_set)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def _group_permissions_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_all()
+
+
+@receiver(post_delete, sender=Group)
+def _group_deleted(sender, **kwargs):
+    bump_all()
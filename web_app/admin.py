@@ -3,7 +3,7 @@ from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
-from .models import CustomUser
+from .models import AuditEvent, CustomUser
 
 
 @admin.register(CustomUser)
@@ -61,25 +61,22 @@ class CustomUserAdmin(UserAdmin):
 
     actions = ['soft_delete_selected', 'restore_selected']
 
+    # Each action is a chunked UPDATE (see CustomUserQuerySet.soft_delete)
+    # rather than a save() per row, and emits one batched signal. Django's
+    # "Select all N users" (select_across) hands them every row the current
+    # search and filters match, not just the page.
+
     def soft_delete_selected(self, request, queryset):
-        count = 0
-        for user in queryset:
-            if not user.is_deleted:
-                user.is_deleted = True
-                user.save()
-                count += 1
+        count = queryset.soft_delete()
         self.message_user(request, _(
             f"{count} user(s) soft deleted."), messages.SUCCESS)
 
     soft_delete_selected.short_description = "Soft delete selected users"
 
     def restore_selected(self, request, queryset):
-        count = 0
-        for user in queryset:
-            if user.is_deleted:
-                user.is_deleted = False
-                user.save()
-                count += 1
+        # Through all_objects: a queryset from the live-only manager would
+        # never hold a deleted row to restore
+        count = CustomUser.all_objects.filter(pk__in=queryset.values('pk')).restore()
         self.message_user(request, _(
             f"{count} user(s) restored."), messages.SUCCESS)
 
@@ -95,10 +92,33 @@ class CustomUserAdmin(UserAdmin):
     delete_action.short_description = 'Action'
 
     def get_queryset(self, request):
-        """Only show non-deleted users."""
+        """Only show non-deleted users, unless the is_deleted filter is used."""
         qs = super().get_queryset(request)
-        return qs.filter(is_deleted=False)
+        if 'is_deleted__exact' in request.GET:
+            return qs
+        return qs.alive()
 
     @admin.display(description='Gender')
     def display_gender(self, obj):
         return obj.get_gender_display()
+
+
+@admin.register(AuditEvent)
+class AuditEventAdmin(admin.ModelAdmin):
+    """Read-only view of the audit trail."""
+
+    list_display = ('created_at', 'action', 'actor', 'target', 'ip')
+    list_filter = ('action',)
+    list_select_related = ('actor', 'target')
+    search_fields = ('target__username', 'actor__username')
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
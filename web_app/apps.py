@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class WebAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'web_app'
+
+    def ready(self):
+        # Register signal receivers: cached user, admin permission and
+        # facet invalidation, the daily sign-up rollup, the audit trail and
+        # the database connect counter
+        from . import access, audit, backends, dbpool, facets, signups  # noqa: F401
@@ -0,0 +1,254 @@
+"""
+Audit trail of user lifecycle events, written off the request path.
+
+``record()`` only builds an ``AuditEvent`` and puts it on a bounded
+in-process queue. A background thread writes the queue with
+``bulk_create``. It wakes every ``FLUSH_INTERVAL`` seconds, or sooner once
+``BATCH_SIZE`` events are waiting, so a request never waits on an audit
+INSERT. A full queue drops the new event and counts it, rather than
+blocking the request. Whatever is still queued when the worker exits is
+written by an ``atexit`` hook. A worker killed outright (SIGKILL, OOM)
+loses at most one flush interval of events.
+
+Logins, failed logins and logouts come from Django's auth signals. Soft
+deletes and restores come from the batched ``users_soft_deleted`` and
+``users_restored`` signals, as one event per user. Those are also sent by
+the admin actions. Registrations, admin creates and admin edits are
+recorded by their views. ``AuditContextMiddleware`` makes the current
+request, and so the acting user and client IP, available to all of them.
+
+Configured by ``settings.AUDIT_LOG``. With ``BACKGROUND`` off, nothing is
+written until ``flush()`` is called. Tests use this mode, and anything else
+that must not write from a second thread.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connections
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import AuditEvent, CustomUser
+from .signals import users_restored, users_soft_deleted
+from .throttle import get_login_throttle
+
+logger = logging.getLogger(__name__)
+
+_request = ContextVar('web_app_audit_request', default=None)
+
+
+class AuditLog:
+    def __init__(self, batch_size=500, flush_interval=1.0, queue_size=10000, background=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.background = background
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self.stats = {'recorded': 0, 'dropped': 0, 'written': 0, 'flushes': 0, 'failed': 0}
+
+    def _count(self, stat, amount=1):
+        with self._stats_lock:
+            self.stats[stat] += amount
+
+    # -- producers ----------------------------------------------------------
+
+    def record(self, action, actor=None, target=None, request=None, **details):
+        """Queue one event; never touches the database."""
+        self.record_many(action, [target], actor=actor, request=request, **details)
+
+    def record_many(self, action, targets, actor=None, request=None, **details):
+        """Queue the same event for each of ``targets`` (users or pks)."""
+        request = request if request is not None else _request.get()
+        ip = None
+        if request is not None:
+            actor = actor if actor is not None else _authenticated(request)
+            ip = get_login_throttle().client_ip(request) or None
+        now = timezone.now()
+        for target in targets:
+            event = AuditEvent(
+                created_at=now, action=action, actor_id=_pk(actor), target_id=_pk(target),
+                ip=ip, details=details,
+            )
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                self._count('dropped')
+                continue
+            self._count('recorded')
+        if self.background:
+            self._ensure_writer()
+            if self._queue.qsize() >= self.batch_size:
+                self._wake.set()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    # -- the writer ---------------------------------------------------------
+
+    def _ensure_writer(self):
+        # A forked worker inherits the object but not the thread
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._flush_lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stopping:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                # Drop a connection that went stale (or too old) while idle
+                close_old_connections()
+                self.flush()
+        finally:
+            connections.close_all()
+
+    def flush(self):
+        """Write every queued event now, in this thread. Returns how many."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    break
+                try:
+                    AuditEvent.objects.bulk_create(batch)
+                except Exception:
+                    logger.exception('Dropped %d audit event(s)', len(batch))
+                    self._count('failed', len(batch))
+                    continue
+                written += len(batch)
+                self._count('written', len(batch))
+                self._count('flushes')
+        return written
+
+    def close(self):
+        """Stop the writer thread and write what is left."""
+        self._stopping = True
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=max(self.flush_interval, 1) * 5)
+        return self.flush()
+
+
+def _pk(user):
+    return user if isinstance(user, int) or user is None else user.pk
+
+
+def _authenticated(request):
+    user = getattr(request, 'user', None)
+    return user if user is not None and user.is_authenticated else None
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_audit_log():
+    """Return the process-wide AuditLog configured from settings."""
+    global _log
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                options = {key.lower(): value for key, value in settings.AUDIT_LOG.items()}
+                _log = AuditLog(**options)
+    return _log
+
+
+def record(action, actor=None, target=None, request=None, **details):
+    get_audit_log().record(action, actor=actor, target=target, request=request, **details)
+
+
+@atexit.register
+def _flush_on_exit():
+    # Without the background writer, writing is left to explicit flushes
+    if _log is not None and _log.background:
+        _log.close()
+
+
+@receiver(setting_changed)
+def _reset_audit_log(setting, **kwargs):
+    global _log
+    if setting == 'AUDIT_LOG':
+        _flush_on_exit()
+        _log = None
+
+
+class AuditContextMiddleware:
+    """Expose the current request to audit events recorded while it runs."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
+
+    async def __acall__(self, request):
+        token = _request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            _request.reset(token)
+
+
+# -- events from signals -------------------------------------------------
+
+@receiver(user_logged_in)
+def _logged_in(sender, request, user, **kwargs):
+    record('login', actor=user, target=user, request=request)
+
+
+@receiver(user_login_failed)
+def _login_failed(sender, credentials, request=None, **kwargs):
+    record('login_failed', request=request, username=credentials.get('username', ''))
+
+
+@receiver(user_logged_out)
+def _logged_out(sender, request, user, **kwargs):
+    if user is not None:
+        record('logout', actor=user, target=user, request=request)
+
+
+@receiver(users_soft_deleted, sender=CustomUser)
+def _users_soft_deleted(sender, pks, **kwargs):
+    get_audit_log().record_many('soft_deleted', pks)
+
+
+@receiver(users_restored, sender=CustomUser)
+def _users_restored(sender, pks, **kwargs):
+    get_audit_log().record_many('restored', pks)
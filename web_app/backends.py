@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .hashing import get_hashing_pool
+from .signals import users_bulk_created, users_restored, users_soft_deleted
+
+UserModel = get_user_model()
+
+
+def user_cache_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend whose async path verifies passwords on the hashing pool.
+
+    Django's own ``aauthenticate`` runs PBKDF2 directly in the event loop,
+    stalling every other request on the worker. ``HashingPoolSaturated``
+    propagates to the caller so the view can answer with a 503.
+
+    ``get_user()``, which AuthenticationMiddleware calls on every request,
+    is served from the cache for ``settings.AUTH_USER_CACHE_TIMEOUT``
+    seconds; any save or (soft) delete of the user drops the entry. A
+    timeout of 0 (the default without a shared cache) skips the cache.
+    """
+
+    def get_user(self, user_id):
+        if not settings.AUTH_USER_CACHE_TIMEOUT:
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = UserModel._default_manager.get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            cache.set(key, user, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        if not settings.AUTH_USER_CACHE_TIMEOUT:
+            return await super().aget_user(user_id)
+        key = user_cache_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            try:
+                user = await UserModel._default_manager.aget(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            await cache.aset(key, user, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        pool = get_hashing_pool()
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as known ones
+            await pool.amake_password(password)
+            return None
+
+        is_correct, must_update = await pool.averify_password(password, user.password)
+        if not is_correct:
+            return None
+        if must_update:
+            user.password = await pool.amake_password(password)
+            await user.asave(update_fields=['password'])
+        return user if self.user_can_authenticate(user) else None
+
+
+@receiver(post_save, sender=UserModel)
+@receiver(post_delete, sender=UserModel)
+def _forget_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
+
+
+@receiver(users_soft_deleted, sender=UserModel)
+@receiver(users_restored, sender=UserModel)
+@receiver(users_bulk_created, sender=UserModel)
+def _forget_users(sender, pks, **kwargs):
+    cache.delete_many([user_cache_key(pk) for pk in pks])
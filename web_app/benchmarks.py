@@ -0,0 +1,551 @@
+"""
+Helpers shared by the benchmark management commands.
+
+Benchmarks run against a throwaway test database created from the current
+migrations, never against the configured database's data.
+``generate_users()`` fills a database with synthetic users and is also
+behind ``manage.py generate_users``.
+"""
+import asyncio
+import math
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from importlib import import_module, reload
+from itertools import product
+from queue import Empty, SimpleQueue
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.db.models.functions import Length, Lower
+from django.test import Client, RequestFactory, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import clear_url_caches, reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .dbpool import connects
+from .models import CustomUser
+from .signals import users_bulk_created
+
+# Rough shape of a real sign-up base; None is a field left blank
+GENDER_WEIGHTS = {'Male': 47, 'Female': 47, 'Other': 3, None: 3}
+MARITAL_WEIGHTS = {'Single': 52, 'Married': 41, None: 7}
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    """Create a scratch test database for the duration of the block."""
+    setup_test_environment()
+    connection = connections['default']
+    test_settings = connection.settings_dict['TEST']
+    test_name = test_settings.get('NAME')
+    tmpdir = None
+    try:
+        if connection.vendor == 'sqlite':
+            # A file rather than shared-cache memory, so concurrent threads
+            # behave like they would against a real database file.
+            tmpdir = tempfile.mkdtemp(prefix='bench-')
+            test_settings['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(
+            verbosity=verbosity, autoclobber=True, serialize=False)
+        try:
+            yield connection
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+    finally:
+        # Later test databases in this process get their usual name back
+        test_settings['NAME'] = test_name
+        teardown_test_environment()
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def reload_urlconf():
+    """Re-import the URLconf after changing a setting that urls.py reads."""
+    reload(import_module('web_app.urls'))
+    reload(import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed):
+    """Latency percentiles (ms) and throughput for one benchmark run."""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _next_synthetic_number(prefix):
+    # Not a count: purged users leave gaps below the highest number in use.
+    # Usernames are unique ignoring case, so 'Synth1' takes 'synth1' too.
+    last = (
+        CustomUser.all_objects.filter(username__iregex=rf'^{re.escape(prefix)}[0-9]+$')
+        .order_by(Length('username').desc(), Lower('username').desc())
+        .values_list('username', flat=True).first()
+    )
+    return int(last[len(prefix):]) + 1 if last else 0
+
+
+def generate_users(count, deleted_fraction=0.05, prefix='synth', password='SynthPass123',
+                   batch_size=5000, days=3 * 365, seed=None):
+    """
+    Insert ``count`` synthetic users with ``bulk_create`` and return how many
+    were created.
+
+    Every user gets the same password, hashed once. ``date_joined`` is spread
+    over the last ``days`` days, skewed towards recent sign-ups. A
+    ``deleted_fraction`` of the rows is created soft deleted. Usernames are
+    ``<prefix><n>``, numbered on from the highest ``n`` already taken.
+    """
+    rng = random.Random(seed)
+    encoded = make_password(password)
+    now = timezone.now()
+    today = date.today()
+    start = _next_synthetic_number(prefix)
+
+    pks = []
+    while len(pks) < count:
+        users = []
+        for n in range(start + len(pks), start + min(count, len(pks) + batch_size)):
+            username = f'{prefix}{n:07d}'
+            age_days = int(rng.triangular(18, 80, 30) * 365.25)
+            joined_days_ago = rng.triangular(0, days, 0)
+            deleted = rng.random() < deleted_fraction
+            users.append(CustomUser(
+                username=username,
+                email=f'{username}@example.test',
+                password=encoded,
+                dob=today - timedelta(days=age_days),
+                gender=_weighted(rng, GENDER_WEIGHTS),
+                marital_status=_weighted(rng, MARITAL_WEIGHTS),
+                is_active=rng.random() < 0.9,
+                is_staff=rng.random() < 0.01,
+                agree_to_terms=True,
+                is_deleted=deleted,
+                date_joined=now - timedelta(days=joined_days_ago),
+                # Some time between joining and now
+                deleted_at=now - timedelta(days=rng.uniform(0, joined_days_ago)) if deleted else None,
+            ))
+        pks.extend(user.pk for user in CustomUser.all_objects.bulk_create(users))
+    # bulk_create skips post_save; let caches and indexes catch up in one go
+    users_bulk_created.send(sender=CustomUser, pks=pks)
+    return len(pks)
+
+
+DASHBOARD_FILTERS = {
+    'search': ('', 'synth00', 'example'),
+    'gender': ('', 'Male', 'Female', 'Other'),
+    'marital_status': ('', 'Single', 'Married'),
+    'is_active': ('', 'Yes', 'No'),
+    'is_staff': ('', 'Yes', 'No'),
+    'is_superuser': ('', 'Yes', 'No'),
+    'ordering': ('-date_joined', 'date_joined'),
+}
+
+
+def dashboard_combinations():
+    """Every combination of the dashboard filters, as query-string dicts."""
+    fields = list(DASHBOARD_FILTERS)
+    for values in product(*DASHBOARD_FILTERS.values()):
+        yield {field: value for field, value in zip(fields, values) if value}
+
+
+def _timed(requests):
+    latencies, statuses = [], {}
+    started = time.perf_counter()
+    for send in requests:
+        t0 = time.perf_counter()
+        response = send()
+        if response.streaming:
+            b''.join(response.streaming_content)
+        latencies.append(time.perf_counter() - t0)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    result = summarize(latencies, time.perf_counter() - started)
+    result['status_codes'] = {str(code): n for code, n in sorted(statuses.items())}
+    return result
+
+
+def run_view_benchmarks(requests=100, password='SynthPass123', combinations=None):
+    """
+    Drive login, register, home and the admin dashboard through the test
+    client and return a summary per scenario. The database must already hold
+    a ``benchadmin`` superuser and ``benchuser`` with ``password``.
+
+    The dashboard scenario requests each filter combination once
+    (``combinations`` limits how many).
+    """
+    member = Client()
+    member.force_login(CustomUser.objects.get(username='benchuser'))
+    admin = Client()
+    admin.force_login(CustomUser.objects.get(username='benchadmin'))
+    run_id = time.time_ns()
+
+    def login():
+        return Client().post(reverse('login'), {'username': 'benchuser', 'password': password})
+
+    def register(n):
+        return Client().post(reverse('register'), {
+            'username': f'bench{run_id}x{n}', 'email': f'bench{run_id}x{n}@example.test',
+            'password1': password, 'password2': password,
+            'gender': 'Other', 'marital_status': 'Single', 'terms': 'on',
+        })
+
+    dashboard = reverse('admin_dashboard')
+    combos = list(dashboard_combinations())[:combinations]
+    return {
+        'login': _timed(login for _ in range(requests)),
+        'register': _timed((lambda n=n: register(n)) for n in range(requests)),
+        'home': _timed((lambda: member.get(reverse('home'))) for _ in range(requests)),
+        'admin_dashboard': {
+            'combinations': len(combos),
+            **_timed((lambda q=q: admin.get(dashboard, q)) for q in combos),
+        },
+    }
+
+
+def run_concurrency_check(user, threads=8, requests=25, url_name='home'):
+    """
+    Have ``threads`` clients, each logged in as ``user``, request
+    ``url_name`` ``requests`` times concurrently. Returns latencies, errors
+    and how many connections were opened for it.
+    """
+    latencies, errors = [], []
+    start_gate = threading.Barrier(threads)
+    url = reverse(url_name)
+    # Log in up front, one at a time: concurrent session inserts would
+    # contend for the table before the measured part even starts
+    clients = []
+    for _ in range(threads):
+        client = Client()
+        client.force_login(user)
+        clients.append(client)
+
+    def worker(client):
+        try:
+            start_gate.wait(timeout=30)
+        except threading.BrokenBarrierError:
+            pass
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            # The test client skips the connection housekeeping a real
+            # request gets at its start and end; do it here.
+            close_old_connections()
+            try:
+                response = client.get(url)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+            except Exception as exc:  # report, don't kill the run
+                errors.append(repr(exc))
+            close_old_connections()
+            latencies.append(time.perf_counter() - t0)
+        # Return this thread's connection (to the pool, or close it)
+        connections.close_all()
+
+    before = connects()
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    opened = connects() - before
+    served = threads * requests
+    return {
+        'threads': threads,
+        'requests': served,
+        'connects': opened,
+        'reuse_ratio': round(max(0.0, 1 - opened / served), 3) if served else 0.0,
+        'errors': errors[:20],
+        'error_count': len(errors),
+        'latencies': latencies,
+        'elapsed': elapsed,
+    }
+
+
+# Page name: (template, rendered for a logged-in user)
+RENDER_PAGES = {
+    'welcome': ('welcome.html', False),
+    'login': ('login.html', False),
+    'home': ('home.html', True),
+}
+
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def _template_backend(cached):
+    """The configured template backend, with or without the cached loader."""
+    config = settings.TEMPLATES[0]
+    loaders = [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)] if cached else TEMPLATE_LOADERS
+    return import_string(config['BACKEND'])({
+        'NAME': 'benchmark',
+        'DIRS': config['DIRS'],
+        'APP_DIRS': False,
+        'OPTIONS': {**config['OPTIONS'], 'loaders': loaders},
+    })
+
+
+def _renders(render, count):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(count):
+        t0 = time.perf_counter()
+        render()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def run_render_benchmarks(renders=500):
+    """
+    Render the welcome, login and home templates, and serve ``welcome_view``,
+    ``renders`` times each: "before" compiles templates on every render and
+    caches nothing, "after" uses the cached loader, the base.html fragment
+    cache and the anonymous welcome page cache. Returns a summary per page
+    (``requests`` in it counts renders). Needs no database.
+    """
+    from .views import welcome_view
+
+    factory = RequestFactory()
+    member = CustomUser(username='benchuser', email='benchuser@example.test')
+    no_cache = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+    results = {page: {} for page in [*RENDER_PAGES, 'welcome_view']}
+    for mode, cached in (('before', False), ('after', True)):
+        backend = _template_backend(cached)
+        with override_settings(**({} if cached else {'CACHES': no_cache})):
+            for page, (template_name, logged_in) in RENDER_PAGES.items():
+                request = factory.get('/')
+                request.user = member if logged_in else AnonymousUser()
+                results[page][mode] = _renders(
+                    lambda: backend.get_template(template_name).render(request=request), renders)
+            request = factory.get('/')
+            request.user = AnonymousUser()
+            results['welcome_view'][mode] = _renders(lambda: welcome_view(request), renders)
+    for result in results.values():
+        before = result['before']['rps']
+        result['speedup'] = round(result['after']['rps'] / before, 2) if before else 0.0
+    return results
+
+
+@contextmanager
+def simulated_db_latency(seconds):
+    """
+    Sleep ``seconds`` before every query, like the round trip to a database
+    server would. Without it an in-process SQLite file has no I/O wait for
+    async views to overlap.
+    """
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(delay)
+
+    if not seconds:
+        yield
+        return
+    connection_created.connect(install, weak=False, dispatch_uid='benchmark-db-latency')
+    for connection in connections.all(initialized_only=True):
+        install(None, connection)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(dispatch_uid='benchmark-db-latency')
+        for connection in connections.all(initialized_only=True):
+            if delay in connection.execute_wrappers:
+                connection.execute_wrappers.remove(delay)
+
+
+def _session_cookie(user):
+    """A Cookie header value for a session logged in as ``user``."""
+    client = Client()
+    client.force_login(user)
+    return '; '.join(f'{name}={morsel.value}' for name, morsel in client.cookies.items())
+
+
+def run_wsgi_concurrency(user, url, clients=1000, workers=None):
+    """
+    ``clients`` clients, each logged in as ``user``, all asking for ``url``
+    at once, served the way sync WSGI workers serve them: ``workers``
+    threads (gunicorn's suggested 2 x cores + 1 by default) calling
+    Django's WSGI handler, one request each at a time. Latency is measured
+    from the common start, so it includes the wait for a free worker.
+    """
+    workers = workers or 2 * (os.cpu_count() or 1) + 1
+    handler = WSGIHandler()
+    cookie = _session_cookie(user)
+    factory = RequestFactory()
+    pending = SimpleQueue()
+    for _ in range(clients):
+        pending.put(factory.get(url, headers={'cookie': cookie}).environ)
+    latencies, statuses = [], {}
+
+    def start_response(status, headers, exc_info=None):
+        code = int(status.split()[0])
+        statuses[code] = statuses.get(code, 0) + 1
+
+    def worker():
+        while True:
+            try:
+                environ = pending.get_nowait()
+            except Empty:
+                break
+            response = handler(environ, start_response)
+            b''.join(response)
+            response.close()
+            latencies.append(time.perf_counter() - started)
+        connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = summarize(latencies, time.perf_counter() - started)
+    result.update(workers=workers, status_codes={str(code): n for code, n in sorted(statuses.items())})
+    return result
+
+
+async def run_asgi_concurrency(user, url, clients=1000):
+    """
+    The same load through Django's ASGI handler, every client in flight at
+    once on one event loop, as an ASGI server would run them.
+    """
+    handler = ASGIHandler()
+    cookie = await sync_to_async(_session_cookie)(user)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': url, 'raw_path': url.encode(),
+        'query_string': b'', 'root_path': '', 'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+    }
+    latencies, statuses = [], {}
+
+    async def one():
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Event().wait()  # the client never disconnects
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses[message['status']] = statuses.get(message['status'], 0) + 1
+            elif not message.get('more_body'):
+                latencies.append(time.perf_counter() - started)
+
+        await handler(dict(scope), receive, send)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(clients)))
+    result = summarize(latencies, time.perf_counter() - started)
+    result['status_codes'] = {str(code): n for code, n in sorted(statuses.items())}
+    return result
+
+
+def run_server_mode_benchmarks(pages, clients=1000, workers=None, db_latency=0.002):
+    """
+    Compare sync WSGI workers with the async views behind Django's ASGI
+    handler under ``clients`` concurrent connections, every query delayed by
+    ``db_latency`` seconds to stand in for a database over the network.
+    ``pages`` maps URL names to the user to request them as. Returns
+    ``{url_name: {'wsgi': summary, 'asgi': summary, 'speedup': ratio}}``.
+    """
+    results = {}
+    with simulated_db_latency(db_latency):
+        for url_name, user in pages.items():
+            results[url_name] = {'wsgi': run_wsgi_concurrency(user, reverse(url_name), clients, workers)}
+        try:
+            with override_settings(ASYNC_VIEWS=True):
+                reload_urlconf()
+                for url_name, user in pages.items():
+                    results[url_name]['asgi'] = asyncio.run(
+                        run_asgi_concurrency(user, reverse(url_name), clients))
+        finally:
+            reload_urlconf()
+    for result in results.values():
+        wsgi = result['wsgi']['rps']
+        result['speedup'] = round(result['asgi']['rps'] / wsgi, 2) if wsgi else 0.0
+    return results
+
+
+def run_audit_benchmarks(events=5000, batch_size=500, db_latency=0.0):
+    """
+    Record ``events`` audit events two ways: "sync" INSERTs each one where
+    it happens, as a view writing its own audit row would; "buffered" queues
+    them on an ``AuditLog`` and then flushes it with ``bulk_create``, as its
+    background writer does. Each query is delayed by ``db_latency`` seconds.
+    The buffered latencies are the enqueue cost a request sees; ``flush_s``
+    is the writer's time, off the request path.
+    """
+    from .audit import AuditLog
+    from .models import AuditEvent
+
+    with simulated_db_latency(db_latency):
+        latencies = []
+        started = time.perf_counter()
+        for n in range(events):
+            t0 = time.perf_counter()
+            AuditEvent.objects.create(created_at=timezone.now(), action='login', details={'n': n})
+            latencies.append(time.perf_counter() - t0)
+        sync = summarize(latencies, time.perf_counter() - started)
+
+        log = AuditLog(batch_size=batch_size, queue_size=events, background=False)
+        latencies = []
+        started = time.perf_counter()
+        for n in range(events):
+            t0 = time.perf_counter()
+            log.record('login', n=n)
+            latencies.append(time.perf_counter() - t0)
+        buffered = summarize(latencies, time.perf_counter() - started)
+        flush_started = time.perf_counter()
+        written = log.flush()
+        flush_s = time.perf_counter() - flush_started
+
+    total = buffered['elapsed_s'] + flush_s
+    buffered.update(
+        written=written,
+        flush_s=round(flush_s, 3),
+        events_per_s=round(written / total, 2) if total else 0.0,
+    )
+    return {
+        'sync': sync,
+        'buffered': buffered,
+        'speedup': round(buffered['events_per_s'] / sync['rps'], 2) if sync['rps'] else 0.0,
+    }
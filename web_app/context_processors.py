@@ -0,0 +1,9 @@
+from django.conf import settings
+
+
+def template_cache(request):
+    """Timeout and version for the ``{% cache %}`` fragments in base.html."""
+    return {
+        'template_cache_timeout': settings.TEMPLATE_CACHE_TIMEOUT,
+        'template_cache_version': settings.TEMPLATE_CACHE_VERSION,
+    }
@@ -0,0 +1,49 @@
+"""
+Database connection reuse statistics.
+
+``connects`` counts every time Django opens a connection (with a psycopg
+pool, every checkout from the pool). Set against the number of requests
+served, it shows whether connections are being reused: persistent
+connections (``CONN_MAX_AGE``) connect once per worker thread, a pool once
+per checkout but without a new server-side session, and ``CONN_MAX_AGE=0``
+once per request.
+"""
+import threading
+from collections import Counter
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_lock = threading.Lock()
+_connects = Counter()
+
+
+@receiver(connection_created)
+def _count_connect(sender, connection, **kwargs):
+    with _lock:
+        _connects[connection.alias] += 1
+
+
+def connects(alias='default'):
+    return _connects[alias]
+
+
+def pool_stats(alias='default'):
+    """Connection settings and counters for ``alias``, plus psycopg pool stats."""
+    connection = connections[alias]
+    settings_dict = connection.settings_dict
+    stats = {
+        'alias': alias,
+        'vendor': connection.vendor,
+        'conn_max_age': settings_dict['CONN_MAX_AGE'],
+        'conn_health_checks': settings_dict['CONN_HEALTH_CHECKS'],
+        'connects': connects(alias),
+        'pooled': False,
+    }
+    # Only PostgreSQL's backend has a pool, and only when OPTIONS['pool'] is set
+    pool = getattr(connection, 'pool', None)
+    if pool is not None:
+        stats['pooled'] = True
+        stats['pool'] = pool.get_stats()
+    return stats
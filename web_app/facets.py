@@ -0,0 +1,185 @@
+"""
+Facet counts for the admin dashboard filters.
+
+All five filter columns are counted with one grouped query over the live
+users matching the search term (one row per combination of values, so at
+most a few dozen rows). Both the per-option counts and the total for any
+filter selection are then summed in Python from those rows, with no
+``COUNT(*)`` per filter.
+
+Results are cached for ``settings.USER_FACETS_CACHE_TIMEOUT`` seconds under a
+version number that is bumped whenever users are saved, deleted, soft
+deleted, restored or bulk created, so stale counts are never served after a
+change.
+
+On PostgreSQL, once ``pg_class.reltuples`` says the table has more than
+``settings.USER_FACETS_APPROXIMATE_OVER`` rows, every grouped query is a
+full scan worth avoiding:
+
+- searches are no longer faceted (each term would need its own scan);
+- the unsearched counts are kept under a key no change invalidates, for
+  ``settings.USER_FACETS_STALE_TIMEOUT`` seconds. They are marked ``stale``,
+  and callers take the total from the planner estimate instead.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CustomUser
+from .search import get_search_backend
+from .signals import users_bulk_created, users_restored, users_soft_deleted
+
+FACET_FIELDS = ('gender', 'marital_status', 'is_active', 'is_staff', 'is_superuser')
+BOOLEAN_FIELDS = ('is_active', 'is_staff', 'is_superuser')
+
+VERSION_KEY = 'user-facets:version'
+STALE_KEY = 'user-facets:stale'
+LARGE_KEY = 'user-facets:large'
+
+
+def _filter_value(field, value):
+    """The query-string value a column value is selected by ('Yes'/'No' for flags)."""
+    if field in BOOLEAN_FIELDS:
+        return 'Yes' if value else 'No'
+    return value
+
+
+class FacetCounts:
+    """Grouped counts for one search term; see ``count()`` and ``options()``."""
+
+    def __init__(self, rows, stale=False):
+        # [(filter value per FACET_FIELDS, number of users), ...]
+        self.rows = rows
+        # Counted up to USER_FACETS_STALE_TIMEOUT ago: options only, not totals
+        self.stale = stale
+
+    def _matches(self, values, filters, skip=None):
+        return all(
+            not filters.get(field) or value == filters[field]
+            for field, value in zip(FACET_FIELDS, values)
+            if field != skip
+        )
+
+    def count(self, filters):
+        """Number of users matching every filter in ``filters``."""
+        return sum(n for values, n in self.rows if self._matches(values, filters))
+
+    def options(self, filters):
+        """
+        ``{field: {option: count}}``, where each option is counted with every
+        other active filter applied, i.e. the result of picking that option.
+        """
+        options = {field: {} for field in FACET_FIELDS}
+        for index, field in enumerate(FACET_FIELDS):
+            counts = options[field]
+            for values, n in self.rows:
+                if self._matches(values, filters, skip=field):
+                    counts[values[index]] = counts.get(values[index], 0) + n
+        return options
+
+
+def estimated_user_rows(using='default'):
+    """The planner's row estimate for the user table, or None if unavailable."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [CustomUser._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 until the table has been vacuumed or analyzed
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def _is_large():
+    # The estimate only moves after ANALYZE; one catalog read per timeout
+    def check():
+        estimate = estimated_user_rows()
+        return estimate is not None and estimate > settings.USER_FACETS_APPROXIMATE_OVER
+    return cache.get_or_set(LARGE_KEY, check, timeout=settings.USER_FACETS_CACHE_TIMEOUT)
+
+
+def _grouped_rows(search, backend):
+    users = CustomUser.objects.all()  # live users only
+    if search:
+        users = (backend or get_search_backend()).filter(users, search)
+    grouped = users.order_by().values_list(*FACET_FIELDS).annotate(n=Count('id'))
+    return [
+        ([_filter_value(field, value) for field, value in zip(FACET_FIELDS, row[:-1])], row[-1])
+        for row in grouped
+    ]
+
+
+def _new_version():
+    # Time based, so a version lost to eviction never reuses an old number
+    return time.time_ns()
+
+
+def users_version():
+    """
+    A number that changes whenever the live user list may have changed
+    (any change that invalidates the facets).
+    """
+    return cache.get_or_set(VERSION_KEY, _new_version, timeout=None)
+
+
+def _cache_key(search):
+    version = users_version()
+    digest = hashlib.sha256(search.encode()).hexdigest()[:32]
+    return f'user-facets:{version}:{digest}'
+
+
+def get_user_facets(search='', backend=None):
+    """
+    Return the cached FacetCounts for ``search``, or None when the table is
+    too large to facet a search term. ``backend`` is the search backend to
+    use on a cache miss (a fresh one by default).
+    """
+    if _is_large():
+        if search:
+            return None
+        rows = cache.get(STALE_KEY)
+        if rows is None:
+            rows = _grouped_rows('', backend)
+            cache.set(STALE_KEY, rows, timeout=settings.USER_FACETS_STALE_TIMEOUT)
+        return FacetCounts(rows, stale=True)
+    key = _cache_key(search)
+    rows = cache.get(key)
+    if rows is None:
+        rows = _grouped_rows(search, backend)
+        cache.set(key, rows, timeout=settings.USER_FACETS_CACHE_TIMEOUT)
+    return FacetCounts(rows)
+
+
+def invalidate_user_facets():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Not set yet, or evicted
+        cache.set(VERSION_KEY, _new_version(), timeout=None)
+
+
+@receiver(post_save, sender=CustomUser)
+def _user_saved(sender, update_fields=None, **kwargs):
+    # Logging in saves last_login only, which no facet depends on
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_user_facets()
+
+
+@receiver(post_delete, sender=CustomUser)
+@receiver(users_soft_deleted, sender=CustomUser)
+@receiver(users_restored, sender=CustomUser)
+@receiver(users_bulk_created, sender=CustomUser)
+def _users_changed(sender, **kwargs):
+    invalidate_user_facets()
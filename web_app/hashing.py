@@ -0,0 +1,96 @@
+"""
+Bounded worker pool for password hashing.
+
+PBKDF2 costs 100-300 ms of CPU per call. Run inline, it blocks a sync worker
+or, worse, the whole event loop of an async one. This pool moves the work to
+a fixed set of threads (``hashlib`` releases the GIL while it hashes). The
+number of waiting jobs is capped, so a login storm gets a fast
+``HashingPoolSaturated`` (turned into a 503) instead of an ever-growing
+queue.
+
+Sized by ``settings.PASSWORD_HASHING_WORKERS`` and
+``settings.PASSWORD_HASHING_QUEUE``.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+
+
+def init_process_worker():
+    # Spawned hashing processes start without Django set up. Kept here, away
+    # from any models import, so the child can unpickle it before setup().
+    import django
+    django.setup()
+
+
+class HashingPoolSaturated(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class HashingPool:
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingPoolSaturated
+        with self._lock:
+            self.in_flight += 1
+        # Run in the caller's context so per-request instrumentation sees it
+        future = self._executor.submit(contextvars.copy_context().run, fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    async def arun(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    async def amake_password(self, password):
+        return await self.arun(make_password, password)
+
+    async def averify_password(self, password, encoded):
+        """Return ``(is_correct, must_update)`` like hashers.verify_password."""
+        return await self.arun(verify_password, password, encoded)
+
+    def stats(self):
+        return {
+            'workers': self.max_workers,
+            'queue_limit': self.max_queue,
+            'in_flight': self.in_flight,
+            'rejected': self.rejected,
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    """Return the process-wide HashingPool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = settings.PASSWORD_HASHING_WORKERS or os.cpu_count() or 1
+                _pool = HashingPool(workers, settings.PASSWORD_HASHING_QUEUE)
+    return _pool
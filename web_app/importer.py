@@ -0,0 +1,377 @@
+"""
+Bulk user import from CSV.
+
+The file is read as a stream and handled ``batch_size`` rows at a time:
+
+1. each row is validated on its own (required fields, formats, choices);
+2. username/email uniqueness (case-insensitive, like the unique indexes) is
+   checked for the whole batch with a single ``IN`` query, plus against rows
+   seen earlier in the same file;
+3. passwords are hashed across a process pool, since PBKDF2 is CPU bound;
+4. the batch is written with ``bulk_create``.
+
+A bad row is recorded in ``ImportResult.errors`` and skipped; it never aborts
+the rest of the file.
+
+Uploads from the admin panel run as jobs outside the request: the file is
+saved under ``settings.USER_IMPORT_DIR`` and ``manage.py import_users --job``
+is started for it in its own process, which writes the job's status next
+to it for the status page to read. At most ``settings.USER_IMPORT_MAX_JOBS``
+jobs run at once; a job whose process died without finishing is reported
+as failed.
+"""
+import csv
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils.dateparse import parse_date
+
+from .hashing import init_process_worker
+from .models import CustomUser
+from .signals import users_bulk_created
+
+REQUIRED_COLUMNS = ('username', 'email', 'password')
+BOOLEAN_COLUMNS = ('is_active', 'is_staff', 'is_superuser')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+
+GENDERS = {value for value, _ in CustomUser.GENDER_CHOICES}
+MARITAL_STATUSES = {value for value, _ in CustomUser.MARITAL_CHOICES}
+
+username_validator = UnicodeUsernameValidator()
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.errors = []  # (line number, username, message)
+
+    def add_error(self, line, username, message):
+        self.errors.append((line, username, message))
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+
+def _clean_row(row):
+    """Return model field values for ``row`` or raise ValidationError."""
+    values = {key: (row.get(key) or '').strip() for key in row if key}
+    for column in REQUIRED_COLUMNS:
+        if not values.get(column):
+            raise ValidationError(f"Missing {column}.")
+
+    username_validator(values['username'])
+    validate_email(values['email'])
+    if len(values['password']) < 8:
+        raise ValidationError("Password must be at least 8 characters long.")
+
+    dob = None
+    if values.get('dob'):
+        dob = parse_date(values['dob'])
+        if dob is None:
+            raise ValidationError("dob must be YYYY-MM-DD.")
+    gender = values.get('gender') or None
+    if gender and gender not in GENDERS:
+        raise ValidationError("Malformed gender value.")
+    marital_status = values.get('marital_status') or None
+    if marital_status and marital_status not in MARITAL_STATUSES:
+        raise ValidationError("Malformed marital_status value.")
+
+    fields = {
+        'username': values['username'],
+        'email': values['email'],
+        'password': values['password'],
+        'dob': dob,
+        'gender': gender,
+        'marital_status': marital_status,
+        'is_active': True,
+    }
+    for column in BOOLEAN_COLUMNS:
+        if values.get(column):
+            fields[column] = values[column].lower() in TRUE_VALUES
+    return fields
+
+
+class UserImporter:
+    """
+    Import users from an iterable of CSV lines.
+
+    ``workers`` is the size of the hashing process pool; ``0`` hashes in the
+    current process and ``None`` uses one worker per CPU.
+    """
+
+    def __init__(self, batch_size=1000, workers=None):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.seen_usernames = set()
+        self.seen_emails = set()
+
+    def run(self, lines):
+        result = ImportResult()
+        reader = csv.DictReader(lines)
+        missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or ())]
+        if missing:
+            result.add_error(1, '', f"Missing column(s): {', '.join(missing)}.")
+            return result
+
+        executor = None
+        if self.workers != 0:
+            # Spawned, not forked: forking a process that runs threads (the
+            # audit writer, a server's own) can copy a held lock into the child
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_process_worker)
+        try:
+            batch = []
+            # Line 1 is the header, so data rows start at line 2
+            for line, row in enumerate(reader, start=2):
+                batch.append((line, row))
+                if len(batch) >= self.batch_size:
+                    self._import_batch(batch, result, executor)
+                    batch = []
+            if batch:
+                self._import_batch(batch, result, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        result.errors.sort(key=lambda error: error[0])
+        return result
+
+    def _import_batch(self, batch, result, executor):
+        rows = []
+        for line, row in batch:
+            try:
+                rows.append((line, _clean_row(row)))
+            except ValidationError as exc:
+                result.add_error(line, (row.get('username') or '').strip(), ' '.join(exc.messages))
+
+        # One query covers the uniqueness check for the whole batch
+        usernames = {fields['username'].lower() for _, fields in rows}
+        emails = {fields['email'].lower() for _, fields in rows}
+        taken_usernames, taken_emails = set(), set()
+        if rows:
+            existing = CustomUser.objects.with_deleted().annotate(
+                username_ci=Lower('username'), email_ci=Lower('email'),
+            ).filter(
+                Q(username_ci__in=usernames) | Q(email_ci__in=emails)
+            ).values_list('username_ci', 'email_ci')
+            for username, email in existing:
+                taken_usernames.add(username)
+                taken_emails.add(email)
+
+        accepted = []
+        for line, fields in rows:
+            username, email = fields['username'].lower(), fields['email'].lower()
+            if username in taken_usernames or username in self.seen_usernames:
+                result.add_error(line, fields['username'], "Username already exists.")
+            elif email in taken_emails or email in self.seen_emails:
+                result.add_error(line, fields['username'], "Email already exists.")
+            else:
+                self.seen_usernames.add(username)
+                self.seen_emails.add(email)
+                accepted.append((line, fields))
+        if not accepted:
+            return
+
+        passwords = [fields['password'] for _, fields in accepted]
+        if executor is None:
+            hashes = [make_password(password) for password in passwords]
+        else:
+            chunksize = max(1, len(passwords) // (4 * (self.workers or os.cpu_count() or 1)))
+            hashes = list(executor.map(make_password, passwords, chunksize=chunksize))
+        for (_, fields), encoded in zip(accepted, hashes):
+            fields['password'] = encoded
+
+        users = [CustomUser(**fields) for _, fields in accepted]
+        try:
+            with transaction.atomic():
+                created = CustomUser.objects.bulk_create(users, batch_size=self.batch_size)
+            # bulk_create skips post_save; the receivers catch up in one go
+            pks = [user.pk for user in created if user.pk is not None]
+            if pks:
+                users_bulk_created.send(sender=CustomUser, pks=pks)
+        except IntegrityError:
+            # Someone else inserted a clashing user since the check above;
+            # fall back to row-by-row inserts so only that row is rejected.
+            # Each save() sends post_save, so no users_bulk_created here.
+            created = []
+            for (line, fields), user in zip(accepted, users):
+                user.pk = None  # may have been set by the rolled-back batch
+                try:
+                    with transaction.atomic():
+                        user.save()
+                    created.append(user)
+                except IntegrityError:
+                    result.add_error(line, fields['username'], "Username or email already exists.")
+
+        result.created += len(created)
+
+
+def import_users(lines, batch_size=1000, workers=None):
+    """Import users from CSV ``lines`` and return an ImportResult."""
+    return UserImporter(batch_size=batch_size, workers=workers).run(lines)
+
+
+# -- jobs ------------------------------------------------------------------
+
+# Rejected rows kept in a job's status for the status page
+MAX_REPORTED_ERRORS = 200
+
+# Seconds a spawned process has to mark its job running
+START_TIMEOUT = 60
+
+ACTIVE_STATES = ('queued', 'running')
+
+# Import processes started by this one, reaped as they exit
+_processes = {}
+_processes_lock = threading.Lock()
+
+
+class ImportQueueFull(Exception):
+    """Raised when ``settings.USER_IMPORT_MAX_JOBS`` imports are already running."""
+
+
+def _job_path(job_id, suffix):
+    return Path(settings.USER_IMPORT_DIR) / f'{job_id}{suffix}'
+
+
+def _write_status(job_id, status):
+    # Written whole and renamed into place, so readers never see half of it
+    path = _job_path(job_id, '.json')
+    partial = path.with_suffix('.json.tmp')
+    partial.write_text(json.dumps(status))
+    os.replace(partial, path)
+
+
+def _read_status(job_id):
+    try:
+        return json.loads(_job_path(job_id, '.json').read_text())
+    except FileNotFoundError:
+        return None
+
+
+def _fail(job_id, error):
+    status = {'state': 'failed', 'error': error}
+    _write_status(job_id, status)
+    return status
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _reap():
+    # A child that exits is a zombie until waited for, which would still
+    # look alive to _pid_alive()
+    with _processes_lock:
+        exited = {job_id: process.returncode for job_id, process in _processes.items()
+                  if process.poll() is not None}
+        for job_id in exited:
+            del _processes[job_id]
+    for job_id, code in exited.items():
+        status = _read_status(job_id)
+        if status is not None and status['state'] in ACTIVE_STATES:
+            _fail(job_id, f"The import process exited with code {code}.")
+
+
+def import_job_status(job_id):
+    """``{'state': 'queued'|'running'|'done'|'failed', ...}``, or None if unknown."""
+    _reap()
+    status = _read_status(job_id)
+    if status is None or status['state'] not in ACTIVE_STATES:
+        return status
+    if 'pid' in status:
+        if not _pid_alive(status['pid']):
+            return _fail(job_id, "The import process exited before finishing.")
+    elif time.time() - status.get('queued_at', 0) > START_TIMEOUT:
+        return _fail(job_id, "The import process never started.")
+    return status
+
+
+def active_import_jobs():
+    """Number of jobs queued or running."""
+    directory = Path(settings.USER_IMPORT_DIR)
+    if not directory.is_dir():
+        return 0
+    return sum(
+        1 for path in directory.glob('*.json')
+        if (import_job_status(path.stem) or {}).get('state') in ACTIVE_STATES
+    )
+
+
+def queue_import(upload):
+    """
+    Save ``upload`` and import it in a separate ``manage.py import_users``
+    process (in this one when ``settings.USER_IMPORT_BACKGROUND`` is off).
+    Returns the job id; raises ImportQueueFull when
+    ``settings.USER_IMPORT_MAX_JOBS`` jobs are already queued or running.
+    """
+    if settings.USER_IMPORT_BACKGROUND and active_import_jobs() >= settings.USER_IMPORT_MAX_JOBS:
+        raise ImportQueueFull
+    job_id = str(uuid.uuid4())
+    Path(settings.USER_IMPORT_DIR).mkdir(parents=True, exist_ok=True)
+    with open(_job_path(job_id, '.csv'), 'wb') as f:
+        for chunk in upload.chunks():
+            f.write(chunk)
+    _write_status(job_id, {'state': 'queued', 'queued_at': time.time()})
+    if settings.USER_IMPORT_BACKGROUND:
+        try:
+            process = subprocess.Popen(
+                [sys.executable, str(Path(settings.BASE_DIR) / 'manage.py'), 'import_users', '--job', job_id],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, start_new_session=True,
+            )
+        except OSError as exc:
+            _job_path(job_id, '.csv').unlink(missing_ok=True)
+            _fail(job_id, f"The import process could not be started: {exc}")
+        else:
+            with _processes_lock:
+                _processes[job_id] = process
+    else:
+        run_import_job(job_id)
+    return job_id
+
+
+def run_import_job(job_id, batch_size=1000, workers=None):
+    """Import a queued job's file, recording its status; returns the ImportResult."""
+    if workers is None:
+        workers = settings.USER_IMPORT_WORKERS
+    path = _job_path(job_id, '.csv')
+    _write_status(job_id, {'state': 'running', 'pid': os.getpid()})
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            result = import_users(f, batch_size=batch_size, workers=workers)
+    except Exception as exc:
+        _write_status(job_id, {'state': 'failed', 'error': str(exc)})
+        raise
+    finally:
+        path.unlink(missing_ok=True)
+    _write_status(job_id, {
+        'state': 'done',
+        'created': result.created,
+        'failed': result.failed,
+        'errors': result.errors[:MAX_REPORTED_ERRORS],
+    })
+    return result
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from web_app.signups import backfill
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily sign-up rollup behind the admin analytics page "
+        "from the user table, one window of days per transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-days', type=int, default=30, help='Days rebuilt per transaction.')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between chunks.')
+
+    def handle(self, *args, **options):
+        total = 0
+        for first, last, users in backfill(options['chunk_days']):
+            total += users
+            self.stdout.write(f'{first} .. {last}: {users} user(s)')
+            time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f'Rollup rebuilt: {total} live user(s) counted.'))
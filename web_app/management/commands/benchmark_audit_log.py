@@ -0,0 +1,25 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from web_app.benchmarks import benchmark_database, run_audit_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare writing one audit row per event with the buffered audit "
+        "log's enqueue plus batched bulk_create, against a scratch "
+        "database. Prints JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=5000)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--db-latency-ms', type=float, default=1.0,
+                            help='Added to every query, like a network round trip.')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            results = run_audit_benchmarks(
+                options['events'], options['batch_size'], options['db_latency_ms'] / 1000)
+        self.stdout.write(json.dumps(results, indent=2, sort_keys=True))
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+
+from web_app.benchmarks import benchmark_database, reload_urlconf, summarize
+from web_app.hashing import get_hashing_pool
+from web_app.models import CustomUser
+
+USERNAME, PASSWORD = 'benchuser', 'BenchPass123'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare login throughput of the sync views (hash inline, one request "
+        "per worker) against the async views (hash on the bounded pool). "
+        "Prints JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=16)
+
+    def handle(self, *args, **options):
+        cores = os.cpu_count() or 1
+        with benchmark_database():
+            CustomUser.objects.create_user(
+                username=USERNAME, email='bench@example.com', password=PASSWORD)
+            sync = self.run_sync(options['requests'])
+            with override_settings(ASYNC_AUTH_VIEWS=True):
+                reload_urlconf()
+                try:
+                    async_ = asyncio.run(self.run_async(options['requests'], options['concurrency']))
+                finally:
+                    reload_urlconf()
+
+        for result in (sync, async_):
+            result['rps_per_core'] = round(result['rps'] / cores, 2)
+        self.stdout.write(json.dumps({
+            'cores': cores,
+            'hashing_pool': get_hashing_pool().stats(),
+            'sync_wsgi_worker': sync,
+            'async_pooled': async_,
+        }, indent=2))
+
+    def post_login(self, client):
+        return client.post('/login/', {'username': USERNAME, 'password': PASSWORD})
+
+    def run_sync(self, total):
+        # One sync worker handles one request at a time, hash included
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(total):
+            t0 = time.perf_counter()
+            self.post_login(Client())
+            latencies.append(time.perf_counter() - t0)
+        return summarize(latencies, time.perf_counter() - started)
+
+    async def run_async(self, total, concurrency):
+        latencies, statuses = [], {}
+        gate = asyncio.Semaphore(concurrency)
+        lag = {'max': 0.0}
+
+        async def one():
+            async with gate:
+                t0 = time.perf_counter()
+                response = await self.post_login(AsyncClient())
+                latencies.append(time.perf_counter() - t0)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def watch_loop(stop):
+            # How long the event loop is blocked: the async views should
+            # keep this near zero even while hashes are running.
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lag['max'] = max(lag['max'], time.perf_counter() - t0 - 0.005)
+
+        stop = asyncio.Event()
+        watcher = asyncio.create_task(watch_loop(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await watcher
+
+        result = summarize(latencies, elapsed)
+        result['status_codes'] = statuses
+        result['max_event_loop_lag_ms'] = round(lag['max'] * 1000, 2)
+        return result
@@ -0,0 +1,46 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from web_app.benchmarks import benchmark_database, generate_users, run_server_mode_benchmarks
+from web_app.models import CustomUser
+
+PASSWORD = 'SynthPass123'
+
+
+class Command(BaseCommand):
+    help = (
+        "Hit the home page and the admin dashboard with many concurrent "
+        "connections, served by sync WSGI-style workers and by the async "
+        "views, against a scratch database with simulated query latency. "
+        "Prints JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000, help='Concurrent connections.')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Sync workers (default: 2 x cores + 1).')
+        parser.add_argument('--db-latency-ms', type=float, default=2.0,
+                            help='Added to every query, like a network round trip.')
+        parser.add_argument('--users', type=int, default=2000, help='Synthetic users to seed.')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            generate_users(options['users'], password=PASSWORD, seed=1)
+            member = CustomUser.objects.create_user(
+                username='benchuser', email='benchuser@example.test', password=PASSWORD)
+            admin = CustomUser.objects.create_superuser(
+                username='benchadmin', email='benchadmin@example.test', password=PASSWORD)
+            results = run_server_mode_benchmarks(
+                {'home': member, 'admin_dashboard': admin},
+                clients=options['clients'], workers=options['workers'],
+                db_latency=options['db_latency_ms'] / 1000,
+            )
+
+        self.stdout.write(json.dumps({
+            'cores': os.cpu_count() or 1,
+            'clients': options['clients'],
+            'db_latency_ms': options['db_latency_ms'],
+            'pages': results,
+        }, indent=2, sort_keys=True))
@@ -0,0 +1,19 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from web_app.benchmarks import run_render_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare renders/sec of the welcome, login and home pages without "
+        "template caching against the cached loader, layout fragment cache "
+        "and anonymous welcome page cache. Prints JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=500, help='Renders per page and mode.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(run_render_benchmarks(options['renders']), indent=2, sort_keys=True))
@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from web_app.benchmarks import benchmark_database, run_concurrency_check, summarize
+from web_app.dbpool import pool_stats
+from web_app.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Hit the home page from many threads at once against a scratch copy "
+        "of the configured database and report how often connections were "
+        "reused. Unless a pool is configured, a CONN_MAX_AGE=0 run is "
+        "included for comparison. Prints JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=25, help='Requests per thread.')
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            user = CustomUser.objects.create_user(
+                username='pooluser', email='pooluser@example.test', password='PoolPass123')
+            connections.close_all()
+
+            runs = {}
+            stats = pool_stats()
+            if not stats['pooled']:
+                # Connections read CONN_MAX_AGE from this shared dict when
+                # they connect, so the override applies to every thread.
+                settings_dict = connections['default'].settings_dict
+                configured = settings_dict['CONN_MAX_AGE']
+                settings_dict['CONN_MAX_AGE'] = 0
+                try:
+                    runs['no_reuse'] = self.run(user, options)
+                finally:
+                    settings_dict['CONN_MAX_AGE'] = configured
+            runs['configured'] = self.run(user, options)
+            stats = pool_stats()
+
+        self.stdout.write(json.dumps({'settings': stats, 'runs': runs}, indent=2, sort_keys=True))
+
+    def run(self, user, options):
+        result = run_concurrency_check(user, options['threads'], options['requests'])
+        latencies, elapsed = result.pop('latencies'), result.pop('elapsed')
+        result.update(summarize(latencies, elapsed))
+        return result
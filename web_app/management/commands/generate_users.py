@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from web_app.benchmarks import generate_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert N synthetic users (realistic gender, marital status, age and "
+        "sign-up date spread, a fraction soft deleted) for load testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int)
+        parser.add_argument('--deleted-fraction', type=float, default=0.05)
+        parser.add_argument('--prefix', default='synth', help='Username prefix.')
+        parser.add_argument('--password', default='SynthPass123', help='Password for every user.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None, help='Random seed, for repeatable data.')
+
+    def handle(self, *args, **options):
+        if options['count'] < 1:
+            raise CommandError("count must be at least 1.")
+        if not 0 <= options['deleted_fraction'] <= 1:
+            raise CommandError("--deleted-fraction must be between 0 and 1.")
+        created = generate_users(
+            options['count'],
+            deleted_fraction=options['deleted_fraction'],
+            prefix=options['prefix'],
+            password=options['password'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{created} synthetic user(s) created."))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from web_app.importer import import_users, run_import_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users from a CSV file with columns username, email, password "
+        "and optionally dob, gender, marital_status, is_active, is_staff, is_superuser."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='CSV file to import.')
+        parser.add_argument(
+            '--job', help='Run an import queued from the admin panel, by job id.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Password hashing processes (default: one per CPU, or '
+                 'USER_IMPORT_WORKERS for --job; 0 = no pool).',
+        )
+
+    def handle(self, *args, **options):
+        if bool(options['path']) == bool(options['job']):
+            raise CommandError("Give either a CSV path or --job.")
+        try:
+            if options['job']:
+                result = run_import_job(
+                    options['job'], batch_size=options['batch_size'], workers=options['workers'])
+            else:
+                with open(options['path'], newline='', encoding='utf-8-sig') as f:
+                    result = import_users(
+                        f, batch_size=options['batch_size'], workers=options['workers'])
+        except OSError as exc:
+            raise CommandError(exc)
+
+        for line, username, message in result.errors:
+            self.stderr.write(f"line {line} ({username or '-'}): {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{result.created} user(s) imported, {result.failed} row(s) rejected."))
@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from web_app.purge import purge_deleted_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive users soft deleted more than the retention window ago, then "
+        "hard delete them, one short transaction per chunk and pausing "
+        "between chunks. Safe to run on a live site, and to stop and rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.USER_PURGE_RETENTION_DAYS,
+                            help='Retention window (default: USER_PURGE_RETENTION_DAYS).')
+        parser.add_argument('--archive', choices=('table', 'file'), default='table',
+                            help='Keep purged users in the ArchivedUser table or a .ndjson.gz file.')
+        parser.add_argument('--path', help='Archive file, appended to (with --archive file).')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=None, help='Stop after this many users.')
+        parser.add_argument('--sleep', type=float, default=0.5, help='Seconds to pause between chunks.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be purged.')
+
+    def handle(self, *args, **options):
+        if options['archive'] == 'file' and not options['path']:
+            raise CommandError('--archive file needs --path.')
+        chunks = purge_deleted_users(
+            timedelta(days=options['days']), chunk_size=options['chunk_size'],
+            archive=options['archive'], path=options['path'], limit=options['limit'],
+            sleep=options['sleep'], dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            count, _ = next(chunks)
+            self.stdout.write(f"{count} user(s) soft deleted over {options['days']} days ago.")
+            return
+        total = 0
+        for purged, deleted_at in chunks:
+            total += purged
+            self.stdout.write(f'Purged {purged} user(s), deleted up to {deleted_at:%Y-%m-%d %H:%M}.')
+        self.stdout.write(self.style.SUCCESS(f'{total} user(s) archived and purged.'))
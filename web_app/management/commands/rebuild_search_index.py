@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from web_app.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Create or rebuild the index behind the admin dashboard user search."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default='default',
+            help='Database alias to build the index on (default: "default").',
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend(options['database'])
+        self.stdout.write(f'Using {backend.__class__.__name__}')
+        backend.rebuild(stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Search index is up to date.'))
@@ -0,0 +1,60 @@
+import json
+import os
+import platform
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+
+from web_app.benchmarks import benchmark_database, generate_users, run_view_benchmarks
+from web_app.models import CustomUser
+
+PASSWORD = 'SynthPass123'
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database with synthetic users, then benchmark login, "
+        "register, home and every admin dashboard filter combination through "
+        "the test client. Prints p50/p95/p99 latency and requests/sec as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Synthetic users to seed.')
+        parser.add_argument('--requests', type=int, default=100,
+                            help='Requests per login/register/home scenario.')
+        parser.add_argument('--combinations', type=int, default=None,
+                            help='Limit the dashboard filter combinations (default: all).')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--fast-hashing', action='store_true',
+                            help='Use a cheap password hasher to measure everything but PBKDF2.')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['fast_hashing']:
+            overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+        with benchmark_database(), override_settings(**overrides):
+            generate_users(options['users'], password=PASSWORD, seed=options['seed'])
+            CustomUser.objects.create_user(
+                username='benchuser', email='benchuser@example.test', password=PASSWORD)
+            CustomUser.objects.create_superuser(
+                username='benchadmin', email='benchadmin@example.test', password=PASSWORD)
+            scenarios = run_view_benchmarks(
+                options['requests'], password=PASSWORD, combinations=options['combinations'])
+            vendor = connection.vendor
+
+        report = json.dumps({
+            'environment': {
+                'python': platform.python_version(),
+                'database': vendor,
+                'cores': os.cpu_count() or 1,
+                'fast_hashing': options['fast_hashing'],
+            },
+            'dataset': {'users': options['users'], 'seed': options['seed']},
+            'scenarios': scenarios,
+        }, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report + '\n')
+        self.stdout.write(report)
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('web_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['date_joined', 'id'], name='user_alive_joined_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['gender', 'date_joined', 'id'], name='user_alive_gender_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['marital_status', 'date_joined', 'id'], name='user_alive_marital_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['gender', 'marital_status', 'date_joined', 'id'], name='user_alive_gender_marital_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['is_active', 'date_joined', 'id'], name='user_alive_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['is_staff', 'is_superuser', 'date_joined', 'id'], name='user_alive_staff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['is_superuser', 'date_joined', 'id'], name='user_alive_superuser_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:27
+
+import web_app.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_app', '0002_alive_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='customuser',
+            options={'default_manager_name': 'all_objects', 'verbose_name': 'user', 'verbose_name_plural': 'users'},
+        ),
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', web_app.models.CustomUserManager()),
+                ('all_objects', web_app.models.CustomUserManager(alive_only=False)),
+            ],
+        ),
+    ]
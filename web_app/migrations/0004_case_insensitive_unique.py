@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:36
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+# Collisions listed per field before giving up
+REPORT_LIMIT = 20
+
+
+def check_case_insensitive_duplicates(apps, schema_editor):
+    """
+    Refuse to add the constraints over usernames or emails that differ only
+    in case (the old schema allowed them), listing the rows to fix first.
+    Which account keeps the name is a decision for a person, not a migration.
+    """
+    CustomUser = apps.get_model('web_app', 'CustomUser')
+    users = CustomUser._base_manager.using(schema_editor.connection.alias)
+    problems = []
+    for field, rows in (('username', users.all()), ('email', users.exclude(email=''))):
+        duplicated = (
+            rows.annotate(key=Lower(field)).order_by().values('key')
+            .annotate(n=Count('id')).filter(n__gt=1).values_list('key', flat=True)
+        )
+        keys = list(duplicated[:REPORT_LIMIT + 1])
+        for key in keys[:REPORT_LIMIT]:
+            clashing = rows.annotate(key=Lower(field)).filter(key=key).order_by('id')
+            listed = ', '.join(f'#{pk} {value!r}' for pk, value in clashing.values_list('id', field))
+            problems.append(f'{field} {key!r}: {listed}')
+        if len(keys) > REPORT_LIMIT:
+            problems.append(f'... and more {field} collisions')
+    if problems:
+        raise RuntimeError(
+            'Users that differ only in case must be renamed or removed before '
+            'the case-insensitive unique constraints can be added:\n  ' + '\n  '.join(problems))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('web_app', '0003_soft_delete_managers'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_case_insensitive_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('username'), name='user_username_ci_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), condition=models.Q(('email', ''), _negated=True), name='user_email_ci_unique'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_app', '0004_case_insensitive_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySignups',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('gender', models.CharField(blank=True, default='', max_length=10)),
+                ('marital_status', models.CharField(blank=True, default='', max_length=10)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'gender', 'marital_status'), name='daily_signups_unique')],
+            },
+        ),
+    ]
@@ -1,5 +1,110 @@
-from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
+from django.db.models.lookups import Exact
+from django.utils import timezone
+
+from .signals import users_restored, users_soft_deleted
+
+
+class CustomUserQuerySet(models.QuerySet):
+    def alive(self):
+        return self.filter(is_deleted=False)
+
+    def deleted(self):
+        return self.filter(is_deleted=True)
+
+    def _set_deleted(self, value, chunk_size):
+        # Walk the matching ids in primary-key order, locking and updating
+        # one chunk per short transaction so live traffic is never blocked
+        # behind a table-wide UPDATE.
+        candidates = self.filter(is_deleted=not value).order_by('pk')
+        manager = self.model._base_manager.db_manager(self.db)
+        # When the row was deleted, for the purge retention window
+        deleted_at = timezone.now() if value else None
+        pks, last_pk = [], None
+        while True:
+            with transaction.atomic(using=self.db):
+                chunk = candidates if last_pk is None else candidates.filter(pk__gt=last_pk)
+                chunk_pks = list(
+                    chunk.select_for_update().values_list('pk', flat=True)[:chunk_size])
+                if not chunk_pks:
+                    break
+                manager.filter(pk__in=chunk_pks).update(is_deleted=value, deleted_at=deleted_at)
+            pks.extend(chunk_pks)
+            last_pk = chunk_pks[-1]
+        return pks
+
+    def collisions(self, username=None, email=None, exclude_pk=None):
+        """
+        Return which of ``{'username', 'email'}`` are already taken, ignoring
+        case, in a single query served by the case-insensitive unique indexes.
+        """
+        checks = {}
+        if username:
+            checks['username_taken'] = Exact(Lower('username'), Lower(Value(username)))
+        if email:
+            checks['email_taken'] = Exact(Lower('email'), Lower(Value(email)))
+        if not checks:
+            return set()
+        query = models.Q()
+        for check in checks.values():
+            query |= models.Q(check)
+        rows = self.filter(query)
+        if exclude_pk is not None:
+            rows = rows.exclude(pk=exclude_pk)
+        taken = set()
+        for row in rows.values(**checks)[:2]:
+            taken.update(key.removesuffix('_taken') for key, hit in row.items() if hit)
+        return taken
+
+    def soft_delete(self, chunk_size=1000):
+        """
+        Soft delete every live row with one UPDATE per ``chunk_size`` rows.
+
+        Sends a single ``users_soft_deleted`` signal and returns the count.
+        """
+        pks = self._set_deleted(True, chunk_size)
+        if pks:
+            users_soft_deleted.send(sender=self.model, pks=pks)
+        return len(pks)
+
+    def restore(self, chunk_size=1000):
+        """
+        Undo a soft delete the same way; sends ``users_restored``. Start from
+        ``all_objects`` (or ``objects.deleted()``): a queryset from
+        ``objects`` only holds live rows, so restoring it does nothing.
+        """
+        pks = self._set_deleted(False, chunk_size)
+        if pks:
+            users_restored.send(sender=self.model, pks=pks)
+        return len(pks)
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    """
+    UserManager that hides soft-deleted users.
+
+    ``with_deleted()`` and ``deleted()`` reach the hidden rows. Pass
+    ``alive_only=False`` for a manager that returns every row.
+    """
+
+    def __init__(self, alive_only=True):
+        super().__init__()
+        self.alive_only = alive_only
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return queryset.alive() if self.alive_only else queryset
+
+    def with_deleted(self):
+        return super().get_queryset()
+
+    def deleted(self):
+        return self.with_deleted().deleted()
+
 
 class CustomUser(AbstractUser):
     GENDER_CHOICES = (
@@ -31,13 +136,160 @@ class CustomUser(AbstractUser):
 
     agree_to_terms = models.BooleanField(default=False)
 
-    # Soft delete flag
+    # Soft delete flag, and when it was set (purge_deleted_users hard
+    # deletes rows once this is older than the retention window)
     is_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(blank=True, null=True)
+
+    # Live users only; all_objects sees soft-deleted rows as well
+    objects = CustomUserManager()
+    all_objects = CustomUserManager(alive_only=False)
+
+    class Meta(AbstractUser.Meta):
+        # Auth, admin and ModelForm uniqueness checks go through the default
+        # manager and must still see soft-deleted rows.
+        default_manager_name = 'all_objects'
+        # Every admin query starts with is_deleted=False and pages on
+        # (date_joined, id), so each index is partial on live rows and ends
+        # with the pagination key to serve both the filter and the ordering.
+        indexes = [
+            models.Index(
+                fields=['date_joined', 'id'],
+                name='user_alive_joined_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(
+                fields=['gender', 'date_joined', 'id'],
+                name='user_alive_gender_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(
+                fields=['marital_status', 'date_joined', 'id'],
+                name='user_alive_marital_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(
+                fields=['gender', 'marital_status', 'date_joined', 'id'],
+                name='user_alive_gender_marital_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(
+                fields=['is_active', 'date_joined', 'id'],
+                name='user_alive_active_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(
+                fields=['is_staff', 'is_superuser', 'date_joined', 'id'],
+                name='user_alive_staff_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(
+                fields=['is_superuser', 'date_joined', 'id'],
+                name='user_alive_superuser_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+            # The purge walks soft-deleted rows oldest deletion first
+            models.Index(
+                fields=['deleted_at', 'id'],
+                name='user_deleted_at_idx',
+                condition=models.Q(is_deleted=True),
+            ),
+        ]
+        # Case-insensitive uniqueness, enforced by the database so that
+        # concurrent sign-ups can't race past an application-level check.
+        # Soft-deleted rows keep their username and email reserved.
+        constraints = [
+            models.UniqueConstraint(Lower('username'), name='user_username_ci_unique'),
+            models.UniqueConstraint(
+                Lower('email'),
+                name='user_email_ci_unique',
+                condition=~models.Q(email=''),
+            ),
+        ]
 
     def delete(self, *args, **kwargs):
         """Override default delete: perform soft delete"""
+        type(self).all_objects.filter(pk=self.pk).soft_delete()
         self.is_deleted = True
-        self.save()
 
     def __str__(self) -> str:
         return str(self.username or "")
+
+
+class DailySignups(models.Model):
+    """
+    Live sign-ups per day and gender/marital status combination, kept up to
+    date by ``web_app.signups`` so the analytics page never scans users.
+    Unset gender or marital status is stored as ''.
+    """
+    day = models.DateField()
+    gender = models.CharField(max_length=10, blank=True, default='')
+    marital_status = models.CharField(max_length=10, blank=True, default='')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'gender', 'marital_status'], name='daily_signups_unique'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.day} {self.gender or "-"}/{self.marital_status or "-"}: {self.count}'
+
+
+class AuditEvent(models.Model):
+    """
+    One user lifecycle event, written in batches by ``web_app.audit``.
+    ``actor`` did it (None when anonymous or the system); ``target`` is the
+    user it happened to. Neither is a database-level foreign key, and
+    purging a user leaves its events alone: queued events for it still
+    insert, and the trail keeps its id (see ``ArchivedUser``).
+    """
+    ACTION_CHOICES = (
+        ('login', 'Login'),
+        ('login_failed', 'Failed login'),
+        ('logout', 'Logout'),
+        ('register', 'Registration'),
+        ('user_created', 'User created'),
+        ('user_updated', 'User updated'),
+        ('soft_deleted', 'Soft deleted'),
+        ('restored', 'Restored'),
+        ('purged', 'Purged'),
+    )
+    created_at = models.DateTimeField()
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    actor = models.ForeignKey(
+        CustomUser, null=True, blank=True, on_delete=models.DO_NOTHING,
+        db_constraint=False, related_name='+')
+    target = models.ForeignKey(
+        CustomUser, null=True, blank=True, on_delete=models.DO_NOTHING,
+        db_constraint=False, related_name='+')
+    ip = models.GenericIPAddressField(null=True, blank=True)
+    details = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['target', 'created_at'], name='audit_target_idx'),
+            models.Index(fields=['created_at'], name='audit_created_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.created_at:%Y-%m-%d %H:%M:%S} {self.action}'
+
+
+class ArchivedUser(models.Model):
+    """
+    What is kept of a soft-deleted user once ``purge_deleted_users`` hard
+    deletes it: identity and dates as columns, the rest of the profile in
+    ``data``. The password hash is not kept.
+    """
+    user_id = models.BigIntegerField(unique=True)
+    username = models.CharField(max_length=150)
+    email = models.EmailField(blank=True)
+    date_joined = models.DateTimeField()
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField()
+    data = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+
+    def __str__(self) -> str:
+        return f'{self.username} (#{self.user_id})'
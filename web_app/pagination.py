@@ -0,0 +1,158 @@
+"""
+Keyset (cursor) pagination for the custom admin panel.
+
+Pages are addressed by the ``(date_joined, id)`` of a boundary row instead of
+an OFFSET, so fetching page 10 000 costs the same index range scan as page 1.
+Cursors are signed so they stay opaque to the browser and can't be forged.
+"""
+import json
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+
+CURSOR_SALT = 'web_app.pagination.cursor'
+
+
+def approximate_count(queryset):
+    """
+    Return the row count of ``queryset``.
+
+    On PostgreSQL the planner's row estimate is used, which avoids a full
+    COUNT(*) scan on large tables. Other backends fall back to an exact count.
+    """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+async def aapproximate_count(queryset):
+    """Async ``approximate_count()``."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return await queryset.order_by().acount()
+    return await sync_to_async(approximate_count)(queryset)
+
+
+class CursorPage:
+    """A single page of results plus the cursors pointing either side of it."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginate ``queryset`` on ``(date_joined, id)``.
+
+    ``ordering`` is either ``'date_joined'`` or ``'-date_joined'``; the primary
+    key is used as a tie-breaker so that rows sharing a timestamp are never
+    skipped or repeated.
+    """
+
+    def __init__(self, queryset, per_page, ordering='-date_joined'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.descending = ordering.startswith('-')
+
+    def encode_cursor(self, obj, reverse=False):
+        # Rows are model instances, or dicts from .values() with both fields
+        if isinstance(obj, dict):
+            date_joined, pk = obj['date_joined'], obj['id']
+        else:
+            date_joined, pk = obj.date_joined, obj.pk
+        return signing.dumps(
+            {'d': date_joined.isoformat(), 'k': pk, 'r': reverse},
+            salt=CURSOR_SALT, compress=True,
+        )
+
+    def decode_cursor(self, cursor):
+        """Return ``(date_joined, pk, reverse)`` or ``None`` for a bad cursor."""
+        if not cursor:
+            return None
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            return datetime.fromisoformat(data['d']), int(data['k']), bool(data['r'])
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return None
+
+    def _ordered(self, descending):
+        if descending:
+            return self.queryset.order_by('-date_joined', '-id')
+        return self.queryset.order_by('date_joined', 'id')
+
+    def _seek(self, queryset, date_joined, pk, descending):
+        # The leading range on date_joined keeps this an index range scan;
+        # the second clause only resolves ties on the boundary timestamp.
+        if descending:
+            return queryset.filter(
+                Q(date_joined__lte=date_joined),
+                Q(date_joined__lt=date_joined) | Q(id__lt=pk),
+            )
+        return queryset.filter(
+            Q(date_joined__gte=date_joined),
+            Q(date_joined__gt=date_joined) | Q(id__gt=pk),
+        )
+
+    def _page_query(self, cursor):
+        """The queryset to fetch for ``cursor`` and the position it starts at."""
+        position = self.decode_cursor(cursor)
+        if position is None:
+            return self._ordered(self.descending)[:self.per_page + 1], None
+        date_joined, pk, reverse = position
+        # Walking backwards flips the scan direction, then the page is
+        # put back into display order.
+        descending = self.descending != reverse
+        queryset = self._seek(self._ordered(descending), date_joined, pk, descending)
+        return queryset[:self.per_page + 1], position
+
+    def _make_page(self, rows, position, count):
+        overflow = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if position is None:
+            has_more, has_before = overflow, False
+        elif position[2]:  # walked backwards
+            rows.reverse()
+            has_more, has_before = True, overflow
+        else:
+            has_more, has_before = overflow, True
+
+        next_cursor = self.encode_cursor(rows[-1]) if rows and has_more else None
+        previous_cursor = self.encode_cursor(rows[0], reverse=True) if rows and has_before else None
+        return CursorPage(rows, next_cursor, previous_cursor, count)
+
+    def get_page(self, cursor=None, count=None):
+        queryset, position = self._page_query(cursor)
+        return self._make_page(list(queryset), position, count)
+
+    async def aget_page(self, cursor=None, count=None):
+        queryset, position = self._page_query(cursor)
+        return self._make_page([row async for row in queryset.aiterator()], position, count)
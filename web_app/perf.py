@@ -0,0 +1,240 @@
+"""
+Per-request performance instrumentation.
+
+Add ``web_app.perf.PerformanceMiddleware`` to ``settings.MIDDLEWARE`` (or set
+``PERF_MIDDLEWARE=True``) to time every request. For each one it records:
+
+* total time in the view and the middleware below it;
+* the number and total time of SQL queries, through a database execute
+  wrapper;
+* template render time, through ``TimedDjangoTemplates``;
+* password hashing time, through ``TimedPBKDF2PasswordHasher``.
+
+The numbers go out in a ``Server-Timing`` header (visible in the browser's
+network panel). They are also added to in-process histograms keyed by URL
+name, which ``metrics_view`` serves in Prometheus text format. The counters
+are cumulative since process start, as Prometheus expects; take ``rate()``
+over them for a rolling view.
+
+The template backend and the hasher only record while a request is being
+measured, so with the middleware off they cost one context variable lookup.
+"""
+import threading
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template import TemplateDoesNotExist
+
+_current = ContextVar('web_app_request_timings', default=None)
+
+# Upper bounds in seconds, as in Prometheus' default histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTimings:
+    """What one request spent its time on."""
+
+    __slots__ = ('queries', 'db', 'template', 'hashing')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.hashing = 0.0
+
+    def server_timing(self, total):
+        return (
+            f'app;dur={total * 1000:.1f}, '
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries", '
+            f'tpl;dur={self.template * 1000:.1f}, '
+            f'hash;dur={self.hashing * 1000:.1f}'
+        )
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db += perf_counter() - start
+        timings.queries += 1
+
+
+def _install_query_timer(connection):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+@receiver(connection_created)
+def _connection_created(sender, connection, **kwargs):
+    # Covers connections opened in other threads, e.g. the one async views
+    # hand their ORM calls to.
+    _install_query_timer(connection)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return super().render(context, request)
+        start = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template += perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing each top-level render."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class TimedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    Django's default hasher, timed. It keeps the ``pbkdf2_sha256`` algorithm
+    name, so existing hashes verify unchanged; list it instead of (not as
+    well as) ``PBKDF2PasswordHasher``.
+    """
+
+    def encode(self, password, salt, iterations=None):
+        timings = _current.get()
+        if timings is None:
+            return super().encode(password, salt, iterations)
+        start = perf_counter()
+        try:
+            return super().encode(password, salt, iterations)
+        finally:
+            timings.hashing += perf_counter() - start
+
+
+class ViewStats:
+    __slots__ = ('buckets', 'count', 'total', 'queries', 'db', 'template', 'hashing')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # the last one is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.hashing = 0.0
+
+
+class MetricsRegistry:
+    """Cumulative per-view request histograms and time breakdowns."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, view, total, timings):
+        index = next((i for i, bound in enumerate(BUCKETS) if total <= bound), len(BUCKETS))
+        with self._lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = ViewStats()
+            stats.buckets[index] += 1
+            stats.count += 1
+            stats.total += total
+            stats.queries += timings.queries
+            stats.db += timings.db
+            stats.template += timings.template
+            stats.hashing += timings.hashing
+
+    def reset(self):
+        with self._lock:
+            self.views = {}
+
+    def prometheus(self):
+        with self._lock:
+            views = sorted(self.views.items())
+            lines = [
+                '# HELP entryway_request_duration_seconds Time spent handling requests, by URL name.',
+                '# TYPE entryway_request_duration_seconds histogram',
+            ]
+            for view, stats in views:
+                cumulative = 0
+                for bound, hits in zip(BUCKETS + ('+Inf',), stats.buckets):
+                    cumulative += hits
+                    lines.append(
+                        f'entryway_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                lines.append(f'entryway_request_duration_seconds_sum{{view="{view}"}} {stats.total:.6f}')
+                lines.append(f'entryway_request_duration_seconds_count{{view="{view}"}} {stats.count}')
+            for name, attr, help_text in (
+                ('db_queries_total', 'queries', 'SQL queries executed.'),
+                ('db_seconds_total', 'db', 'Time spent in SQL queries.'),
+                ('template_seconds_total', 'template', 'Time spent rendering templates.'),
+                ('password_hash_seconds_total', 'hashing', 'Time spent hashing passwords.'),
+            ):
+                lines.append(f'# HELP entryway_{name} {help_text}')
+                lines.append(f'# TYPE entryway_{name} counter')
+                for view, stats in views:
+                    value = getattr(stats, attr)
+                    value = value if isinstance(value, int) else f'{value:.6f}'
+                    lines.append(f'entryway_{name}{{view="{view}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _start(self):
+        timings = RequestTimings()
+        return timings, _current.set(timings), perf_counter()
+
+    def _finish(self, request, response, timings, start):
+        total = perf_counter() - start
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        registry.observe(view, total, timings)
+        response['Server-Timing'] = timings.server_timing(total)
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings, token, start = self._start()
+        # Connections opened before this module was imported missed the
+        # connection_created hook
+        for connection in connections.all(initialized_only=True):
+            _install_query_timer(connection)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings, start)
+
+    async def __acall__(self, request):
+        timings, token, start = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings, start)
@@ -0,0 +1,272 @@
+"""
+Pluggable search backends for the admin user list.
+
+Each backend narrows a ``CustomUser`` queryset by a search term over
+``username``, ``email`` and ``gender``:
+
+* ``PostgresTrigramSearchBackend`` keeps Django's ``icontains`` SQL but backs
+  it with ``pg_trgm`` GIN indexes on ``UPPER(col::text)``, the exact
+  expression the ORM emits, so ``ILIKE '%term%'`` becomes an index scan.
+  Typeahead prefixes use B-tree indexes on ``LOWER(col) COLLATE "C"``.
+* ``SQLiteFTS5SearchBackend`` queries an FTS5 shadow table using the trigram
+  tokenizer, kept in sync by triggers on the user table.
+* ``IContainsSearchBackend`` is the portable fallback (sequential scan).
+
+The active backend comes from ``settings.USER_SEARCH_BACKEND`` (a dotted
+path) or is picked from the database vendor. Indexes are (re)built with
+``manage.py rebuild_search_index``.
+"""
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Collate, Greatest, Lower
+from django.utils.module_loading import import_string
+
+SEARCH_FIELDS = ('username', 'email', 'gender')
+
+
+class IContainsSearchBackend:
+    """Case-insensitive substring search with no supporting index."""
+
+    def __init__(self, using='default'):
+        self.using = using
+        self.connection = connections[using]
+
+    def _lookup_q(self, term, prefix=False):
+        lookup = 'istartswith' if prefix else 'icontains'
+        query = Q()
+        for field in SEARCH_FIELDS:
+            query |= Q(**{f'{field}__{lookup}': term})
+        return query
+
+    def filter(self, queryset, term, prefix=False):
+        """Restrict ``queryset`` to users matching ``term``."""
+        return queryset.filter(self._lookup_q(term, prefix))
+
+    def ranked(self, queryset, term, prefix=False):
+        """
+        Like ``filter()`` but annotated with ``search_rank`` and ordered by
+        relevance. Exact and prefix hits on the username rank first here.
+        """
+        rank = Case(
+            When(username__iexact=term, then=Value(3)),
+            When(username__istartswith=term, then=Value(2)),
+            When(email__istartswith=term, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        return self.filter(queryset, term, prefix).annotate(
+            search_rank=rank).order_by('-search_rank', 'username')
+
+    def prefix_search(self, queryset, term, field):
+        """
+        Users whose ``field`` starts with ``term`` (case-insensitive),
+        ordered by ``LOWER(field)``.
+        """
+        return queryset.filter(**{f'{field}__istartswith': term}).order_by(Lower(field))
+
+    def _prefix_range(self, queryset, term, key):
+        # In byte order an ASCII prefix is exactly the range [term, next
+        # prefix) of the lower-cased column, which an index on ``key`` holds
+        low = term.lower()
+        return queryset.alias(prefix_key=key).filter(
+            prefix_key__gte=low, prefix_key__lt=low[:-1] + chr(ord(low[-1]) + 1))
+
+    def is_installed(self):
+        return True
+
+    def rebuild(self, stdout=None):
+        """Create or refresh whatever index this backend relies on."""
+
+
+class PostgresTrigramSearchBackend(IContainsSearchBackend):
+    """
+    ``icontains``/``istartswith`` served by ``pg_trgm`` GIN indexes, and
+    ``prefix_search()`` by B-tree indexes on ``LOWER(field) COLLATE "C"``.
+    """
+
+    index_template = 'web_app_customuser_{field}_trgm'
+    prefix_index_template = 'web_app_customuser_{field}_prefix'
+    PREFIX_FIELDS = ('username', 'email')
+
+    def _indexes(self):
+        """``{index name: CREATE INDEX CONCURRENTLY statement}``."""
+        indexes = {
+            self.index_template.format(field=field): (
+                f'USING gin ((UPPER("{field}"::text)) gin_trgm_ops)')
+            for field in SEARCH_FIELDS
+        }
+        # C collation orders by byte, so the index serves both the prefix
+        # range and ORDER BY; only live users are ever suggested
+        indexes.update({
+            self.prefix_index_template.format(field=field): (
+                f'((LOWER("{field}") COLLATE "C")) WHERE NOT "is_deleted"')
+            for field in self.PREFIX_FIELDS
+        })
+        return {
+            name: f'CREATE INDEX CONCURRENTLY "{name}" ON web_app_customuser {definition}'
+            for name, definition in indexes.items()
+        }
+
+    def index_names(self):
+        return list(self._indexes())
+
+    def is_installed(self):
+        names = self.index_names()
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT count(*) FROM pg_indexes WHERE indexname = ANY(%s)',
+                [names],
+            )
+            return cursor.fetchone()[0] == len(names)
+
+    def prefix_search(self, queryset, term, field):
+        if field not in self.PREFIX_FIELDS or not term.isascii():
+            return super().prefix_search(queryset, term, field)
+        # The same expression as the index, for the range and the ordering
+        key = Collate(Lower(field), 'C')
+        return self._prefix_range(queryset, term, key).order_by(key)
+
+    def ranked(self, queryset, term, prefix=False):
+        from django.contrib.postgres.search import TrigramSimilarity
+        rank = Greatest(
+            TrigramSimilarity('username', term),
+            TrigramSimilarity('email', term),
+        )
+        return self.filter(queryset, term, prefix).annotate(
+            search_rank=rank).order_by('-search_rank', 'username')
+
+    def rebuild(self, stdout=None):
+        # CONCURRENTLY keeps the table writable while the index builds; it
+        # can't run inside a transaction, so this relies on autocommit.
+        with self.connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            indexes = self._indexes()
+            cursor.execute(
+                'SELECT indexname FROM pg_indexes WHERE indexname = ANY(%s)',
+                [list(indexes)],
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            for name, create in indexes.items():
+                if name in existing:
+                    cursor.execute(f'REINDEX INDEX CONCURRENTLY "{name}"')
+                else:
+                    cursor.execute(create)
+                if stdout:
+                    stdout.write(f'Rebuilt {name}')
+
+
+class SQLiteFTS5SearchBackend(IContainsSearchBackend):
+    """
+    Search through an external-content FTS5 table with the trigram tokenizer.
+
+    Trigrams give the same substring semantics as ``icontains``, but terms
+    shorter than three characters can't be served by the index and fall back
+    to the plain lookup.
+    """
+
+    table = 'web_app_customuser_search'
+    min_term_length = 3
+    _installed = None
+
+    def is_installed(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [self.table],
+            )
+            return cursor.fetchone() is not None
+
+    def _usable(self, term):
+        if len(term) < self.min_term_length:
+            return False
+        # Looked up once per backend instance, however many querysets it filters
+        if self._installed is None:
+            self._installed = self.is_installed()
+        return self._installed
+
+    def _match(self, term):
+        # A quoted FTS5 string is a phrase; with trigrams that's a substring.
+        return '"%s"' % term.replace('"', '""')
+
+    def filter(self, queryset, term, prefix=False):
+        if not self._usable(term):
+            return super().filter(queryset, term, prefix)
+        queryset = queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            [self._match(term)],
+        ))
+        if prefix:
+            # The trigram index narrows the candidates; the prefix check
+            # only runs against those rows.
+            queryset = queryset.filter(self._lookup_q(term, prefix=True))
+        return queryset
+
+    def ranked(self, queryset, term, prefix=False):
+        if not self._usable(term):
+            return super().ranked(queryset, term, prefix)
+        # FTS5's rank is bm25(), where lower means more relevant.
+        rank = RawSQL(
+            f'SELECT rank FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = web_app_customuser.id',
+            [self._match(term)],
+        )
+        return self.filter(queryset, term, prefix).annotate(
+            search_rank=rank).order_by('search_rank', 'username')
+
+    def prefix_search(self, queryset, term, field):
+        # SQLite's binary collation is byte order, and the case-insensitive
+        # unique indexes hold LOWER(field). The email index skips '', so the
+        # query must too.
+        if term.isascii():
+            queryset = self._prefix_range(queryset.exclude(**{field: ''}), term, Lower(field))
+        return super().prefix_search(queryset, term, field)
+
+    def rebuild(self, stdout=None):
+        columns = ', '.join(SEARCH_FIELDS)
+        new_values = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+        old_values = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+        delete_old = (
+            f"INSERT INTO {self.table}({self.table}, rowid, {columns}) "
+            f"VALUES ('delete', old.id, {old_values});"
+        )
+        insert_new = (
+            f'INSERT INTO {self.table}(rowid, {columns}) '
+            f'VALUES (new.id, {new_values});'
+        )
+        statements = [
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5('
+            f"{columns}, content='web_app_customuser', content_rowid='id', "
+            f"tokenize='trigram')",
+            f'CREATE TRIGGER IF NOT EXISTS {self.table}_ai AFTER INSERT '
+            f'ON web_app_customuser BEGIN {insert_new} END',
+            f'CREATE TRIGGER IF NOT EXISTS {self.table}_ad AFTER DELETE '
+            f'ON web_app_customuser BEGIN {delete_old} END',
+            f'CREATE TRIGGER IF NOT EXISTS {self.table}_au AFTER UPDATE OF {columns} '
+            f'ON web_app_customuser BEGIN {delete_old} {insert_new} END',
+            f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')",
+        ]
+        with self.connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+        self._installed = True
+        if stdout:
+            stdout.write(f'Rebuilt {self.table}')
+
+
+VENDOR_BACKENDS = {
+    'postgresql': PostgresTrigramSearchBackend,
+    'sqlite': SQLiteFTS5SearchBackend,
+}
+
+
+def get_search_backend(using='default'):
+    """Return the configured search backend for the ``using`` database."""
+    path = getattr(settings, 'USER_SEARCH_BACKEND', '')
+    if path:
+        backend_class = import_string(path)
+    else:
+        vendor = connections[using].vendor
+        backend_class = VENDOR_BACKENDS.get(vendor, IContainsSearchBackend)
+    return backend_class(using)
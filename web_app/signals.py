@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Sent once per bulk soft delete / restore instead of a post_save per row.
+# Receivers get ``pks``, the list of user ids whose is_deleted flag changed.
+users_soft_deleted = Signal()
+users_restored = Signal()
+
+# Sent after a bulk_create of users (e.g. a CSV import), which skips post_save.
+users_bulk_created = Signal()
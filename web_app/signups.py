@@ -0,0 +1,186 @@
+"""
+Daily sign-up rollup behind the admin analytics page.
+
+``DailySignups`` holds one row per day and gender/marital status
+combination, counting the live users who joined that day. The receivers
+below keep it current as users are created, edited, soft deleted, restored,
+deleted or bulk created. Each change is one ``INSERT ... ON CONFLICT DO
+NOTHING`` plus one ``UPDATE count = count + delta``, so concurrent sign-ups
+never overwrite each other's counts.
+
+The bulk signals only carry primary keys. Their users are grouped by day and
+combination in the database, ``PK_CHUNK`` ids at a time.
+
+``backfill()`` rebuilds the table from ``CustomUser.date_joined`` one window
+of days at a time, each in its own short transaction. Run it once after
+deploying, or whenever the counts are suspect.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Min, Max, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import CustomUser, DailySignups
+from .signals import users_bulk_created, users_restored, users_soft_deleted
+
+KEY_FIELDS = ('day', 'gender', 'marital_status')
+
+# Primary keys per grouping query (well under SQLite's bound-parameter limit)
+PK_CHUNK = 500
+
+
+def _day(value):
+    # TruncDate in the database uses the current time zone; match it
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def signup_key(user):
+    """The rollup row ``user`` counts towards, or None if it counts nowhere."""
+    if user.is_deleted or user.date_joined is None:
+        return None
+    return (_day(user.date_joined), user.gender or '', user.marital_status or '')
+
+
+def apply_deltas(deltas):
+    """Add ``{(day, gender, marital_status): delta}`` to the rollup."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    rows = [DailySignups(day=day, gender=gender, marital_status=marital)
+            for day, gender, marital in deltas]
+    matches = [(Q(day=day, gender=gender, marital_status=marital), delta)
+               for (day, gender, marital), delta in deltas.items()]
+    # No transaction needed: a zero row left behind by a failed update is
+    # harmless, and each UPDATE adds its deltas atomically
+    DailySignups.objects.bulk_create(rows, ignore_conflicts=True, batch_size=PK_CHUNK)
+    for start in range(0, len(matches), PK_CHUNK):
+        chunk = matches[start:start + PK_CHUNK]
+        keys = Q()
+        for match, _ in chunk:
+            keys |= match
+        DailySignups.objects.filter(keys).update(count=F('count') + Case(
+            *(When(match, then=Value(delta)) for match, delta in chunk), default=Value(0)))
+
+
+def _grouped(pks, sign, **filters):
+    deltas = {}
+    for start in range(0, len(pks), PK_CHUNK):
+        rows = (
+            CustomUser.all_objects.filter(pk__in=pks[start:start + PK_CHUNK], **filters)
+            .annotate(day=TruncDate('date_joined'))
+            .order_by().values_list(*KEY_FIELDS).annotate(n=Count('id'))
+        )
+        for day, gender, marital, n in rows:
+            key = (day, gender or '', marital or '')
+            deltas[key] = deltas.get(key, 0) + sign * n
+    return deltas
+
+
+# -- keeping it current ----------------------------------------------------
+
+@receiver(post_init, sender=CustomUser)
+def _remember_key(sender, instance, **kwargs):
+    # What the row counted towards when loaded, to spot edits that move it
+    instance._signup_key = signup_key(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=CustomUser)
+def _user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & {'date_joined', 'is_deleted', *KEY_FIELDS[1:]}:
+        return
+    old = None if created else getattr(instance, '_signup_key', None)
+    new = signup_key(instance)
+    if old != new:
+        deltas = {}
+        if old is not None:
+            deltas[old] = -1
+        if new is not None:
+            deltas[new] = deltas.get(new, 0) + 1
+        apply_deltas(deltas)
+        instance._signup_key = new
+
+
+@receiver(post_delete, sender=CustomUser)
+def _user_deleted(sender, instance, **kwargs):
+    key = signup_key(instance)
+    if key is not None:
+        apply_deltas({key: -1})
+
+
+@receiver(users_soft_deleted, sender=CustomUser)
+def _users_soft_deleted(sender, pks, **kwargs):
+    apply_deltas(_grouped(pks, -1))
+
+
+@receiver(users_restored, sender=CustomUser)
+def _users_restored(sender, pks, **kwargs):
+    apply_deltas(_grouped(pks, 1))
+
+
+@receiver(users_bulk_created, sender=CustomUser)
+def _users_bulk_created(sender, pks, **kwargs):
+    apply_deltas(_grouped(pks, 1, is_deleted=False))
+
+
+# -- rebuilding and reading ------------------------------------------------
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def backfill(chunk_days=30):
+    """
+    Rebuild the rollup from the user table, ``chunk_days`` days per
+    transaction, oldest first. Yields ``(first_day, last_day, users)`` as
+    each window is written.
+    """
+    bounds = CustomUser.objects.aggregate(first=Min('date_joined'), last=Max('date_joined'))
+    if bounds['first'] is None:
+        DailySignups.objects.all().delete()
+        return
+    first, last = _day(bounds['first']), _day(bounds['last'])
+    # Days outside the live users' range can only hold stale counts
+    DailySignups.objects.filter(Q(day__lt=first) | Q(day__gt=last)).delete()
+    day = first
+    while day <= last:
+        end = min(day + timedelta(days=chunk_days), last + timedelta(days=1))
+        rows = (
+            CustomUser.objects
+            .filter(date_joined__gte=_day_start(day), date_joined__lt=_day_start(end))
+            .annotate(day=TruncDate('date_joined'))
+            .order_by().values_list(*KEY_FIELDS).annotate(n=Count('id'))
+        )
+        with transaction.atomic():
+            DailySignups.objects.filter(day__gte=day, day__lt=end).delete()
+            stats = DailySignups.objects.bulk_create([
+                DailySignups(day=row_day, gender=gender or '', marital_status=marital or '', count=n)
+                for row_day, gender, marital, n in rows
+            ])
+        yield day, end - timedelta(days=1), sum(row.count for row in stats)
+        day = end
+
+
+def signup_summary(days=30):
+    """
+    Sign-ups over the last ``days`` days, read from the rollup alone:
+    ``{'days': [(day, count), ...], 'breakdown': [(gender, marital_status,
+    count), ...], 'total': count}``. Days without sign-ups are listed as 0.
+    """
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    window = DailySignups.objects.filter(day__gte=start, day__lte=today)
+    per_day = dict(window.order_by().values_list('day').annotate(n=Sum('count')))
+    breakdown = list(
+        window.order_by('gender', 'marital_status')
+        .values_list('gender', 'marital_status').annotate(n=Sum('count'))
+    )
+    return {
+        'days': [(start + timedelta(days=i), per_day.get(start + timedelta(days=i), 0))
+                 for i in range(days)],
+        'breakdown': [row for row in breakdown if row[2]],
+        'total': sum(per_day.values()),
+    }
@@ -0,0 +1,143 @@
+"""
+Typeahead suggestions for the admin dashboard search box.
+
+``suggest_users(term)`` returns up to ``settings.USER_SUGGEST_LIMIT`` live
+users whose username, then email, starts with ``term``. Each field is one
+query. For an ASCII term the search backend's ``prefix_search()`` walks an
+index on ``LOWER(field)`` in order (the case-insensitive unique index on
+SQLite, the C-collated index ``rebuild_search_index`` adds on PostgreSQL),
+so a LIMIT ends the scan after a handful of rows, however large the table
+is.
+
+Results go in a per-process LRU of recent terms
+(``settings.USER_SUGGEST_CACHE_SIZE`` entries). The cache is emptied
+whenever the user-list version (``facets.users_version()``) moves. Typing
+usually extends the previous term. When the cached result for a shorter
+prefix held every match, the longer term is filtered from it in Python
+and never reaches the database.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .facets import users_version
+from .models import CustomUser
+from .search import get_search_backend
+
+SUGGEST_COLUMNS = ('id', 'username', 'email')
+
+# Longer terms can't match a username or email
+MAX_TERM_LENGTH = 254
+
+
+def _key(term):
+    # istartswith folds ASCII case everywhere; leave anything else as typed
+    return term.lower() if term.isascii() else term
+
+
+def _query(term, limit, backend):
+    users = CustomUser.objects.values(*SUGGEST_COLUMNS)  # live users only
+    by_username = list(backend.prefix_search(users, term, 'username')[:limit])
+    if len(by_username) == limit:
+        return by_username, False
+    wanted = limit - len(by_username)
+    by_email = list(
+        backend.prefix_search(users, term, 'email')
+        .exclude(username__istartswith=term)[:wanted]
+    )
+    return by_username + by_email, len(by_email) < wanted
+
+
+def _narrow(results, term):
+    """The users in a complete result for a shorter prefix that match ``term``."""
+    by_username = [user for user in results if _key(user['username']).startswith(term)]
+    by_email = sorted(
+        (user for user in results
+         if _key(user['email']).startswith(term) and not _key(user['username']).startswith(term)),
+        key=lambda user: _key(user['email']),
+    )
+    return by_username + by_email
+
+
+class SuggestionCache:
+    """LRU of ``term -> (results, complete)`` for one user-list version."""
+
+    def __init__(self, size=2048):
+        self.size = size
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'narrowed': 0, 'misses': 0}
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def suggest(self, term, limit, backend=None):
+        key = _key(term)
+        version = users_version()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._get(key)
+            if entry is not None:
+                self.stats['hits'] += 1
+                return entry[0]
+            if term.isascii():
+                for end in range(len(key) - 1, 0, -1):
+                    shorter = self._entries.get(key[:end])
+                    if shorter is not None and shorter[1]:
+                        results = _narrow(shorter[0], key)
+                        self._put(key, (results, True))
+                        self.stats['narrowed'] += 1
+                        return results
+            self.stats['misses'] += 1
+        results, complete = _query(term, limit, backend or get_search_backend())
+        with self._lock:
+            if self._version == version:
+                self._put(key, (results, complete))
+        return results
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_suggestion_cache():
+    """Return the process-wide SuggestionCache sized from settings."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SuggestionCache(settings.USER_SUGGEST_CACHE_SIZE)
+    return _cache
+
+
+@receiver(setting_changed)
+def _reset_suggestion_cache(setting, **kwargs):
+    global _cache
+    if setting in ('USER_SUGGEST_CACHE_SIZE', 'USER_SUGGEST_LIMIT'):
+        _cache = None
+
+
+def suggest_users(term):
+    """
+    Up to ``USER_SUGGEST_LIMIT`` ``{'id', 'username', 'email'}`` dicts for
+    live users whose username (listed first) or email starts with ``term``.
+    """
+    term = term.strip()
+    if not term or len(term) > MAX_TERM_LENGTH:
+        return []
+    return get_suggestion_cache().suggest(term, settings.USER_SUGGEST_LIMIT)
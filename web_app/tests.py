@@ -1,8 +1,84 @@
-from django.test import TestCase
-from .models import CustomUser
+import csv
+import gzip
+import importlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from contextlib import ContextDecorator
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from itertools import product
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+
+from django.test import (
+    Client, SimpleTestCase, TestCase, TransactionTestCase, modify_settings, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from . import urls as web_app_urls
+from django.utils import timezone
+from .audit import AuditLog, get_audit_log
+from .backends import user_cache_key
+from .models import ArchivedUser, AuditEvent, CustomUser, DailySignups
+from .hashing import HashingPool, HashingPoolSaturated
+from .middleware import AsyncWhiteNoiseMiddleware
+from .benchmarks import (
+    dashboard_combinations, generate_users, run_audit_benchmarks, run_concurrency_check,
+    run_render_benchmarks, run_server_mode_benchmarks, run_view_benchmarks,
+)
+from .export import EXPORT_FIELDS
+from .facets import get_user_facets
+from .importer import import_users, queue_import
+from .pagination import CursorPaginator
+from .perf import TimedPBKDF2PasswordHasher, registry as perf_registry
+from .search import get_search_backend
+from .storage import MinifiedCompressedManifestStaticFilesStorage
+from .throttle import LoginThrottle, get_login_throttle
+from .signals import users_soft_deleted
 from django.contrib.auth.hashers import make_password
 from django.utils.dateparse import parse_date
 
+# Audit events stay queued until a test flushes them, instead of a writer
+# thread inserting them from outside the test's transaction. Admin imports
+# run in the request, against the test database, hashing in-process. Tests
+# run in one process, so the in-process cache counts as shared, and without
+# collectstatic, so assets are linked by their plain names.
+_import_dir = tempfile.mkdtemp()
+_module_settings = override_settings(
+    AUDIT_LOG={**settings.AUDIT_LOG, 'BACKGROUND': False},
+    SHARED_CACHE=True,
+    AUTH_USER_CACHE_TIMEOUT=300,
+    USER_IMPORT_BACKGROUND=False,
+    USER_IMPORT_DIR=_import_dir,
+    USER_IMPORT_WORKERS=0,
+    WHITENOISE_MANIFEST_STRICT=False,
+)
+
+
+def setUpModule():
+    _module_settings.enable()
+
+
+def tearDownModule():
+    _module_settings.disable()
+    shutil.rmtree(_import_dir, ignore_errors=True)
+
+
 class CustomUserDBTest(TestCase):
     # def test_user_creation_and_retrieval(self):
     #     username = 'testuser'
@@ -53,3 +129,1841 @@ class CustomUserDBTest(TestCase):
         # self.assertTrue(any(u['username'] == 'user1' for u in users_list))
         # self.assertTrue(any(u['username'] == 'user2' for u in users_list))
 
+    def test_keeps_the_auth_user_labels(self):
+        # Meta extends AbstractUser.Meta, so admin and permission labels stay "user"
+        self.assertEqual(CustomUser._meta.verbose_name, 'user')
+        self.assertEqual(CustomUser._meta.verbose_name_plural, 'users')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AdminDashboardPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        # Shared timestamps force the id tie-breaker to do its job
+        joined = timezone.now()
+        for i in range(24):
+            CustomUser.objects.create(
+                username=f'user{i:02d}', email=f'user{i:02d}@example.com',
+                date_joined=joined - timedelta(days=i // 3),
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def walk(self, ordering):
+        url = reverse('admin_dashboard')
+        response = self.client.get(url, {'ordering': ordering})
+        pages = [[u.username for u in response.context['page_obj']]]
+        while response.context['page_obj'].has_next():
+            response = self.client.get(url, {
+                'ordering': ordering,
+                'cursor': response.context['page_obj'].next_cursor,
+            })
+            pages.append([u.username for u in response.context['page_obj']])
+        return pages, response
+
+    def test_cursor_pages_cover_every_user_once(self):
+        for ordering in ('-date_joined', 'date_joined'):
+            pages, _ = self.walk(ordering)
+            seen = [name for page in pages for name in page]
+            expected = list(
+                CustomUser.objects.filter(is_deleted=False)
+                .order_by(ordering, ordering.replace('date_joined', 'id'))
+                .values_list('username', flat=True)
+            )
+            self.assertEqual(seen, expected)
+            self.assertEqual([len(p) for p in pages], [10, 10, 5])
+
+    def test_previous_cursor_returns_prior_page(self):
+        pages, last = self.walk('-date_joined')
+        response = self.client.get(reverse('admin_dashboard'), {
+            'ordering': '-date_joined',
+            'cursor': last.context['page_obj'].previous_cursor,
+        })
+        self.assertEqual([u.username for u in response.context['page_obj']], pages[-2])
+        self.assertTrue(response.context['page_obj'].has_next())
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('admin_dashboard'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_previous())
+        self.assertEqual(response.context['page_obj'].count, 25)
+
+class UserSearchBackendTest(TransactionTestCase):
+    # The FTS5 shadow table is DDL; building it inside TestCase's rolled-back
+    # transaction leaves SQLite's shared in-memory test database unusable.
+    def setUp(self):
+        CustomUser.objects.create(username='ayoob', email='ayoob@gmail.com', gender='Male')
+        CustomUser.objects.create(username='mariam', email='mariam@yahoo.com', gender='Female')
+        CustomUser.objects.create(username='gmailfan', email='fan@proton.me', gender='Other')
+
+    def names(self, queryset):
+        return sorted(queryset.values_list('username', flat=True))
+
+    def test_search_matches_substrings_before_and_after_index_build(self):
+        backend = get_search_backend()
+        before = self.names(backend.filter(CustomUser.objects.all(), 'GMAIL'))
+        call_command('rebuild_search_index', stdout=StringIO())
+        after = self.names(backend.filter(CustomUser.objects.all(), 'GMAIL'))
+        self.assertEqual(before, ['ayoob', 'gmailfan'])
+        self.assertEqual(after, before)
+
+    def test_index_follows_inserts_and_updates(self):
+        call_command('rebuild_search_index', stdout=StringIO())
+        backend = get_search_backend()
+        user = CustomUser.objects.create(username='zeynab', email='z@corp.io')
+        self.assertEqual(self.names(backend.filter(CustomUser.objects.all(), 'zeyn')), ['zeynab'])
+        user.username = 'zara'
+        user.save()
+        self.assertEqual(self.names(backend.filter(CustomUser.objects.all(), 'zeyn')), [])
+
+    def test_prefix_and_ranked_matching(self):
+        call_command('rebuild_search_index', stdout=StringIO())
+        backend = get_search_backend()
+        self.assertEqual(
+            self.names(backend.filter(CustomUser.objects.all(), 'gma', prefix=True)),
+            ['gmailfan'],
+        )
+        ranked = backend.ranked(CustomUser.objects.all(), 'mariam')
+        self.assertEqual(ranked.first().username, 'mariam')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AdminDashboardIndexUsageTest(TestCase):
+    """EXPLAIN every dashboard query to prove the partial indexes are used."""
+
+    FILTER_CHOICES = {
+        'gender': ['', 'Male'],
+        'marital_status': ['', 'Single'],
+        'is_active': ['', 'Yes'],
+        'is_staff': ['', 'No'],
+        'is_superuser': ['', 'Yes'],
+        'ordering': ['-date_joined', 'date_joined'],
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123',
+            gender='Male', marital_status='Single')
+        CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f'user{i}', email=f'user{i}@example.com',
+                gender='Male', marital_status='Single',
+                is_superuser=True, is_deleted=(i % 5 == 0),
+            )
+            for i in range(30)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def plan_uses_index(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Tiny test tables always favour a seq scan; forbid it to
+                # check that an index *can* serve the query.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+                return 'Seq Scan on web_app_customuser' not in plan, plan
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            steps = [row[-1] for row in cursor.fetchall()]
+            plan = '\n'.join(steps)
+            full_scans = [
+                step for step in steps
+                if step.startswith('SCAN web_app_customuser') and 'INDEX' not in step
+            ]
+            return not full_scans, plan
+
+    def dashboard_queries(self, params):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('admin_dashboard'), params)
+        queries = [q['sql'] for q in captured.captured_queries]
+        page = response.context['page_obj']
+        if page.has_next():
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get(reverse('admin_dashboard'), {**params, 'cursor': page.next_cursor})
+            queries += [q['sql'] for q in captured.captured_queries]
+        return [
+            sql for sql in queries
+            if sql.startswith('SELECT') and '"is_deleted"' in sql
+        ]
+
+    def test_every_filter_combination_hits_an_index(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest('EXPLAIN checks are written for SQLite and PostgreSQL')
+        keys = list(self.FILTER_CHOICES)
+        checked = 0
+        for values in product(*self.FILTER_CHOICES.values()):
+            params = {k: v for k, v in zip(keys, values) if v}
+            for sql in self.dashboard_queries(params):
+                uses_index, plan = self.plan_uses_index(sql)
+                self.assertTrue(uses_index, f'{params}\n{sql}\n{plan}')
+                checked += 1
+        self.assertGreater(checked, 0)
+
+
+class SoftDeleteManagerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.live = CustomUser.objects.create(username='live', email='live@example.com')
+        cls.gone = CustomUser.objects.create(
+            username='gone', email='gone@example.com', is_deleted=True)
+
+    def test_default_queryset_hides_soft_deleted_users(self):
+        self.assertQuerySetEqual(CustomUser.objects.all(), [self.live])
+        self.assertQuerySetEqual(CustomUser.objects.deleted(), [self.gone])
+        self.assertEqual(CustomUser.objects.with_deleted().count(), 2)
+        self.assertEqual(CustomUser.all_objects.alive().get(), self.live)
+
+    def test_auth_still_sees_soft_deleted_users(self):
+        # login_view relies on this to tell deactivated accounts apart
+        self.assertEqual(CustomUser._default_manager.get_by_natural_key('gone'), self.gone)
+
+    def test_soft_delete_and_restore_update_in_chunks(self):
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'bulk{i}', email=f'bulk{i}@example.com') for i in range(4)
+        ])
+        received = []
+        users_soft_deleted.connect(lambda **kw: received.append(kw['pks']), weak=False,
+                                   dispatch_uid='test-soft-deleted')
+        self.addCleanup(users_soft_deleted.disconnect, dispatch_uid='test-soft-deleted')
+
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(CustomUser.objects.soft_delete(chunk_size=2), 5)
+        updates = [q for q in captured.captured_queries
+                   if q['sql'].startswith('UPDATE "web_app_customuser"')]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(len(received), 1)
+        self.assertEqual(len(received[0]), 5)
+
+        self.assertEqual(CustomUser.objects.deleted().restore(), 6)
+        self.assertEqual(CustomUser.objects.count(), 6)
+
+    def test_instance_delete_is_soft(self):
+        self.live.delete()
+        self.assertTrue(CustomUser.all_objects.filter(pk=self.live.pk, is_deleted=True).exists())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CustomUserAdminActionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'user{i}', email=f'user{i}@example.com',
+                       gender='Male' if i % 2 else 'Female')
+            for i in range(10)
+        ])
+        cls.url = reverse('admin:web_app_customuser_changelist')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def run_action(self, action, pks, query='', select_across=False):
+        return self.client.post(self.url + query, {
+            'action': action,
+            '_selected_action': [str(pk) for pk in pks],
+            'select_across': '1' if select_across else '0',
+        }, follow=True)
+
+    def test_soft_delete_and_restore_selected(self):
+        pks = list(CustomUser.objects.filter(gender='Male').values_list('pk', flat=True))
+        response = self.run_action('soft_delete_selected', pks)
+        self.assertContains(response, '5 user(s) soft deleted.')
+        self.assertEqual(CustomUser.objects.deleted().count(), 5)
+
+        response = self.run_action('restore_selected', pks, '?is_deleted__exact=1')
+        self.assertContains(response, '5 user(s) restored.')
+        self.assertEqual(CustomUser.objects.deleted().count(), 0)
+
+    def test_select_across_acts_on_every_matching_user(self):
+        one = CustomUser.objects.filter(gender='Female').values_list('pk', flat=True)[:1]
+        response = self.run_action('soft_delete_selected', one, '?gender__exact=Female', select_across=True)
+        self.assertContains(response, '5 user(s) soft deleted.')
+        self.assertFalse(CustomUser.objects.filter(gender='Female').exists())
+        self.assertEqual(CustomUser.objects.filter(gender='Male').count(), 5)
+
+        response = self.run_action(
+            'restore_selected', one, '?is_deleted__exact=1&gender__exact=Female', select_across=True)
+        self.assertContains(response, '5 user(s) restored.')
+        self.assertEqual(CustomUser.objects.filter(gender='Female').count(), 5)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AdminExportUsersTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'user{i}', email=f'user{i}@example.com',
+                       gender='Female' if i % 3 else 'Male', is_deleted=(i == 4))
+            for i in range(9)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def export(self, **params):
+        response = self.client.get(reverse('admin_export_users'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_export_applies_dashboard_filters(self):
+        response, body = self.export(format='csv', gender='Female', ordering='date_joined')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(StringIO(body.decode())))
+        self.assertEqual(
+            [row['username'] for row in rows],
+            ['user1', 'user2', 'user5', 'user7', 'user8'],
+        )
+        self.assertNotIn('password', rows[0])
+
+    def test_gzipped_ndjson_export(self):
+        response, body = self.export(format='ndjson', gzip='1', search='user')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.ndjson.gz', response['Content-Disposition'])
+        lines = gzip.decompress(body).decode().splitlines()
+        users = [json.loads(line) for line in lines]
+        self.assertEqual(len(users), 8)
+        self.assertNotIn('user4', {u['username'] for u in users})
+
+    async def test_asgi_export_streams_asynchronously(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(
+            reverse('admin_export_users'), {'format': 'csv', 'gzip': '1', 'ordering': 'date_joined'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        rows = list(csv.DictReader(StringIO(gzip.decompress(body).decode())))
+        self.assertEqual(len(rows), 9)
+        self.assertEqual(rows[0]['username'], 'admin')
+
+    def test_empty_export_keeps_the_header(self):
+        response, body = self.export(format='csv', search='nobody')
+        self.assertEqual(body.decode().strip(), ','.join(EXPORT_FIELDS))
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(reverse('admin_export_users'), {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserImportTest(TestCase):
+    CSV = (
+        "username,email,password,dob,gender,marital_status,is_staff\n"
+        "alice,alice@example.com,Password123,1990-05-01,Female,Single,no\n"
+        "taken,new@example.com,Password123,,,,\n"
+        "bob,bob@example.com,short,,,,\n"
+        "carol,not-an-email,Password123,,,,\n"
+        "dave,dave@example.com,Password123,,Male,Married,yes\n"
+        "alice,alice2@example.com,Password123,,,,\n"
+        "erin,erin@example.com,Password123,,Robot,,\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        CustomUser.objects.create(username='taken', email='taken@example.com', is_deleted=True)
+
+    def setUp(self):
+        # Forget the (mocked) import processes each test starts
+        processes = mock.patch.dict('web_app.importer._processes')
+        processes.start()
+        self.addCleanup(processes.stop)
+
+    def test_import_reports_row_errors_without_aborting(self):
+        result = import_users(StringIO(self.CSV), batch_size=3, workers=0)
+        self.assertEqual(result.created, 2)
+        self.assertEqual([line for line, _, _ in result.errors], [3, 4, 5, 7, 8])
+        dave = CustomUser.objects.get(username='dave')
+        self.assertTrue(dave.is_staff)
+        self.assertTrue(dave.check_password('Password123'))
+        self.assertEqual(CustomUser.objects.get(username='alice').dob.isoformat(), '1990-05-01')
+
+    def test_uniqueness_is_checked_once_per_batch(self):
+        rows = ''.join(f"user{i},user{i}@example.com,Password123\n" for i in range(10))
+        with CaptureQueriesContext(connection) as captured:
+            result = import_users(StringIO("username,email,password\n" + rows),
+                                  batch_size=5, workers=0)
+        self.assertEqual(result.created, 10)
+        # The sign-up rollup's GROUP BY over the new rows is not a lookup
+        lookups = [q for q in captured.captured_queries
+                   if q['sql'].startswith('SELECT') and 'web_app_customuser' in q['sql']
+                   and 'GROUP BY' not in q['sql']]
+        self.assertEqual(len(lookups), 2)
+
+    def test_clash_after_the_check_counts_each_signup_once(self):
+        from django.db.models import Sum
+        real_make_password = make_password
+
+        def hash_and_clash(password):
+            # Another sign-up takes 'zed' between the batch check and the insert
+            if not CustomUser.all_objects.filter(username='zed').exists():
+                CustomUser.objects.create(username='zed', email='zed@example.com')
+            return real_make_password(password)
+
+        rows = "username,email,password\nyan,yan@example.com,Password123\nzed,zed2@example.com,Password123\n"
+        with mock.patch('web_app.importer.make_password', side_effect=hash_and_clash):
+            result = import_users(StringIO(rows), workers=0)
+        self.assertEqual(result.created, 1)
+        self.assertEqual([line for line, _, _ in result.errors], [3])
+        # 'taken' is soft deleted; yan and the concurrent zed are counted once each
+        self.assertEqual(DailySignups.objects.aggregate(total=Sum('count'))['total'], 2)
+
+    def test_missing_columns_are_reported(self):
+        result = import_users(StringIO("username,email\nx,x@example.com\n"), workers=0)
+        self.assertEqual(result.created, 0)
+        self.assertIn('password', result.errors[0][2])
+
+    def test_admin_upload_runs_as_a_job(self):
+        admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile('users.csv', self.CSV.encode(), content_type='text/csv')
+        response = self.client.post(reverse('admin_import_users'), {'file': upload}, follow=True)
+        self.assertContains(response, '2 user(s) imported')
+        self.assertContains(response, 'Malformed gender value.')
+        # The uploaded file goes once the job is done
+        self.assertEqual([name for name in os.listdir(settings.USER_IMPORT_DIR)
+                          if name.endswith('.csv')], [])
+
+    def test_background_upload_starts_the_command(self):
+        admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile('users.csv', self.CSV.encode(), content_type='text/csv')
+        with self.settings(USER_IMPORT_BACKGROUND=True), mock.patch('subprocess.Popen') as popen:
+            popen.return_value.poll.return_value = None  # still running
+            response = self.client.post(reverse('admin_import_users'), {'file': upload})
+            job_id = response.url.rstrip('/').rsplit('/', 1)[-1]
+            self.assertEqual(popen.call_args.args[0][-3:], ['import_users', '--job', job_id])
+            self.assertContains(self.client.get(response.url), 'Importing')
+
+            # One job at a time: a second upload is turned away
+            upload = SimpleUploadedFile('more.csv', self.CSV.encode(), content_type='text/csv')
+            response = self.client.post(reverse('admin_import_users'), {'file': upload}, follow=True)
+            self.assertContains(response, 'Another import is still running')
+            self.assertEqual(popen.call_count, 1)
+
+            url = reverse('admin_import_status', args=[job_id])
+            call_command('import_users', '--job', job_id, '--workers', '0', stdout=StringIO(), stderr=StringIO())
+            self.assertContains(self.client.get(url), '2 user(s) imported')
+        self.assertTrue(CustomUser.objects.filter(username='dave').exists())
+
+    def test_background_job_that_never_finishes_is_failed(self):
+        admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        self.client.force_login(admin)
+
+        def upload():
+            file = SimpleUploadedFile('users.csv', self.CSV.encode(), content_type='text/csv')
+            return self.client.post(reverse('admin_import_users'), {'file': file}, follow=True)
+
+        with self.settings(USER_IMPORT_BACKGROUND=True):
+            with mock.patch('subprocess.Popen', side_effect=OSError('no python')):
+                self.assertContains(upload(), 'could not be started: no python')
+            # The process exits without marking the job done
+            with mock.patch('subprocess.Popen') as popen:
+                popen.return_value.poll.return_value = 1
+                popen.return_value.returncode = 1
+                self.assertContains(upload(), 'exited with code 1')
+            # A job whose process never marked it running
+            with mock.patch('subprocess.Popen') as popen, \
+                    mock.patch('web_app.importer.time.time', return_value=0):
+                popen.return_value.poll.return_value = None
+                response = upload()
+            self.assertContains(self.client.get(response.request['PATH_INFO']), 'never started')
+
+    def test_unknown_job_is_404(self):
+        admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        self.client.force_login(admin)
+        url = reverse('admin_import_status', args=['00000000-0000-0000-0000-000000000000'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+def reload_urlconf():
+    # urls.py picks sync or async views at import time
+    importlib.reload(import_module('web_app.urls'))
+    importlib.reload(import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+class HashingPoolTest(SimpleTestCase):
+    def test_rejects_work_once_workers_and_queue_are_full(self):
+        pool = HashingPool(max_workers=1, max_queue=1)
+        release = threading.Event()
+        running = pool.submit(release.wait)
+        queued = pool.submit(lambda: 'done')
+        with self.assertRaises(HashingPoolSaturated):
+            pool.submit(lambda: 'rejected')
+        self.assertEqual(pool.stats()['rejected'], 1)
+        release.set()
+        self.assertTrue(running.result(timeout=5))
+        self.assertEqual(queued.result(timeout=5), 'done')
+        self.assertEqual(pool.run(lambda: 'again'), 'again')
+
+
+@override_settings(
+    ASYNC_AUTH_VIEWS=True,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class AsyncAuthViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        reload_urlconf()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        reload_urlconf()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='ayoob', email='ayoob@example.com', password='Password123')
+        cls.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+
+    async def test_login_success_and_failure(self):
+        response = await self.async_client.post(
+            reverse('login'), {'username': 'ayoob', 'password': 'wrong-password'})
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+
+        response = await self.async_client.post(
+            reverse('login'), {'username': 'ayoob', 'password': 'Password123'})
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertEqual(await self.async_client.session.aget('_auth_user_id'), str(self.user.pk))
+
+    async def test_login_page_renders(self):
+        self.assertTrue(iscoroutinefunction(resolve(reverse('login')).func))
+        response = await self.async_client.get(reverse('login'))
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    async def test_saturated_pool_returns_503(self):
+        with mock.patch.object(HashingPool, 'submit', side_effect=HashingPoolSaturated):
+            response = await self.async_client.post(
+                reverse('login'), {'username': 'ayoob', 'password': 'Password123'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    async def test_register_hashes_on_the_pool(self):
+        response = await self.async_client.post(reverse('register'), {
+            'username': 'mariam', 'email': 'mariam@example.com',
+            'password1': 'Password123', 'password2': 'Password123',
+            'gender': 'Female', 'marital_status': 'Single', 'terms': 'on',
+        })
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        user = await CustomUser.objects.aget(username='mariam')
+        self.assertTrue(user.check_password('Password123'))
+
+    async def test_admin_login_and_create_user(self):
+        response = await self.async_client.post(
+            reverse('admin_login'), {'username': 'admin', 'password': 'AdminPass123'})
+        self.assertRedirects(response, reverse('admin_dashboard'), fetch_redirect_response=False)
+
+        response = await self.async_client.post(reverse('admin_create_user'), {
+            'username': 'newbie', 'email': 'newbie@example.com',
+            'password': 'Password123', 'confirm_password': 'Password123',
+            'is_active': 'on',
+        })
+        self.assertRedirects(response, reverse('admin_dashboard'), fetch_redirect_response=False)
+        self.assertTrue(await CustomUser.objects.filter(username='newbie', is_active=True).aexists())
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    LOGIN_THROTTLE={'CACHE': 'default', 'WINDOW': 300, 'IP_LIMIT': 10,
+                    'USERNAME_LIMIT': 3, 'LOCKOUT_BASE': 30, 'LOCKOUT_MAX': 3600},
+)
+class LoginThrottleTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='ayoob', email='ayoob@example.com', password='Password123')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def fail_login(self, username='ayoob'):
+        return self.client.post(reverse('login'), {'username': username, 'password': 'wrong-password'})
+
+    def test_lockout_skips_authenticate(self):
+        for _ in range(3):
+            self.fail_login()
+        saved = get_login_throttle().hashes_saved
+        with mock.patch('web_app.views.authenticate') as authenticate:
+            response = self.client.post(
+                reverse('login'), {'username': 'ayoob', 'password': 'Password123'})
+        authenticate.assert_not_called()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(get_login_throttle().hashes_saved, saved + 1)
+
+    def test_username_is_case_insensitive(self):
+        for username in ('ayoob', 'AYOOB', 'Ayoob'):
+            self.fail_login(username)
+        self.assertEqual(self.fail_login('aYoOb').status_code, 429)
+
+    def test_ip_limit_spans_usernames(self):
+        for i in range(10):
+            self.fail_login(f'user{i}')
+        self.assertEqual(self.fail_login('someone-else').status_code, 429)
+
+    def test_success_resets_username_counter(self):
+        for _ in range(2):
+            self.fail_login()
+        response = self.client.post(
+            reverse('login'), {'username': 'ayoob', 'password': 'Password123'})
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.client.logout()
+        for _ in range(2):
+            self.assertEqual(self.fail_login().status_code, 302)
+
+    def test_admin_login_is_throttled(self):
+        for _ in range(3):
+            self.client.post(reverse('admin_login'), {'username': 'ayoob', 'password': 'nope'})
+        response = self.client.post(reverse('admin_login'), {'username': 'ayoob', 'password': 'nope'})
+        self.assertEqual(response.status_code, 429)
+
+    def test_lockout_doubles_on_repeat(self):
+        throttle = LoginThrottle(window=300, username_limit=1, ip_limit=100, lockout_base=30)
+        request = self.client.get(reverse('login')).wsgi_request
+        now = 1_000_000.0
+        with mock.patch('web_app.throttle.time.time', side_effect=lambda: now):
+            throttle.record_failure(request, 'ayoob')
+            self.assertEqual(throttle.check(request, 'ayoob'), 30)
+            now += 30
+            self.assertEqual(throttle.check(request, 'ayoob'), 0)
+            throttle.record_failure(request, 'ayoob')
+            self.assertEqual(throttle.check(request, 'ayoob'), 60)
+        self.assertEqual(throttle._lock_seconds(20), 3600)
+        self.assertEqual(throttle.stats['lockouts'], 2)
+
+    def test_counter_evicted_before_incr_counts_as_first(self):
+        throttle = LoginThrottle(window=300, username_limit=1, ip_limit=100, lockout_base=30)
+        request = self.client.get(reverse('login')).wsgi_request
+        # The key vanishing between add() and incr() makes incr() raise
+        with mock.patch('django.core.cache.backends.locmem.LocMemCache.incr', side_effect=ValueError):
+            throttle.record_failure(request, 'ayoob')
+            async_to_sync(throttle.arecord_failure)(request, 'someone')
+        self.assertEqual(throttle.check(request, 'ayoob'), 30)
+        self.assertEqual(throttle.check(request, 'someone'), 30)
+
+    def test_trusted_proxy_uses_forwarded_for(self):
+        throttle = LoginThrottle(trusted_proxies=1)
+        request = self.client.get(
+            reverse('login'), HTTP_X_FORWARDED_FOR='203.0.113.7, 10.0.0.1').wsgi_request
+        self.assertEqual(throttle.client_ip(request), '10.0.0.1')
+        throttle = LoginThrottle(trusted_proxies=2)
+        self.assertEqual(throttle.client_ip(request), '203.0.113.7')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CaseInsensitiveUniquenessTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username='ayoob', email='ayoob@example.com', password='Password123')
+        cls.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+
+    def test_migration_reports_existing_case_duplicates(self):
+        from django.apps import apps
+        migration = import_module('web_app.migrations.0004_case_insensitive_unique')
+        check = migration.check_case_insensitive_duplicates
+        schema_editor = mock.Mock(connection=connection)
+        check(apps, schema_editor)  # clean data passes
+
+        # Rows the old schema allowed (rolled back with the test)
+        with connection.cursor() as cursor:
+            cursor.execute('DROP INDEX user_username_ci_unique')
+            cursor.execute('DROP INDEX user_email_ci_unique')
+        CustomUser.objects.create(username='Ayoob', email='AYOOB@example.com')
+        CustomUser.objects.create(username='other', email='')
+        CustomUser.objects.create(username='another', email='')
+        with self.assertRaisesRegex(RuntimeError, "username 'ayoob': #\\d+ 'ayoob', #\\d+ 'Ayoob'") as caught:
+            check(apps, schema_editor)
+        self.assertIn("email 'ayoob@example.com'", str(caught.exception))
+        self.assertNotIn("email ''", str(caught.exception))
+
+    def register(self, username, email):
+        return self.client.post(reverse('register'), {
+            'username': username, 'email': email,
+            'password1': 'Password123', 'password2': 'Password123',
+            'gender': 'Male', 'marital_status': 'Single', 'terms': 'on',
+        })
+
+    def test_database_rejects_case_variants(self):
+        for fields in ({'username': 'AYOOB', 'email': 'x@example.com'},
+                       {'username': 'other', 'email': 'Ayoob@Example.com'}):
+            with self.subTest(**fields), self.assertRaises(IntegrityError), transaction.atomic():
+                CustomUser.objects.create(**fields)
+        # Blank emails are exempt from the email constraint
+        CustomUser.objects.create(username='blank1')
+        CustomUser.objects.create(username='blank2')
+
+    def test_collisions_is_one_query(self):
+        with self.assertNumQueries(1):
+            taken = CustomUser.all_objects.collisions('AYOOB', 'ADMIN@example.com')
+        self.assertEqual(taken, {'username', 'email'})
+        self.assertEqual(CustomUser.all_objects.collisions('ayoob', 'new@example.com'), {'username'})
+        self.assertEqual(
+            CustomUser.all_objects.collisions('ayoob', 'ayoob@example.com', exclude_pk=self.user.pk),
+            set())
+
+    def test_soft_deleted_users_keep_their_names(self):
+        self.user.delete()
+        self.assertEqual(CustomUser.all_objects.collisions('ayoob'), {'username'})
+
+    def test_register_inserts_without_prechecks(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.register('mariam', 'mariam@example.com')
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        user_queries = [q['sql'] for q in ctx.captured_queries if 'web_app_customuser' in q['sql']]
+        self.assertEqual(len(user_queries), 1)
+        self.assertTrue(user_queries[0].startswith('INSERT'))
+
+    def test_register_reports_the_colliding_field(self):
+        response = self.register('Ayoob', 'fresh@example.com')
+        self.assertRedirects(response, reverse('register'), fetch_redirect_response=False)
+        self.assertContains(self.client.get(reverse('register')), 'Username is already taken.')
+
+        self.register('fresh', 'AYOOB@example.com')
+        self.assertContains(self.client.get(reverse('register')), 'Email is already registered.')
+        self.assertEqual(CustomUser.all_objects.count(), 2)
+
+    def test_admin_edit_rejects_case_variant_email(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin_edit_user', args=[self.user.pk])
+        response = self.client.post(url, {'username': 'ayoob', 'email': 'Admin@Example.com'})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.email, 'ayoob@example.com')
+
+        # Re-saving the user's own values is not a collision
+        response = self.client.post(url, {'username': 'Ayoob', 'email': 'ayoob@example.com'})
+        self.assertRedirects(response, reverse('admin_dashboard'), fetch_redirect_response=False)
+
+
+class UserFacetCountsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        genders = ['Male', 'Female', 'Other', None]
+        statuses = ['Single', 'Married', None]
+        for i in range(24):
+            CustomUser.objects.create(
+                username=f'user{i:02d}', email=f'user{i:02d}@example.com',
+                gender=genders[i % 4], marital_status=statuses[i % 3], is_active=i % 5 != 0,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def filters(self, **selected):
+        return {**dict.fromkeys(
+            ('search', 'gender', 'marital_status', 'is_active', 'is_staff', 'is_superuser'), ''),
+            'ordering': '-date_joined', **selected}
+
+    def test_counts_match_filtered_queries(self):
+        from .views import filter_users
+
+        facets = get_user_facets()
+        for selected in ({}, {'gender': 'Male'}, {'gender': 'Female', 'is_active': 'No'},
+                         {'marital_status': 'Married', 'is_staff': 'Yes'}):
+            with self.subTest(**selected):
+                filters = self.filters(**selected)
+                self.assertEqual(facets.count(filters), filter_users(filters).count())
+
+    def test_options_ignore_their_own_filter(self):
+        options = get_user_facets().options(self.filters(gender='Male'))
+        # Picking another gender is still offered with its own count...
+        self.assertEqual(options['gender']['Female'], 6)
+        # ...while other facets are narrowed to the six Male users
+        self.assertEqual(sum(options['marital_status'].values()), 6)
+
+    def test_one_grouped_query_then_cached(self):
+        with self.assertNumQueries(1):
+            get_user_facets()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_facets().count(self.filters()), 25)
+
+    def test_invalidated_by_user_changes(self):
+        self.assertEqual(get_user_facets().count(self.filters()), 25)
+        CustomUser.objects.filter(username__in=['user00', 'user01']).soft_delete()
+        self.assertEqual(get_user_facets().count(self.filters()), 23)
+        CustomUser.all_objects.filter(username='user00').restore()
+        self.assertEqual(get_user_facets().count(self.filters()), 24)
+        CustomUser.objects.create(username='newbie', email='newbie@example.com')
+        self.assertEqual(get_user_facets().count(self.filters()), 25)
+
+    def test_last_login_update_keeps_cache(self):
+        get_user_facets()
+        self.admin.last_login = timezone.now()
+        self.admin.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            get_user_facets()
+
+    def test_large_tables_skip_search_facets(self):
+        with mock.patch('web_app.facets.estimated_user_rows', return_value=10_000_000):
+            self.assertIsNone(get_user_facets('user'))
+            self.assertIsNotNone(get_user_facets())
+
+    def test_large_tables_serve_stale_counts(self):
+        with mock.patch('web_app.facets.estimated_user_rows', return_value=10_000_000):
+            self.assertTrue(get_user_facets().stale)
+            CustomUser.objects.create(username='newbie', email='newbie@example.com')
+            # No recount on a change...
+            with self.assertNumQueries(0):
+                self.assertEqual(get_user_facets().count(self.filters()), 25)
+            # ...while the dashboard total is estimated from the table
+            self.client.force_login(self.admin)
+            response = self.client.get(reverse('admin_dashboard'))
+            self.assertEqual(response.context['page_obj'].count, 26)
+
+    def test_dashboard_shows_option_counts(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin_dashboard'), {'gender': 'Male'})
+        self.assertEqual(response.context['page_obj'].count, 6)
+        self.assertContains(response, 'Female (6)')
+
+
+@modify_settings(MIDDLEWARE={'prepend': 'web_app.perf.PerformanceMiddleware'})
+@override_settings(PASSWORD_HASHERS=['web_app.perf.TimedPBKDF2PasswordHasher'])
+class PerformanceMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with mock.patch.object(TimedPBKDF2PasswordHasher, 'iterations', 1000):
+            cls.admin = CustomUser.objects.create_superuser(
+                username='admin', email='admin@example.com', password='AdminPass123')
+
+    def setUp(self):
+        perf_registry.reset()
+        self.addCleanup(perf_registry.reset)
+
+    def server_timing(self, response):
+        return dict(
+            (part.split(';')[0].strip(), part) for part in response['Server-Timing'].split(',')
+        )
+
+    def test_server_timing_breakdown(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin_dashboard'))
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'app', 'db', 'tpl', 'hash'})
+        self.assertRegex(timing['db'], r'desc="[1-9]\d* queries"')
+        self.assertNotIn('tpl;dur=0.0', timing['tpl'])
+
+        stats = perf_registry.views['admin_dashboard']
+        self.assertEqual(stats.count, 1)
+        self.assertGreater(stats.queries, 0)
+
+    def test_password_hashing_is_timed(self):
+        with mock.patch.object(TimedPBKDF2PasswordHasher, 'iterations', 1000):
+            response = self.client.post(
+                reverse('login'), {'username': 'admin', 'password': 'AdminPass123'})
+        self.assertNotIn('hash;dur=0.0', response['Server-Timing'])
+        self.assertGreater(perf_registry.views['login'].hashing, 0)
+
+    async def test_async_requests_are_timed(self):
+        response = await self.async_client.get(reverse('login'))
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+        self.assertEqual(perf_registry.views['login'].count, 1)
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+
+        self.client.force_login(self.admin)
+        self.client.get(reverse('welcome'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('entryway_request_duration_seconds_bucket{view="welcome",le="+Inf"} 1', body)
+        self.assertIn('entryway_request_duration_seconds_count{view="welcome"} 1', body)
+        self.assertIn('entryway_login_throttle_checks_total', body)
+        self.assertIn('entryway_hashing_pool_in_flight 0', body)
+
+
+# ================= Query budgets ==================
+
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def normalize_sql(sql):
+    """``sql`` with its literal values blanked, so repeats of one statement match."""
+    return _SQL_LITERALS.sub('?', sql)
+
+
+class query_budget(ContextDecorator):
+    """
+    Fail if the block runs more than ``max_queries`` queries, or runs the same
+    statement (ignoring literal values) twice, which is how an N+1 shows up.
+    Statements containing any of ``allow_duplicates`` may repeat.
+    """
+
+    def __init__(self, max_queries, allow_duplicates=()):
+        self.max_queries = max_queries
+        self.allow_duplicates = allow_duplicates
+
+    def __enter__(self):
+        self.captured = CaptureQueriesContext(connection)
+        return self.captured.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.captured.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+        queries = [query['sql'] for query in self.captured.captured_queries]
+        listing = '\n'.join(f'{i}. {sql}' for i, sql in enumerate(queries, start=1))
+        if len(queries) > self.max_queries:
+            raise AssertionError(
+                f'{len(queries)} queries executed, budget is {self.max_queries}:\n{listing}')
+        repeated = [
+            sql for sql, n in Counter(map(normalize_sql, queries)).items()
+            if n > 1 and not any(allowed in sql for allowed in self.allow_duplicates)
+        ]
+        if repeated:
+            raise AssertionError(
+                'Duplicate queries:\n' + '\n'.join(repeated) + f'\n\nAll queries:\n{listing}')
+        return False
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    USER_IMPORT_WORKERS=0,
+    WHITENOISE_MANIFEST_STRICT=False,
+)
+class ViewQueryBudgetTest(TestCase):
+    """Every route stays within its query budget, whatever the table size."""
+
+    SIZES = (5, 80)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        cls.member = CustomUser.objects.create_user(
+            username='member', email='member@example.com', password='Password123')
+
+    def grow_to(self, size):
+        existing = CustomUser.all_objects.count()
+        CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f'seed{i:04d}', email=f'seed{i:04d}@example.com',
+                gender=('Male', 'Female', 'Other')[i % 3],
+                marital_status=('Single', 'Married')[i % 2], is_active=i % 7 != 0,
+            )
+            for i in range(existing, size)
+        ])
+
+    def victim(self, size):
+        return CustomUser.objects.create(username=f'victim{size}', email=f'victim{size}@example.com').pk
+
+    def import_job(self):
+        upload = SimpleUploadedFile('users.csv', b'username,email,password\n', content_type='text/csv')
+        return queue_import(upload)
+
+    def routes(self, size):
+        """``(url name, label, user, method, args, data, budget)`` per request."""
+        admin, member = self.admin, self.member
+        csv_upload = SimpleUploadedFile('users.csv', (
+            'username,email,password\n'
+            f'imp{size}a,imp{size}a@example.com,Password123\n'
+            f'imp{size}b,imp{size}b@example.com,Password123\n'
+        ).encode(), content_type='text/csv')
+        new_user = {
+            'username': f'new{size}', 'email': f'new{size}@example.com',
+            'password': 'Password123', 'confirm_password': 'Password123',
+        }
+        # A different gender each time, so every edit moves the member's rollup row
+        edit = {'username': 'member', 'email': 'member@example.com',
+                'gender': ('Male', 'Female')[size % 2], 'is_active': 'on'}
+        return [
+            ('welcome', 'get', None, 'get', (), {}, 0),
+            ('login', 'get', None, 'get', (), {}, 0),
+            ('login', 'post', None, 'post', (), {'username': 'member', 'password': 'Password123'}, 9),
+            ('register', 'get', None, 'get', (), {}, 0),
+            ('register', 'post', None, 'post', (), {
+                'username': f'reg{size}', 'email': f'reg{size}@example.com',
+                'password1': 'Password123', 'password2': 'Password123',
+                'gender': 'Male', 'marital_status': 'Single', 'terms': 'on'}, 5),
+            ('home', 'get', member, 'get', (), {}, 2),
+            ('logout', 'get', member, 'get', (), {}, 4),
+            ('update_bio', 'get', member, 'get', (), {}, 2),
+            ('update_bio', 'post', member, 'post', (), {'bio': f'size {size}'}, 3),
+            ('soft_delete_user', 'get', admin, 'get', (self.victim(size),), {}, 12),
+            ('admin_login', 'get', None, 'get', (), {}, 0),
+            ('admin_login', 'post', None, 'post', (), {'username': 'admin', 'password': 'AdminPass123'}, 9),
+            ('admin_dashboard', 'get', admin, 'get', (), {}, 4),
+            ('admin_dashboard', 'filtered', admin, 'get', (), {'gender': 'Male', 'is_active': 'Yes'}, 4),
+            ('admin_dashboard', 'search', admin, 'get', (), {'search': 'seed00'}, 5),
+            ('admin_export_users', 'csv', admin, 'get', (), {'format': 'csv'}, 3),
+            ('admin_logout', 'get', admin, 'get', (), {}, 4),
+            ('admin_edit_user', 'get', admin, 'get', (member.pk,), {}, 3),
+            ('admin_edit_user', 'post', admin, 'post', (member.pk,), edit, 8),
+            ('admin_soft_delete_user', 'get', admin, 'get', (self.victim(f'a{size}'),), {}, 12),
+            ('admin_create_user', 'get', admin, 'get', (), {}, 2),
+            ('admin_create_user', 'post', admin, 'post', (), new_user, 7),
+            ('admin_import_users', 'get', admin, 'get', (), {}, 2),
+            ('admin_import_users', 'post', admin, 'post', (), {'file': csv_upload}, 9),
+            ('admin_import_status', 'get', admin, 'get', (self.import_job(),), {}, 2),
+            ('admin_analytics', 'get', admin, 'get', (), {'days': '90'}, 4),
+            ('user_list_api', 'get', admin, 'get', (), {'gender': 'Male', 'fields': 'username,email'}, 4),
+            ('user_suggest', 'get', admin, 'get', (), {'q': 'Memb'}, 4),
+            ('metrics', 'get', admin, 'get', (), {}, 2),
+            ('db_pool_stats', 'get', admin, 'get', (), {}, 2),
+        ]
+
+    def measure(self, user, method, url, data, budget):
+        cache.clear()
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        # SAVEPOINTs are named per call and RELEASE repeats by design
+        with query_budget(budget, allow_duplicates=('SAVEPOINT',)) as captured:
+            response = getattr(client, method)(url, data)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, url)
+        return len(captured)
+
+    def test_every_route_has_a_budget(self):
+        named = {pattern.name for pattern in web_app_urls.urlpatterns}
+        self.assertEqual(named, {route[0] for route in self.routes(0)})
+
+    def test_query_counts_stay_flat_as_data_grows(self):
+        counts = {}
+        for size in self.SIZES:
+            self.grow_to(size)
+            for name, label, user, method, args, data, budget in self.routes(size):
+                with self.subTest(route=name, request=label, users=size):
+                    url = reverse(name, args=args)
+                    counts.setdefault((name, label), []).append(
+                        self.measure(user, method, url, data, budget))
+        for (name, label), per_size in counts.items():
+            with self.subTest(route=name, request=label):
+                self.assertEqual(len(set(per_size)), 1, f'{name} ({label}): {per_size}')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SyntheticDataBenchmarkTest(TestCase):
+    def test_generate_users_command(self):
+        out = StringIO()
+        call_command('generate_users', '300', '--deleted-fraction', '0.2', '--seed', '7',
+                     '--batch-size', '128', stdout=out)
+        self.assertIn('300 synthetic user(s) created', out.getvalue())
+        users = CustomUser.all_objects.filter(username__startswith='synth')
+        self.assertEqual(users.count(), 300)
+        self.assertTrue(30 <= users.filter(is_deleted=True).count() <= 90)
+        self.assertEqual(set(users.values_list('gender', flat=True)), {'Male', 'Female', 'Other', None})
+        self.assertTrue(users.first().check_password('SynthPass123'))
+
+        # A second run numbers on instead of colliding
+        call_command('generate_users', '5', stdout=StringIO())
+        self.assertEqual(users.count(), 305)
+
+        # Numbering follows the highest name left, not the number of users
+        users.filter(username__in=['synth0000000', 'synth0000001', 'synth0000002']).delete()
+        self.assertEqual(generate_users(2), 2)
+        self.assertTrue(users.filter(username='synth0000306').exists())
+
+    def test_run_view_benchmarks_reports_every_scenario(self):
+        generate_users(50, seed=1)
+        CustomUser.objects.create_user(
+            username='benchuser', email='benchuser@example.test', password='SynthPass123')
+        CustomUser.objects.create_superuser(
+            username='benchadmin', email='benchadmin@example.test', password='SynthPass123')
+
+        scenarios = run_view_benchmarks(requests=3, combinations=10)
+        self.assertEqual(set(scenarios), {'login', 'register', 'home', 'admin_dashboard'})
+        self.assertEqual(scenarios['admin_dashboard']['combinations'], 10)
+        self.assertEqual(scenarios['admin_dashboard']['status_codes'], {'200': 10})
+        self.assertEqual(scenarios['login']['status_codes'], {'302': 3})
+        for summary in scenarios.values():
+            self.assertLessEqual(summary['p50_ms'], summary['p99_ms'])
+        self.assertEqual(len(list(dashboard_combinations())), 3 * 4 * 3 * 3 * 3 * 3 * 2)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class DatabaseConnectionReuseTest(TransactionTestCase):
+    # Worker threads have their own connections and must see committed rows
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+
+    def test_concurrent_requests_reuse_connections(self):
+        result = run_concurrency_check(self.admin, threads=4, requests=10)
+        self.assertEqual(result['error_count'], 0, result['errors'])
+        self.assertEqual(result['requests'], 40)
+        # One connection per thread, however many requests it served
+        self.assertLessEqual(result['connects'], 4)
+        self.assertGreaterEqual(result['reuse_ratio'], 0.9)
+
+    def test_pool_stats_view(self):
+        self.assertEqual(self.client.get(reverse('db_pool_stats')).status_code, 302)
+        self.client.force_login(self.admin)
+        stats = self.client.get(reverse('db_pool_stats')).json()
+        self.assertEqual(stats['vendor'], connection.vendor)
+        self.assertFalse(stats['pooled'])
+        self.assertTrue(stats['conn_health_checks'])
+        self.assertIn('entryway_db_connects_total', self.client.get(reverse('metrics')).content.decode())
+
+    def test_pool_stats_with_a_pool(self):
+        # psycopg's ConnectionPool.get_stats() shape; SQLite has no pool
+        pool = mock.Mock()
+        pool.get_stats.return_value = {'pool_size': 4, 'pool_available': 3, 'requests_num': 12}
+        self.client.force_login(self.admin)
+        with mock.patch.object(connection, 'pool', pool, create=True):
+            stats = self.client.get(reverse('db_pool_stats')).json()
+            metrics = self.client.get(reverse('metrics')).content.decode()
+        self.assertTrue(stats['pooled'])
+        self.assertEqual(stats['pool'], {'pool_size': 4, 'pool_available': 3, 'requests_num': 12})
+        self.assertIn('entryway_db_pool_pool_available 3\n', metrics)
+        # After the hashing pool's block, not inside it
+        self.assertLess(metrics.index('entryway_hashing_pool_rejected_total'),
+                        metrics.index('entryway_db_connects_total'))
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cache')
+class CachedSessionUserTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = CustomUser.objects.create_user(
+            username='member', email='member@example.com', password='MemberPass123')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.force_login(self.member)
+
+    def test_warm_authenticated_page_needs_no_queries(self):
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user'], self.member)
+
+    def test_save_drops_the_cached_user(self):
+        self.client.get(reverse('home'))
+        self.member.bio = 'Changed elsewhere'
+        self.member.save()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['user'].bio, 'Changed elsewhere')
+
+    def test_soft_delete_drops_the_cached_user(self):
+        self.client.get(reverse('home'))
+        self.member.delete()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('home'))
+        self.assertTrue(response.context['user'].is_deleted)
+
+    @override_settings(AUTH_USER_CACHE_TIMEOUT=0)
+    def test_no_timeout_reads_the_user_every_time(self):
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('home'))
+        self.assertIsNone(cache.get(user_cache_key(self.member.pk)))
+
+    def test_clear_expired_sessions_in_batches(self):
+        from django.contrib.sessions.models import Session
+
+        now = timezone.now()
+        Session.objects.bulk_create(
+            [Session(session_key=f'expired{i:02d}', session_data='', expire_date=now - timedelta(days=1))
+             for i in range(5)]
+            + [Session(session_key='live', session_data='', expire_date=now + timedelta(days=1))]
+        )
+        out = StringIO()
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            call_command('clear_expired_sessions', batch_size=2, sleep=0, stdout=out)
+        self.assertIn('Deleted 5 expired sessions', out.getvalue())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+
+        out = StringIO()
+        call_command('clear_expired_sessions', stdout=out)
+        self.assertIn('nothing to do', out.getvalue())
+
+
+class TemplateCachingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = CustomUser.objects.create_user(
+            username='member', email='member@example.com', password='MemberPass123')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_anonymous_welcome_page_is_cached(self):
+        first = self.client.get(reverse('welcome'))
+        with mock.patch('web_app.views.render') as render:
+            second = self.client.get(reverse('welcome'))
+        render.assert_not_called()
+        self.assertEqual(second.content, first.content)
+        self.assertIn('no-cache', second['Cache-Control'])
+
+    def test_pending_messages_bypass_the_page_cache(self):
+        self.client.get(reverse('welcome'))
+        self.client.force_login(self.member)
+        self.client.get(reverse('logout'))  # queues "logged out" for the next page
+        response = self.client.get(reverse('welcome'))
+        self.assertContains(response, 'You have been logged out successfully.')
+        # ...shown once, and not stored for other visitors
+        self.assertNotContains(self.client.get(reverse('welcome')), 'logged out successfully')
+
+    def test_layout_fragment_is_keyed_on_login_state(self):
+        register_link = '<a class="nav-link" href="/register">'
+        self.assertContains(self.client.get(reverse('login')), register_link)
+        self.client.force_login(self.member)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, '<a class="nav-link" href="/logout">')
+        self.assertNotContains(response, register_link)
+
+    def test_render_benchmark_reports_every_page(self):
+        results = run_render_benchmarks(renders=2)
+        self.assertEqual(set(results), {'welcome', 'login', 'home', 'welcome_view'})
+        for result in results.values():
+            self.assertEqual(result['after']['requests'], 2)
+            self.assertIn('speedup', result)
+
+
+class StaticFilesPipelineTest(SimpleTestCase):
+    STORAGE = 'web_app.storage.MinifiedCompressedManifestStaticFilesStorage'
+
+    def setUp(self):
+        self.source = Path(tempfile.mkdtemp())
+        self.root = Path(tempfile.mkdtemp())
+        for path in (self.source, self.root):
+            self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        (self.source / 'js').mkdir()
+        (self.source / 'js' / 'app.js').write_text(
+            '/*! licence */\n// a comment\nfunction greet(name) {\n    return "hi " + name;\n}\n' * 50)
+        (self.source / 'site.css').write_text('/* layout */\nbody {\n    margin: 0;\n}\n' * 50)
+        settings_override = override_settings(
+            STATIC_ROOT=str(self.root),
+            STATICFILES_DIRS=[str(self.source)],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': self.STORAGE}},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def collectstatic(self):
+        compressed = []
+        original = MinifiedCompressedManifestStaticFilesStorage.compress_files
+
+        def spy(storage, paths):
+            paths = list(paths)
+            for name, compressed_name in original(storage, paths):
+                compressed.append(compressed_name)
+                yield name, compressed_name
+
+        with mock.patch.object(MinifiedCompressedManifestStaticFilesStorage, 'compress_files', spy):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        return compressed
+
+    def test_minified_hashed_and_precompressed(self):
+        self.collectstatic()
+        from django.contrib.staticfiles.storage import staticfiles_storage
+
+        hashed = staticfiles_storage.stored_name('js/app.js')
+        self.assertRegex(hashed, r'^js/app\.[0-9a-f]{12}\.js$')
+        served = (self.root / hashed).read_text()
+        self.assertNotIn('a comment', served)
+        self.assertIn('/*! licence */', served)
+        self.assertLess(len(served), len((self.source / 'js' / 'app.js').read_text()))
+        self.assertTrue((self.root / f'{hashed}.gz').exists())
+        self.assertTrue((self.root / f'{hashed}.br').exists())
+        self.assertNotIn('/* layout */', (self.root / staticfiles_storage.stored_name('site.css')).read_text())
+
+    def test_unchanged_files_are_not_recompressed(self):
+        self.assertTrue(self.collectstatic())
+        self.assertEqual(self.collectstatic(), [])
+
+        changed = self.source / 'site.css'
+        changed.write_text('body { margin: 1px; }\n' * 50)
+        # collectstatic compares modification times to the second
+        later = changed.stat().st_mtime + 5
+        os.utime(changed, (later, later))
+        recompressed = self.collectstatic()
+        self.assertTrue(recompressed)
+        self.assertTrue(all(name.startswith('site.') for name in recompressed))
+
+    def test_hashed_files_are_served_immutable(self):
+        self.collectstatic()
+        from django.templatetags.static import static
+
+        url = static('js/app.js')
+        self.assertRegex(url, r'/static/js/app\.[0-9a-f]{12}\.js$')
+        response = Client().get(url, headers={'Accept-Encoding': 'br'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+    def test_uncollected_assets_link_their_plain_name(self):
+        from django.templatetags.static import static
+
+        self.assertEqual(static('js/app.js'), '/static/js/app.js')
+
+
+@override_settings(ASYNC_VIEWS=True)
+class AsyncPageViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        reload_urlconf()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        reload_urlconf()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        generate_users(25, seed=7)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_pages_resolve_to_async_views(self):
+        for name in ('welcome', 'home', 'logout', 'admin_dashboard'):
+            self.assertTrue(iscoroutinefunction(resolve(reverse(name)).func), name)
+
+    async def test_dashboard_matches_the_sync_view(self):
+        await self.async_client.aforce_login(self.admin)
+        url = reverse('admin_dashboard') + '?is_active=Yes'
+        response = await self.async_client.get(url)
+        page = response.context['page_obj']
+
+        sync_client = Client()
+        await sync_to_async(sync_client.force_login)(self.admin)
+        try:
+            with self.settings(ASYNC_VIEWS=False):
+                await sync_to_async(reload_urlconf)()
+                expected = (await sync_to_async(sync_client.get)(url)).context['page_obj']
+        finally:
+            await sync_to_async(reload_urlconf)()
+        self.assertEqual([user.pk for user in page], [user.pk for user in expected])
+        self.assertEqual(page.count, expected.count)
+        # Cursors carry a signing timestamp; compare the positions they hold
+        decode = CursorPaginator(CustomUser.objects.none(), 10).decode_cursor
+        self.assertEqual(decode(page.next_cursor), decode(expected.next_cursor))
+
+        response = await self.async_client.get(url + '&cursor=' + page.next_cursor)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['page_obj'].has_previous())
+        response = await self.async_client.get(reverse('admin_dashboard'), {'search': 'admin'})
+        self.assertEqual([user.pk for user in response.context['page_obj']], [self.admin.pk])
+
+    async def test_home_welcome_and_logout(self):
+        first = await self.async_client.get(reverse('welcome'))
+        with mock.patch('web_app.views.render') as render:
+            second = await self.async_client.get(reverse('welcome'))
+        render.assert_not_called()
+        self.assertEqual(second.content, first.content)
+
+        response = await self.async_client.get(reverse('home'))
+        self.assertRedirects(response, reverse('login') + '?next=/home/', fetch_redirect_response=False)
+        await self.async_client.aforce_login(self.admin)
+        self.assertEqual((await self.async_client.get(reverse('home'))).status_code, 200)
+
+        response = await self.async_client.get(reverse('logout'))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        self.assertIsNone(await self.async_client.session.aget('_auth_user_id'))
+
+    def test_static_files_middleware_is_async_capable(self):
+        self.assertTrue(AsyncWhiteNoiseMiddleware.async_capable)
+        self.assertIn('web_app.middleware.AsyncWhiteNoiseMiddleware', settings.MIDDLEWARE)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ServerModeBenchmarkTest(TransactionTestCase):
+    # The WSGI run serves from worker threads, which need committed rows
+    def test_reports_both_modes_for_every_page(self):
+        admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        results = run_server_mode_benchmarks({'home': admin, 'admin_dashboard': admin},
+                                             clients=6, workers=2, db_latency=0)
+        for result in results.values():
+            for mode in ('wsgi', 'asgi'):
+                self.assertEqual(result[mode]['requests'], 6)
+                self.assertEqual(result[mode]['status_codes'], {'200': 6})
+            self.assertIn('speedup', result)
+
+
+class DailySignupRollupTest(TestCase):
+    def rollup(self):
+        return {
+            (row.day, row.gender, row.marital_status): row.count
+            for row in DailySignups.objects.exclude(count=0)
+        }
+
+    def live_counts(self):
+        counts = Counter()
+        for user in CustomUser.objects.all():
+            counts[(timezone.localdate(user.date_joined), user.gender or '', user.marital_status or '')] += 1
+        return dict(counts)
+
+    def test_rollup_follows_every_kind_of_change(self):
+        user = CustomUser.objects.create_user(
+            username='ayoob', email='ayoob@example.com', gender='Male', marital_status='Single')
+        today = timezone.localdate()
+        self.assertEqual(self.rollup(), {(today, 'Male', 'Single'): 1})
+
+        user.gender = 'Female'
+        user.save()
+        user.last_login = timezone.now()
+        user.save(update_fields=['last_login'])
+        self.assertEqual(self.rollup(), {(today, 'Female', 'Single'): 1})
+
+        user.delete()
+        self.assertEqual(self.rollup(), {})
+        CustomUser.all_objects.filter(pk=user.pk).restore()
+        self.assertEqual(self.rollup(), {(today, 'Female', 'Single'): 1})
+
+        generate_users(60, deleted_fraction=0.2, seed=3)
+        CustomUser.objects.filter(username__startswith='synth0000').soft_delete()
+        self.assertEqual(self.rollup(), self.live_counts())
+
+    def test_backfill_rebuilds_from_users(self):
+        generate_users(120, seed=5, days=100)
+        expected = self.live_counts()
+        DailySignups.objects.all().delete()
+        DailySignups.objects.create(day=timezone.localdate() - timedelta(days=500), count=9)
+        out = StringIO()
+        call_command('backfill_signup_stats', '--chunk-days', '7', stdout=out)
+        self.assertEqual(self.rollup(), expected)
+        self.assertIn(f'{sum(expected.values())} live user(s) counted', out.getvalue())
+
+    def test_analytics_page_reads_the_rollup_only(self):
+        admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        generate_users(40, seed=9, days=20)
+        self.client.force_login(admin)
+        url = reverse('admin_analytics')
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, {'days': '7'})
+        rollup_queries = [q for q in captured.captured_queries if 'web_app_dailysignups' in q['sql']]
+        self.assertEqual(len(rollup_queries), 2)
+        self.assertFalse(any('GROUP BY' in q['sql'] and 'web_app_customuser' in q['sql']
+                             for q in captured.captured_queries))
+        summary = response.context['summary']
+        self.assertEqual(len(summary['days']), 7)
+        week = timezone.localdate() - timedelta(days=6)
+        expected = sum(n for (day, _, _), n in self.live_counts().items() if day >= week)
+        self.assertEqual(summary['total'], expected)
+        self.assertEqual(sum(row[2] for row in summary['breakdown']), expected)
+        self.assertEqual(self.client.get(url, {'days': 'x'}).context['days'], 30)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AuditLogTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        cls.member = CustomUser.objects.create_user(
+            username='member', email='member@example.com', password='MemberPass123')
+
+    def setUp(self):
+        self.log = get_audit_log()
+        self.log.flush()
+        AuditEvent.objects.all().delete()
+
+    def events(self):
+        self.log.flush()
+        return list(AuditEvent.objects.order_by('id').values_list('action', 'actor_id', 'target_id'))
+
+    def test_requests_queue_events_without_writing_them(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.client.post(reverse('login'), {'username': 'member', 'password': 'wrong'})
+            self.client.post(reverse('login'), {'username': 'member', 'password': 'MemberPass123'})
+            self.client.get(reverse('logout'))
+        self.assertFalse([q for q in captured.captured_queries if 'web_app_auditevent' in q['sql']])
+        self.assertEqual(self.log.pending(), 3)
+        self.assertEqual(self.events(), [
+            ('login_failed', None, None),
+            ('login', self.member.pk, self.member.pk),
+            ('logout', self.member.pk, self.member.pk),
+        ])
+        self.assertEqual(AuditEvent.objects.first().details, {'username': 'member'})
+        self.assertEqual(AuditEvent.objects.first().ip, '127.0.0.1')
+
+    def test_admin_changes_name_the_acting_admin(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.events(), [('login', self.admin.pk, self.admin.pk)])
+        AuditEvent.objects.all().delete()
+        self.client.post(reverse('admin_edit_user', args=[self.member.pk]), {
+            'username': 'member', 'email': 'member@example.com', 'gender': 'Female', 'is_active': 'on'})
+        self.client.get(reverse('admin_soft_delete_user', args=[self.member.pk]))
+        self.client.post(reverse('admin:web_app_customuser_changelist') + '?is_deleted__exact=1', {
+            'action': 'restore_selected', '_selected_action': [self.member.pk]})
+        events = self.events()
+        self.assertEqual(events, [
+            ('user_updated', self.admin.pk, self.member.pk),
+            ('soft_deleted', self.admin.pk, self.member.pk),
+            ('restored', self.admin.pk, self.member.pk),
+        ])
+        self.assertEqual(AuditEvent.objects.first().details, {'fields': ['gender']})
+
+    def test_registration_is_recorded(self):
+        self.client.post(reverse('register'), {
+            'username': 'mariam', 'email': 'mariam@example.com',
+            'password1': 'Password123', 'password2': 'Password123',
+            'gender': 'Female', 'marital_status': 'Single', 'terms': 'on'})
+        mariam = CustomUser.objects.get(username='mariam')
+        self.assertEqual(self.events(), [('register', None, mariam.pk)])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        log = AuditLog(batch_size=2, queue_size=3, background=False)
+        log.record_many('soft_deleted', [self.member.pk] * 5)
+        self.assertEqual(log.stats['dropped'], 2)
+        self.assertEqual(log.flush(), 3)
+        self.assertEqual(log.stats['flushes'], 2)
+
+    def test_metrics_and_benchmark(self):
+        self.client.force_login(self.admin)
+        self.assertIn('entryway_audit_events_pending', self.client.get(reverse('metrics')).content.decode())
+        results = run_audit_benchmarks(events=20, batch_size=8)
+        self.assertEqual(results['sync']['requests'], 20)
+        self.assertEqual(results['buffered']['written'], 20)
+
+
+class AuditLogWriterTest(TransactionTestCase):
+    # The writer thread has its own connection and commits its own batches
+    def test_background_thread_writes_batches(self):
+        log = AuditLog(batch_size=2, flush_interval=0.05, background=True)
+        self.addCleanup(log.close)
+        log.record_many('restored', [1, 2, 3])
+        for _ in range(100):
+            if log.stats['written'] == 3:
+                break
+            threading.Event().wait(0.05)
+        self.assertEqual(log.stats['written'], 3)
+        self.assertEqual(AuditEvent.objects.count(), 3)
+
+    def test_close_writes_what_is_left(self):
+        # What the exit hook runs when a worker shuts down
+        log = AuditLog(batch_size=100, flush_interval=60, background=True)
+        log.record('login', target=None)
+        log.close()
+        self.assertEqual(log.stats['written'], 1)
+        self.assertEqual(log.pending(), 0)
+        self.assertEqual(AuditEvent.objects.count(), 1)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PurgeDeletedUsersTest(TestCase):
+    def setUp(self):
+        self.users = [
+            CustomUser.objects.create_user(
+                username=f'user{i}', email=f'user{i}@example.com', password='x', gender='Female')
+            for i in range(6)
+        ]
+        long_ago = timezone.now() - timedelta(days=100)
+        CustomUser.objects.filter(pk__in=[u.pk for u in self.users[:4]]).soft_delete()
+        self.users[4].delete()  # recently deleted: kept
+        CustomUser.all_objects.filter(pk__in=[u.pk for u in self.users[:4]]).update(deleted_at=long_ago)
+        self.old = [u.pk for u in self.users[:4]]
+        get_audit_log().flush()
+        AuditEvent.objects.all().delete()
+
+    def test_soft_delete_and_restore_stamp_deleted_at(self):
+        user = CustomUser.all_objects.get(pk=self.users[4].pk)
+        self.assertIsNotNone(user.deleted_at)
+        CustomUser.all_objects.filter(pk=user.pk).restore()
+        self.assertIsNone(CustomUser.all_objects.get(pk=user.pk).deleted_at)
+
+    def test_purge_archives_then_hard_deletes_in_chunks(self):
+        out = StringIO()
+        call_command('purge_deleted_users', '--dry-run', '--days', '90', stdout=out)
+        self.assertIn('4 user(s)', out.getvalue())
+
+        call_command('purge_deleted_users', '--days', '90', '--chunk-size', '3', '--limit', '3',
+                     '--sleep', '0', stdout=out)
+        self.assertEqual(ArchivedUser.objects.count(), 3)
+        # Resumes where the first run stopped
+        call_command('purge_deleted_users', '--days', '90', '--chunk-size', '3', '--sleep', '0', stdout=out)
+        self.assertIn('1 user(s) archived and purged', out.getvalue())
+
+        self.assertFalse(CustomUser.all_objects.filter(pk__in=self.old).exists())
+        self.assertEqual(CustomUser.all_objects.count(), 2)
+        archived = ArchivedUser.objects.get(user_id=self.old[0])
+        self.assertEqual(archived.username, 'user0')
+        self.assertEqual(archived.data['gender'], 'Female')
+        self.assertNotIn('password', archived.data)
+        get_audit_log().flush()
+        self.assertEqual(
+            sorted(AuditEvent.objects.filter(action='purged').values_list('target_id', flat=True)),
+            self.old)
+
+    def test_limit_counts_only_purged_users(self):
+        from django.db.models import QuerySet
+        from .models import CustomUserQuerySet
+        from .purge import purge_deleted_users
+
+        def restore_first(queryset):
+            # user0 is restored between the purge's SELECT and its DELETE
+            if CustomUser.all_objects.filter(pk=self.old[0], is_deleted=True).exists():
+                CustomUser.all_objects.filter(pk=self.old[0]).update(is_deleted=False, deleted_at=None)
+            return QuerySet.delete(queryset)
+
+        with mock.patch.object(CustomUserQuerySet, 'delete', autospec=True, side_effect=restore_first):
+            chunks = list(purge_deleted_users(timedelta(days=90), chunk_size=3, limit=3))
+        self.assertEqual(sum(purged for purged, _ in chunks), 3)
+        self.assertEqual(sorted(ArchivedUser.objects.values_list('user_id', flat=True)), self.old[1:])
+        self.assertTrue(CustomUser.objects.filter(pk=self.old[0]).exists())
+
+    def test_file_archive(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'purged.ndjson.gz')
+        call_command('purge_deleted_users', '--archive', 'file', '--path', path,
+                     '--chunk-size', '2', '--sleep', '0', stdout=StringIO())
+        with gzip.open(path, 'rt') as archive:
+            rows = [json.loads(line) for line in archive]
+        self.assertEqual([row['id'] for row in rows], self.old)
+        self.assertFalse(ArchivedUser.objects.exists())
+        self.assertEqual(CustomUser.all_objects.count(), 2)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AdminAccessTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth.models import Group, Permission
+        cls.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        cls.staff = CustomUser.objects.create_user(
+            username='staff', email='staff@example.com', password='StaffPass123', is_staff=True)
+        cls.group = Group.objects.create(name='viewers')
+        cls.group.permissions.add(Permission.objects.get(codename='view_customuser'))
+        cls.staff.groups.add(cls.group)
+        cls.change = Permission.objects.get(codename='change_customuser')
+        cls.changelist = reverse('admin:web_app_customuser_changelist')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def permission_queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        return response, [q['sql'] for q in captured.captured_queries if 'auth_permission' in q['sql']]
+
+    def test_panel_needs_a_superuser(self):
+        url = reverse('admin_dashboard')
+        response = self.client.get(url)
+        self.assertRedirects(response, f"{reverse('admin_login')}?next={url}", fetch_redirect_response=False)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url).status_code, 302)
+        # Staff views only need is_staff
+        self.assertEqual(self.client.get(reverse('db_pool_stats')).status_code, 200)
+        self.client.force_login(self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Logout')
+
+    def test_soft_delete_link_needs_a_superuser(self):
+        victim = CustomUser.objects.create(username='victim', email='victim@example.com')
+        response = self.client.get(reverse('soft_delete_user', args=[victim.pk]))
+        self.assertEqual(response.status_code, 302)
+        victim.refresh_from_db()
+        self.assertFalse(victim.is_deleted)
+
+    def test_staff_permissions_are_resolved_once_per_session(self):
+        self.client.force_login(self.staff)
+        response, queries = self.permission_queries(self.changelist)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(self.client.session['admin_access']['perms'], ['web_app.view_customuser'])
+        response, queries = self.permission_queries(self.changelist)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_group_changes_invalidate_the_session_set(self):
+        self.client.force_login(self.staff)
+        self.client.get(self.changelist)
+        self.group.permissions.add(self.change)
+        _, queries = self.permission_queries(self.changelist)
+        self.assertEqual(len(queries), 2)
+        self.assertIn('web_app.change_customuser', self.client.session['admin_access']['perms'])
+
+        self.staff.groups.remove(self.group)
+        response, queries = self.permission_queries(self.changelist)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.session['admin_access']['perms'], [])
+
+    def test_flag_changes_invalidate_the_session_set(self):
+        self.client.force_login(self.staff)
+        self.client.get(self.changelist)
+        self.staff.bio = 'Unrelated'
+        self.staff.save()
+        self.assertEqual(self.permission_queries(self.changelist)[1], [])
+        self.staff.is_superuser = True
+        self.staff.save()
+        self.staff.is_superuser = False
+        self.staff.save()
+        self.assertEqual(len(self.permission_queries(self.changelist)[1]), 2)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_unshared_cache_resolves_permissions_every_request(self):
+        self.client.force_login(self.staff)
+        for _ in range(2):
+            response, queries = self.permission_queries(self.changelist)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(queries), 2)
+        self.assertNotIn('admin_access', self.client.session)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserListApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        base = timezone.now()
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'user{i}', email=f'user{i}@example.com',
+                       gender='Male' if i % 2 else 'Female',
+                       date_joined=base - timedelta(days=i))
+            for i in range(7)
+        ])
+        cls.url = reverse('user_list_api')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.force_login(self.admin)
+
+    def test_filters_fields_and_cursor(self):
+        response = self.client.get(self.url, {'gender': 'Male', 'fields': 'username', 'per_page': 2})
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['results'], [{'username': 'user1'}, {'username': 'user3'}])
+        self.assertIsNone(data['previous'])
+        data = self.client.get(self.url, {
+            'gender': 'Male', 'fields': 'username', 'per_page': 2, 'cursor': data['next']}).json()
+        self.assertEqual(data['results'], [{'username': 'user5'}])
+        self.assertIsNone(data['next'])
+
+    def test_bad_fields_and_access(self):
+        response = self.client.get(self.url, {'fields': 'username,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Unknown field(s): password.'})
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_unchanged_list_answers_304_without_reading_users(self):
+        params = {'gender': 'Female', 'fields': 'username,date_joined'}
+        response = self.client.get(self.url, params)
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(self.url, params, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        user_table = CustomUser._meta.db_table
+        self.assertFalse([q for q in captured.captured_queries if user_table in q['sql']])
+
+        # Another page or filter is another representation
+        other = self.client.get(self.url, {'gender': 'Male'}, headers={'If-None-Match': etag})
+        self.assertEqual(other.status_code, 200)
+
+        CustomUser.objects.filter(username='user2').soft_delete()
+        response = self.client.get(self.url, params, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertNotIn('user2', [row['username'] for row in response.json()['results']])
+
+    @override_settings(SHARED_CACHE=False)
+    def test_unshared_cache_sends_no_etag(self):
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('ETag'))
+        response = self.client.get(self.url, headers={'If-None-Match': '*'})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], USER_SUGGEST_LIMIT=3)
+class UserSuggestTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(
+            username='admin', email='admin@example.com', password='AdminPass123')
+        CustomUser.objects.bulk_create([
+            CustomUser(username='alice', email='alice@example.com'),
+            CustomUser(username='Albert', email='bert@example.com'),
+            CustomUser(username='bob', email='al.bob@example.com'),
+            CustomUser(username='carol', email='carol@example.com'),
+            CustomUser(username='alan', email='alan@example.com', is_deleted=True),
+        ])
+        cls.url = reverse('user_suggest')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.force_login(self.admin)
+
+    def usernames(self, term):
+        response = self.client.get(self.url, {'q': term})
+        self.assertEqual(response.json()['q'], term)
+        return [user['username'] for user in response.json()['results']]
+
+    def test_username_matches_then_email_matches(self):
+        self.assertEqual(self.usernames('AL'), ['Albert', 'alice', 'bob'])
+        self.assertEqual(self.usernames('car'), ['carol'])
+        self.assertEqual(self.usernames('zz'), [])
+        self.assertEqual(self.usernames('  '), [])
+        # Username matches fill the limit before any email is looked at
+        self.assertEqual(self.usernames('a'), ['admin', 'Albert', 'alice'])
+
+    def test_prefix_uses_the_case_insensitive_indexes(self):
+        from .search import SQLiteFTS5SearchBackend
+        users = CustomUser.objects.values('id')
+        plan = SQLiteFTS5SearchBackend().prefix_search(users, 'Al', 'email')[:3].explain()
+        self.assertIn('USING INDEX user_email_ci_unique', plan)
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL prefix indexes')
+    def test_postgres_prefix_uses_the_collated_index(self):
+        from .search import PostgresTrigramSearchBackend
+        backend = PostgresTrigramSearchBackend()
+        name = backend.prefix_index_template.format(field='username')
+        with connection.cursor() as cursor:
+            # CONCURRENTLY can't run inside the test's transaction
+            cursor.execute(backend._indexes()[name].replace(' CONCURRENTLY', ''))
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        users = CustomUser.objects.values('username')
+        found = backend.prefix_search(users, 'AL', 'username')
+        self.assertEqual([user['username'] for user in found], ['Albert', 'alice'])
+        self.assertIn(name, found[:3].explain())
+
+    def test_longer_terms_narrow_a_complete_cached_result(self):
+        self.assertEqual(self.usernames('al'), ['Albert', 'alice', 'bob'])
+        with self.assertNumQueries(1):  # the session; the user is cached
+            self.assertEqual(self.usernames('al'), ['Albert', 'alice', 'bob'])
+        # 'al' held 3 users, the limit, so it may not have been complete
+        self.assertEqual(self.usernames('ali'), ['alice'])
+        with self.assertNumQueries(2):  # one session read per request
+            self.assertEqual(self.usernames('alice'), ['alice'])
+            self.assertEqual(self.usernames('ALIC'), ['alice'])
+
+    def test_user_changes_empty_the_cache(self):
+        self.assertEqual(self.usernames('car'), ['carol'])
+        CustomUser.objects.create(username='carla', email='carla@example.com')
+        self.assertEqual(self.usernames('car'), ['carla', 'carol'])
+        CustomUser.objects.filter(username='carol').soft_delete()
+        self.assertEqual(self.usernames('car'), ['carla'])
@@ -0,0 +1,196 @@
+"""
+Login throttling in front of ``authenticate()``.
+
+Failed logins are counted per client IP and per username in Django's cache
+framework (``settings.LOGIN_THROTTLE['CACHE']``), using a sliding-window
+counter: the current fixed window plus the previous one weighted by how much
+of it still overlaps. Once a scope reaches its limit it is locked out for
+``LOCKOUT_BASE`` seconds and its counter starts over; every repeat offence
+doubles the lockout, up to ``LOCKOUT_MAX``.
+
+``check()`` is a single ``get_many`` of the lock keys, so a locked-out
+request is rejected before any database lookup or password hash happens.
+``stats`` counts how many of those hashes were saved.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class LoginThrottle:
+    def __init__(self, cache='default', window=300, ip_limit=20, username_limit=5,
+                 lockout_base=30, lockout_max=3600, trusted_proxies=0):
+        self.cache_alias = cache
+        self.window = window
+        self.limits = {'ip': ip_limit, 'user': username_limit}
+        self.lockout_base = lockout_base
+        self.lockout_max = lockout_max
+        self.trusted_proxies = trusted_proxies
+        self._lock = threading.Lock()
+        self.stats = {'checks': 0, 'blocked': 0, 'failures': 0, 'lockouts': 0}
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _count(self, stat, amount=1):
+        with self._lock:
+            self.stats[stat] += amount
+
+    @property
+    def hashes_saved(self):
+        # Every blocked attempt is a password hash that never ran
+        return self.stats['blocked']
+
+    # -- keys -------------------------------------------------------------
+
+    def client_ip(self, request):
+        if self.trusted_proxies:
+            forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+            hops = [hop.strip() for hop in forwarded.split(',') if hop.strip()]
+            if len(hops) >= self.trusted_proxies:
+                return hops[-self.trusted_proxies]
+        return request.META.get('REMOTE_ADDR', '')
+
+    def _scopes(self, request, username):
+        user_digest = hashlib.sha256((username or '').strip().lower().encode()).hexdigest()[:32]
+        return {'ip': self.client_ip(request), 'user': user_digest}
+
+    def _keys(self, scope, ident, now):
+        bucket = int(now // self.window)
+        base = f'login-throttle:{scope}:{ident}'
+        return {
+            'current': f'{base}:{bucket}',
+            'previous': f'{base}:{bucket - 1}',
+            'lock': f'{base}:lock',
+            'strikes': f'{base}:strikes',
+        }
+
+    def _estimate(self, current, previous, now):
+        overlap = 1 - (now % self.window) / self.window
+        return current + previous * overlap
+
+    def _all_keys(self, request, username, now):
+        return {
+            scope: self._keys(scope, ident, now)
+            for scope, ident in self._scopes(request, username).items()
+        }
+
+    # -- decisions (shared by the sync and async entry points) -------------
+
+    def _lock_keys(self, keys):
+        return [scope_keys['lock'] for scope_keys in keys.values()]
+
+    def _retry_after(self, keys, values, now):
+        unlock_at = max((values.get(key, 0) for key in self._lock_keys(keys)), default=0)
+        return max(0, int(unlock_at - now + 0.999))
+
+    def _lock_seconds(self, strikes):
+        return min(self.lockout_base * 2 ** (strikes - 1), self.lockout_max)
+
+    # -- counters -----------------------------------------------------------
+
+    def _increment(self, key, timeout):
+        cache = self.cache
+        cache.add(key, 0, timeout=timeout)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Expired or evicted since the add(): this is its first count again
+            cache.add(key, 1, timeout=timeout)
+            return 1
+
+    async def _aincrement(self, key, timeout):
+        cache = self.cache
+        await cache.aadd(key, 0, timeout=timeout)
+        try:
+            return await cache.aincr(key)
+        except ValueError:
+            await cache.aadd(key, 1, timeout=timeout)
+            return 1
+
+    # -- sync API -----------------------------------------------------------
+
+    def check(self, request, username):
+        """Return 0 if the attempt may proceed, else seconds until it may."""
+        now = time.time()
+        keys = self._all_keys(request, username, now)
+        values = self.cache.get_many(self._lock_keys(keys))
+        retry_after = self._retry_after(keys, values, now)
+        self._count('checks')
+        if retry_after:
+            self._count('blocked')
+        return retry_after
+
+    def record_failure(self, request, username):
+        now = time.time()
+        cache = self.cache
+        self._count('failures')
+        for scope, scope_keys in self._all_keys(request, username, now).items():
+            current = self._increment(scope_keys['current'], self.window * 2)
+            previous = cache.get(scope_keys['previous'], 0)
+            if self._estimate(current, previous, now) >= self.limits[scope]:
+                strikes = self._increment(scope_keys['strikes'], self.lockout_max * 2)
+                seconds = self._lock_seconds(strikes)
+                cache.set(scope_keys['lock'], now + seconds, timeout=seconds)
+                cache.delete_many([scope_keys['current'], scope_keys['previous']])
+                self._count('lockouts')
+
+    def record_success(self, request, username):
+        """A correct password clears the username's counters (not the IP's)."""
+        keys = self._all_keys(request, username, time.time())['user']
+        self.cache.delete_many([keys['current'], keys['previous'], keys['strikes']])
+
+    # -- async API ----------------------------------------------------------
+
+    async def acheck(self, request, username):
+        now = time.time()
+        keys = self._all_keys(request, username, now)
+        values = await self.cache.aget_many(self._lock_keys(keys))
+        retry_after = self._retry_after(keys, values, now)
+        self._count('checks')
+        if retry_after:
+            self._count('blocked')
+        return retry_after
+
+    async def arecord_failure(self, request, username):
+        now = time.time()
+        cache = self.cache
+        self._count('failures')
+        for scope, scope_keys in self._all_keys(request, username, now).items():
+            current = await self._aincrement(scope_keys['current'], self.window * 2)
+            previous = await cache.aget(scope_keys['previous'], 0)
+            if self._estimate(current, previous, now) >= self.limits[scope]:
+                strikes = await self._aincrement(scope_keys['strikes'], self.lockout_max * 2)
+                seconds = self._lock_seconds(strikes)
+                await cache.aset(scope_keys['lock'], now + seconds, timeout=seconds)
+                await cache.adelete_many([scope_keys['current'], scope_keys['previous']])
+                self._count('lockouts')
+
+    async def arecord_success(self, request, username):
+        keys = self._all_keys(request, username, time.time())['user']
+        await self.cache.adelete_many([keys['current'], keys['previous'], keys['strikes']])
+
+
+_throttle = None
+
+
+def get_login_throttle():
+    """Return the process-wide LoginThrottle configured from settings."""
+    global _throttle
+    if _throttle is None:
+        options = {key.lower(): value for key, value in settings.LOGIN_THROTTLE.items()}
+        _throttle = LoginThrottle(**options)
+    return _throttle
+
+
+@receiver(setting_changed)
+def _reset_login_throttle(setting, **kwargs):
+    global _throttle
+    if setting == 'LOGIN_THROTTLE':
+        _throttle = None
@@ -1,24 +1,43 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from django.shortcuts import redirect
 
+# Views that hash passwords come in sync and async flavours
+if settings.ASYNC_AUTH_VIEWS:
+    login_view, register_view = views.alogin_view, views.aregister_view
+    admin_login_view, admin_create_user = views.aadmin_login_view, views.aadmin_create_user
+else:
+    login_view, register_view = views.login_view, views.register_view
+    admin_login_view, admin_create_user = views.admin_login_view, views.admin_create_user
+
+# So do the I/O-bound pages
+if settings.ASYNC_VIEWS:
+    welcome_view, home_view = views.awelcome_view, views.ahome_view
+    logout_view, admin_dashboard = views.alogout_view, views.aadmin_dashboard
+else:
+    welcome_view, home_view = views.welcome_view, views.home_view
+    logout_view, admin_dashboard = views.logout_view, views.admin_dashboard
+
 urlpatterns = [
 
     # 👤 User Routes
-    path('', views.welcome_view, name='welcome'),
-    path('login/', views.login_view, name='login'),
-    path('register/', views.register_view, name='register'),
-    path('home/', views.home_view, name='home'),
-    path('logout/', views.logout_view, name='logout'),
+    path('', welcome_view, name='welcome'),
+    path('login/', login_view, name='login'),
+    path('register/', register_view, name='register'),
+    path('home/', home_view, name='home'),
+    path('logout/', logout_view, name='logout'),
     path('update-bio/', views.update_bio, name='update_bio'),
     path('soft-delete-user/<int:user_id>/',
          views.soft_delete_user, name='soft_delete_user'),
 
     # 🛠 Admin Panel Routes
     path('administrator/admin-login/',
-         views.admin_login_view, name='admin_login'),
+         admin_login_view, name='admin_login'),
     path('administrator/admin-dash/',
-         views.admin_dashboard, name='admin_dashboard'),
+         admin_dashboard, name='admin_dashboard'),
+    path('administrator/export-users/',
+         views.admin_export_users, name='admin_export_users'),
     path('administrator/admin-logout/',
          views.admin_logout_view, name='admin_logout'),
     path('administrator/edit-user/<int:user_id>/',
@@ -26,7 +45,21 @@ urlpatterns = [
     path('administrator/delete-user/<int:user_id>/',
          views.admin_soft_delete_user, name='admin_soft_delete_user'),
     path('administrator/add-user/',
-         views.admin_create_user, name='admin_create_user'),
+         admin_create_user, name='admin_create_user'),
+    path('administrator/import-users/',
+         views.admin_import_users, name='admin_import_users'),
+    path('administrator/import-users/<uuid:job_id>/',
+         views.admin_import_status, name='admin_import_status'),
+    path('administrator/analytics/',
+         views.admin_analytics, name='admin_analytics'),
+    path('administrator/api/users/',
+         views.user_list_api, name='user_list_api'),
+    path('administrator/api/users/suggest/',
+         views.user_suggest_api, name='user_suggest'),
+    path('administrator/metrics/',
+         views.metrics_view, name='metrics'),
+    path('administrator/db-pool/',
+         views.db_pool_stats_view, name='db_pool_stats'),
 
 
 
@@ -1,18 +1,46 @@
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
 from .models import CustomUser
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import aauthenticate, alogin, alogout, authenticate, login, logout
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_protect
-from django.views.decorators.cache import never_cache
+from django.views.decorators.cache import cache_control, never_cache
+from django.views.decorators.http import condition
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
 from django.utils.dateparse import parse_date
 from django.contrib.auth.decorators import login_required
-from django.contrib.admin.views.decorators import staff_member_required
-from django.contrib.auth.decorators import login_required, user_passes_test
 from django.db.models import Q
-from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
+from . import audit
+from .access import admin_required
+from .export import EXPORT_FORMATS, stream_users
+from .dbpool import pool_stats
+from .facets import get_user_facets, users_version
 from .forms import UserBioForm
+from .hashing import HashingPoolSaturated, get_hashing_pool
+from .importer import ImportQueueFull, import_job_status, queue_import
+from .pagination import CursorPaginator, aapproximate_count, approximate_count
+from .perf import registry as perf_registry
+from .search import get_search_backend
+from .signups import signup_summary
+from .suggest import get_suggestion_cache, suggest_users
+from .throttle import get_login_throttle
+
+
+def _login_throttled(request, template_name, retry_after):
+    messages.error(
+        request, f"Too many failed login attempts. Try again in {retry_after} seconds.")
+    response = render(request, template_name, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
 
 
 @csrf_protect
@@ -29,7 +57,17 @@ def login_view(request):
             messages.error(request, "Both username and password are required.")
             return redirect('login')
 
+        # Refuse throttled clients before any user lookup or password hash
+        throttle = get_login_throttle()
+        retry_after = throttle.check(request, username)
+        if retry_after:
+            return _login_throttled(request, 'login.html', retry_after)
+
         user = authenticate(request, username=username, password=password)
+        if user is None:
+            throttle.record_failure(request, username)
+        else:
+            throttle.record_success(request, username)
 
         if user is not None:
             if not user.is_deleted:
@@ -46,10 +84,40 @@ def login_view(request):
     return render(request, 'login.html')
 
 
+def _anonymous_page_key(template_name):
+    return f'anonymous-page:{settings.TEMPLATE_CACHE_VERSION}:{template_name}'
+
+
+def _shareable(request, response):
+    # A page with a CSRF token in it belongs to one visitor
+    return response.status_code == 200 and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+
+
+def _cached_anonymous_page(request, template_name):
+    """
+    Render ``template_name`` for an anonymous visitor, reusing the HTML from
+    the cache. Visitors with pending messages get a fresh render (the cached
+    copy must neither show nor swallow them), and a render that put a CSRF
+    token in the page is never stored.
+    """
+    if len(messages.get_messages(request)):
+        return render(request, template_name)
+    key = _anonymous_page_key(template_name)
+    content = cache.get(key)
+    if content is not None:
+        return HttpResponse(content)
+    response = render(request, template_name)
+    if _shareable(request, response):
+        cache.set(key, response.content, timeout=settings.TEMPLATE_CACHE_TIMEOUT)
+    return response
+
+
 @csrf_protect
 @never_cache
 def welcome_view(request):
-    return render(request, 'welcome.html')
+    if request.user.is_authenticated:
+        return render(request, 'welcome.html')
+    return _cached_anonymous_page(request, 'welcome.html')
 
 
 User = get_user_model()
@@ -65,77 +133,94 @@ User = get_user_model()
 # agree_to_terms: on
 
 
+def _clean_registration(post):
+    """
+    Validate the registration form without touching the database.
+
+    Returns ``(fields, None)`` or ``(None, error message)``; username/email
+    uniqueness is left to the caller.
+    """
+    username = post.get('username', '').strip()
+    email = post.get('email', '').strip()
+    password1 = post.get('password1', '')
+    password2 = post.get('password2', '')
+    dob = post.get('dob', '')
+    gender = post.get('gender', '')
+    marital_status = post.get('marital_status', '')
+    terms = post.get('terms', '')
+
+    # change gender setting
+    if gender not in ['Male', 'Female', 'Other']:
+        return None, "Malformed gender value"
+
+    # Server-side validations
+    if not username or not email or not password1 or not password2:
+        return None, "All fields are required."
+
+    if not username.isalnum():
+        return None, "Username must be alphanumeric."
+
+    if len(password1) < 8:
+        return None, "Password must be at least 8 characters long."
+
+    if password1 != password2:
+        return None, "Passwords do not match."
+
+    if terms != 'on':
+        return None, "You must accept the terms and conditions."
+
+    return {
+        'username': username,
+        'email': email,
+        'password': password1,
+        'dob': parse_date(dob),
+        'gender': gender,
+        'marital_status': marital_status,
+        'agree_to_terms': True,
+    }, None
+
+
+def _save_unique(user, exclude_pk=None):
+    """
+    Save ``user`` and let the case-insensitive unique indexes reject
+    duplicates, so the happy path costs no extra lookup.
+
+    Returns the set of taken fields (empty on success); the single lookup
+    that works it out only runs after an IntegrityError.
+    """
+    try:
+        with transaction.atomic():
+            user.save()
+    except IntegrityError:
+        taken = CustomUser.all_objects.collisions(user.username, user.email, exclude_pk)
+        if not taken:
+            raise
+        return taken
+    return set()
+
+
+def _collision_message(taken, username_message, email_message):
+    return username_message if 'username' in taken else email_message
+
+
 @csrf_protect
 @never_cache
 def register_view(request):
     if request.method == 'POST':
-        username = request.POST.get('username', '').strip()
-        email = request.POST.get('email', '').strip()
-        password1 = request.POST.get('password1', '')
-        password2 = request.POST.get('password2', '')
-        dob = request.POST.get('dob', '')
-        gender = request.POST.get('gender', '')
-        marital_status = request.POST.get('marital_status', '')
-        terms = request.POST.get('terms', '')
-
-        # change gender setting
-        if gender not in ['Male', 'Female', 'Other']:
-            messages.error(request, "Malformed gender value")
-            return redirect('register')
-
-        # Server-side validations
-        if not username or not email or not password1 or not password2:
-            messages.error(request, "All fields are required.")
-            return redirect('register')
-
-        if not username.isalnum():
-            messages.error(request, "Username must be alphanumeric.")
-            return redirect('register')
-
-        if len(password1) < 8:
-            messages.error(
-                request, "Password must be at least 8 characters long.")
-            return redirect('register')
-
-        if password1 != password2:
-            messages.error(request, "Passwords do not match.")
-            return redirect('register')
-
-        if CustomUser.objects.filter(username=username).exists():
-            messages.error(request, "Username is already taken.")
-            return redirect('register')
-
-        if CustomUser.objects.filter(email=email).exists():
-            messages.error(request, "Email is already registered.")
-            return redirect('register')
-
-        if terms != 'on':
-            messages.error(
-                request, "You must accept the terms and conditions.")
+        fields, error = _clean_registration(request.POST)
+        if error:
+            messages.error(request, error)
             return redirect('register')
 
         # Save user
-        user = CustomUser.objects.create(
-            username=username,
-            email=email,
-            password=make_password(password1),
-            dob=parse_date(dob),
-            gender=gender,
-            marital_status=marital_status,
-            agree_to_terms=True if terms == 'on' else False,
-        )
-
-        # print(f"""
-        # User registration details:
-        # Username: {username}
-        # Email: {email}
-        # Password: {password1}
-        # confirm Password: {password2}
-        # dob: {dob}
-        # gender: {gender}
-        # marital_status: {marital_status}
-        # agree_to_terms: {terms}
-        # """)
+        fields['password'] = make_password(fields['password'])
+        user = CustomUser(**fields)
+        taken = _save_unique(user)
+        if taken:
+            messages.error(request, _collision_message(
+                taken, "Username is already taken.", "Email is already registered."))
+            return redirect('register')
+        audit.record('register', target=user)
 
         messages.success(request, "Registration successful. Please log in.")
         return redirect('login')
@@ -170,19 +255,16 @@ def logout_view(request):
     return redirect('login')
 
 
+@admin_required(login_url='admin:login')
 def soft_delete_user(request, user_id):
-    user = get_object_or_404(CustomUser, id=user_id)
-    user.is_deleted = True
-    user.save()
+    if not CustomUser.objects.filter(id=user_id).soft_delete():
+        # Nothing updated: either already deleted (fine) or no such user
+        get_object_or_404(CustomUser.all_objects, id=user_id)
     return redirect('admin:web_app_customuser_changelist')
 
 
 # ================= Custom Admin Panel ==================
 
-def is_admin(user):
-    return user.is_staff and user.is_superuser
-
-
 @csrf_protect
 @never_cache
 def admin_login_view(request):
@@ -193,10 +275,18 @@ def admin_login_view(request):
         username = request.POST.get('username')
         password = request.POST.get('password')
 
+        throttle = get_login_throttle()
+        retry_after = throttle.check(request, username)
+        if retry_after:
+            return _login_throttled(request, 'admin-panel/admin_login.html', retry_after)
+
         user = authenticate(request, username=username, password=password)
+        if user is None:
+            throttle.record_failure(request, username)
+        else:
+            throttle.record_success(request, username)
 
         if user and user.is_superuser:
-            request.session['admin_id'] = user.id
             login(request, user)  # Ensure admin is logged in
             # Add feedback
             messages.success(request, "Admin login successful.")
@@ -208,118 +298,315 @@ def admin_login_view(request):
     return render(request, 'admin-panel/admin_login.html')  # Fix template path
 
 
+def get_user_filters(request):
+    """Read the admin user-list filters from the query string."""
+    ordering = request.GET.get('ordering', '-date_joined')  # Default newest
+    if ordering not in ('date_joined', '-date_joined'):
+        ordering = '-date_joined'
+    return {
+        'search': request.GET.get('search', ''),
+        'gender': request.GET.get('gender', ''),
+        'marital_status': request.GET.get('marital_status', ''),
+        'is_active': request.GET.get('is_active', ''),
+        'is_staff': request.GET.get('is_staff', ''),
+        'is_superuser': request.GET.get('is_superuser', ''),
+        'ordering': ordering,
+    }
+
+
+def filter_users(filters, backend=None):
+    """Live users matching ``filters`` (as returned by get_user_filters)."""
+    users = CustomUser.objects.all()  # live users only
+
+    if filters['search']:
+        users = (backend or get_search_backend()).filter(users, filters['search'])
+    if filters['gender']:
+        users = users.filter(gender=filters['gender'])
+    if filters['marital_status']:
+        users = users.filter(marital_status=filters['marital_status'])
+    if filters['is_active']:
+        users = users.filter(is_active=(filters['is_active'] == "Yes"))
+    if filters['is_staff']:
+        users = users.filter(is_staff=(filters['is_staff'] == "Yes"))
+    if filters['is_superuser']:
+        users = users.filter(is_superuser=(filters['is_superuser'] == "Yes"))
+    return users
+
+
 @never_cache
-@login_required(login_url='admin_login')
-@user_passes_test(is_admin, login_url='admin_login')
+@admin_required
 def admin_dashboard(request):
-    users = CustomUser.objects.filter(is_deleted=False)
-
-    # Get filters
-    search = request.GET.get('search', '')
-    gender = request.GET.get('gender', '')
-    marital_status = request.GET.get('marital_status', '')
-    is_active = request.GET.get('is_active', '')
-    is_staff = request.GET.get('is_staff', '')
-    is_superuser = request.GET.get('is_superuser', '')
-    ordering = request.GET.get('ordering', '-date_joined')  # Default newest
+    filters = get_user_filters(request)
+    search_backend = get_search_backend()
+    users = filter_users(filters, search_backend)
+
+    # Cached grouped counts give both the total and the per-option counts;
+    # on a very large table they are missing or stale and the total is estimated.
+    facets = get_user_facets(filters['search'], search_backend)
+    if facets is not None and not facets.stale:
+        count = facets.count(filters)
+    else:
+        count = approximate_count(users)
+
+    # Keyset pagination on (date_joined, id): constant cost at any depth
+    paginator = CursorPaginator(users, 10, ordering=filters['ordering'])  # 10 users per page
+    page_obj = paginator.get_page(request.GET.get('cursor'), count=count)
+
+    return render(request, 'admin-panel/admin_dash.html', _dashboard_context(filters, page_obj, facets))
 
-    # Apply filters
-    if search:
-        users = users.filter(
-            Q(username__icontains=search) |
-            Q(email__icontains=search) |
-            Q(gender__icontains=search)
-        )
-    if gender:
-        users = users.filter(gender=gender)
-    if marital_status:
-        users = users.filter(marital_status=marital_status)
-    if is_active:
-        users = users.filter(is_active=(is_active == "Yes"))
-    if is_staff:
-        users = users.filter(is_staff=(is_staff == "Yes"))
-    if is_superuser:
-        users = users.filter(is_superuser=(is_superuser == "Yes"))
-
-    # Ordering
-    users = users.order_by(ordering)
-
-    # Pagination
-    paginator = Paginator(users, 10)  # 10 users per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    context = {
+
+def _dashboard_context(filters, page_obj, facets):
+    return {
         'page_obj': page_obj,
         'is_paginated': page_obj.has_other_pages(),
-        'filters': {
-            'search': search,
-            'gender': gender,
-            'marital_status': marital_status,
-            'is_active': is_active,
-            'is_staff': is_staff,
-            'is_superuser': is_superuser,
-            'ordering': ordering,
-        }
+        'filters': filters,
+        'facet_counts': facets.options(filters) if facets is not None else None,
     }
 
-    return render(request, 'admin-panel/admin_dash.html', context)
 
+@never_cache
+@admin_required
+def admin_export_users(request):
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("Unsupported export format.")
+    compress = request.GET.get('gzip') == '1'
+
+    filters = get_user_filters(request)
+    users = filter_users(filters)
+    return stream_users(users, export_format, ordering=filters['ordering'], compress=compress,
+                        asynchronous=isinstance(request, ASGIRequest))
+
+
+# Fields the user list API can return; ``?fields=`` picks a subset
+USER_API_FIELDS = (
+    'id', 'username', 'email', 'dob', 'gender', 'marital_status', 'bio',
+    'is_active', 'is_staff', 'is_superuser', 'date_joined',
+)
+USER_API_PAGE_SIZE = 50
+USER_API_MAX_PAGE_SIZE = 200
+
+
+def _user_api_params(request):
+    """``(fields, per_page)`` from the query string, or ``(None, error)``."""
+    requested = request.GET.get('fields')
+    fields = [f for f in requested.split(',') if f] if requested else list(USER_API_FIELDS)
+    unknown = sorted(set(fields) - set(USER_API_FIELDS))
+    if unknown:
+        return None, f"Unknown field(s): {', '.join(unknown)}."
+    try:
+        per_page = int(request.GET.get('per_page', USER_API_PAGE_SIZE))
+    except ValueError:
+        return None, "per_page must be a number."
+    return fields, min(max(per_page, 1), USER_API_MAX_PAGE_SIZE)
+
+
+def _user_list_etag(request):
+    # Computed from the cache alone: a match is answered with a 304 before
+    # any user row is read. An unshared cache only sees this worker's
+    # changes, and would validate a list another worker has since changed.
+    if not settings.SHARED_CACHE:
+        return None
+    query = sorted((key, values) for key, values in request.GET.lists())
+    digest = hashlib.sha256(json.dumps([users_version(), query]).encode()).hexdigest()
+    return digest[:32]
+
+
+@admin_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_user_list_etag)
+def user_list_api(request):
+    """
+    The admin dashboard's user list as JSON, with the same filters, keyset
+    cursors instead of pages and ``?fields=`` to pick columns.
+    """
+    fields, per_page = _user_api_params(request)
+    if fields is None:
+        return JsonResponse({'error': per_page}, status=400)
+
+    filters = get_user_filters(request)
+    search_backend = get_search_backend()
+    users = filter_users(filters, search_backend)
+    facets = get_user_facets(filters['search'], search_backend)
+    if facets is not None and not facets.stale:
+        count = facets.count(filters)
+    else:
+        count = approximate_count(users)
 
-@login_required(login_url='admin_login')
-@user_passes_test(is_admin, login_url='admin_login')
-def admin_create_user(request):
-    if request.method == 'POST':
-        username = request.POST.get('username').strip()
-        email = request.POST.get('email').strip()
-        password = request.POST.get('password')
-        confirm_password = request.POST.get('confirm_password')
-        dob = request.POST.get('dob')
-        gender = request.POST.get('gender')
-        marital_status = request.POST.get('marital_status')
-        is_active = bool(request.POST.get('is_active'))
-        is_staff = bool(request.POST.get('is_staff'))
-        is_superuser = bool(request.POST.get('is_superuser'))
+    # The cursor needs the (date_joined, id) of the boundary rows
+    columns = list(dict.fromkeys([*fields, 'id', 'date_joined']))
+    paginator = CursorPaginator(users.values(*columns), per_page, ordering=filters['ordering'])
+    page_obj = paginator.get_page(request.GET.get('cursor'), count=count)
+    return JsonResponse({
+        'count': page_obj.count,
+        'next': page_obj.next_cursor,
+        'previous': page_obj.previous_cursor,
+        'results': [{field: row[field] for field in fields} for row in page_obj],
+    })
 
-        # Server-side validations
-        if not username or not email or not password or not confirm_password:
-            messages.error(request, "All required fields must be filled.")
-            return redirect('admin_create_user')
 
-        if password != confirm_password:
-            messages.error(request, "Passwords do not match.")
-            return redirect('admin_create_user')
+@never_cache
+@admin_required
+def user_suggest_api(request):
+    """Typeahead for the dashboard search: users by username/email prefix."""
+    term = request.GET.get('q', '')
+    return JsonResponse({'q': term, 'results': suggest_users(term)})
+
+
+ANALYTICS_WINDOWS = (7, 30, 90, 365)
 
-        if CustomUser.objects.filter(username=username).exists():
-            messages.error(request, "Username already exists.")
-            return redirect('admin_create_user')
 
-        if CustomUser.objects.filter(email=email).exists():
-            messages.error(request, "Email already exists.")
+@never_cache
+@admin_required
+def admin_analytics(request):
+    """Sign-up trends, read from the daily rollup rather than the user table."""
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        days = 30
+    if days not in ANALYTICS_WINDOWS:
+        days = 30
+    summary = signup_summary(days)
+    peak = max((count for _, count in summary['days']), default=0)
+    return render(request, 'admin-panel/admin_analytics.html', {
+        'summary': summary,
+        'days': days,
+        'windows': ANALYTICS_WINDOWS,
+        'peak': peak,
+    })
+
+
+def _clean_new_user(post):
+    """Validate the admin create-user form; see _clean_registration()."""
+    username = (post.get('username') or '').strip()
+    email = (post.get('email') or '').strip()
+    password = post.get('password')
+    confirm_password = post.get('confirm_password')
+
+    # Server-side validations
+    if not username or not email or not password or not confirm_password:
+        return None, "All required fields must be filled."
+
+    if password != confirm_password:
+        return None, "Passwords do not match."
+
+    return {
+        'username': username,
+        'email': email,
+        'password': password,
+        'dob': post.get('dob') or None,
+        'gender': post.get('gender'),
+        'marital_status': post.get('marital_status'),
+        'is_active': bool(post.get('is_active')),
+        'is_staff': bool(post.get('is_staff')),
+        'is_superuser': bool(post.get('is_superuser')),
+    }, None
+
+
+@admin_required(role='staff')
+def metrics_view(request):
+    """Request timings and auth counters in Prometheus text format."""
+    throttle = get_login_throttle()
+    pool = get_hashing_pool().stats()
+    lines = [perf_registry.prometheus().rstrip('\n')]
+    for stat, value in throttle.stats.items():
+        lines.append(f'# TYPE entryway_login_throttle_{stat}_total counter')
+        lines.append(f'entryway_login_throttle_{stat}_total {value}')
+    lines.append('# TYPE entryway_hashing_pool_in_flight gauge')
+    lines.append(f"entryway_hashing_pool_in_flight {pool['in_flight']}")
+    lines.append('# TYPE entryway_hashing_pool_rejected_total counter')
+    lines.append(f"entryway_hashing_pool_rejected_total {pool['rejected']}")
+    db = pool_stats()
+    lines.append('# TYPE entryway_db_connects_total counter')
+    lines.append(f"entryway_db_connects_total {db['connects']}")
+    for stat, value in db.get('pool', {}).items():
+        lines.append(f'# TYPE entryway_db_pool_{stat} gauge')
+        lines.append(f'entryway_db_pool_{stat} {value}')
+    audit_log = audit.get_audit_log()
+    for stat, value in audit_log.stats.items():
+        lines.append(f'# TYPE entryway_audit_events_{stat}_total counter')
+        lines.append(f'entryway_audit_events_{stat}_total {value}')
+    lines.append('# TYPE entryway_audit_events_pending gauge')
+    lines.append(f'entryway_audit_events_pending {audit_log.pending()}')
+    for stat, value in get_suggestion_cache().stats.items():
+        lines.append(f'# TYPE entryway_user_suggest_{stat}_total counter')
+        lines.append(f'entryway_user_suggest_{stat}_total {value}')
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@admin_required(role='staff')
+def db_pool_stats_view(request):
+    """Connection reuse counters and, when pooling, the psycopg pool stats."""
+    return JsonResponse(pool_stats())
+
+
+@admin_required
+def admin_create_user(request):
+    if request.method == 'POST':
+        fields, error = _clean_new_user(request.POST)
+        if error:
+            messages.error(request, error)
             return redirect('admin_create_user')
 
-        user = CustomUser(
-            username=username,
-            email=email,
-            password=make_password(password),
-            dob=dob,
-            gender=gender,
-            marital_status=marital_status,
-            is_active=is_active,
-            is_staff=is_staff,
-            is_superuser=is_superuser,
-        )
-        user.save()
+        fields['password'] = make_password(fields['password'])
+        user = CustomUser(**fields)
+        taken = _save_unique(user)
+        if taken:
+            messages.error(request, _collision_message(
+                taken, "Username already exists.", "Email already exists."))
+            return redirect('admin_create_user')
+        audit.record('user_created', target=user)
         messages.success(request, "User created successfully.")
         return redirect('admin_dashboard')
 
     return render(request, 'admin-panel/admin_create_user.html')
 
 
-@login_required(login_url='admin_login')
-@user_passes_test(is_admin, login_url='admin_login')
+@admin_required
+def admin_import_users(request):
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, "Choose a CSV file to import.")
+            return redirect('admin_import_users')
+
+        # Hashing a large file's passwords would outlast the worker timeout;
+        # the import runs as a job and the status page follows it
+        try:
+            job_id = queue_import(upload)
+        except ImportQueueFull:
+            messages.error(request, "Another import is still running. Try again once it has finished.")
+            return redirect('admin_import_users')
+        return redirect('admin_import_status', job_id=job_id)
+
+    return render(request, 'admin-panel/admin_import_users.html')
+
+
+@never_cache
+@admin_required
+def admin_import_status(request, job_id):
+    job = import_job_status(str(job_id))
+    if job is None:
+        raise Http404("No such import.")
+    if job['state'] == 'done':
+        if job['created']:
+            messages.success(request, f"{job['created']} user(s) imported.")
+        if job['failed']:
+            messages.warning(request, f"{job['failed']} row(s) were rejected.")
+    return render(request, 'admin-panel/admin_import_users.html', {
+        'job': job,
+        'errors': job.get('errors', []),
+    })
+
+
+def _form_value(value):
+    # Dates come back from the form as ISO strings
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+@admin_required
 def admin_edit_user(request, user_id):
-    user = get_object_or_404(CustomUser, id=user_id, is_deleted=False)
+    user = get_object_or_404(CustomUser.objects, id=user_id)
 
     if request.method == 'POST':
         username = request.POST.get('username').strip()
@@ -333,37 +620,36 @@ def admin_edit_user(request, user_id):
             messages.error(request, "Username and email are required.")
             return redirect('admin_edit_user', user_id=user.id)
 
-        # Check unique constraints only if values changed
-        if username != user.username and CustomUser.objects.filter(username=username).exists():
-            messages.error(request, "Username already exists.")
-            return redirect('admin_edit_user', user_id=user.id)
-
-        if email != user.email and CustomUser.objects.filter(email=email).exists():
-            messages.error(request, "Email already exists.")
+        changes = {
+            'username': username,
+            'email': email,
+            'dob': dob,
+            'gender': gender,
+            'marital_status': marital_status,
+            'is_active': bool(request.POST.get('is_active')),
+            'is_staff': bool(request.POST.get('is_staff')),
+            'is_superuser': bool(request.POST.get('is_superuser')),
+        }
+        changed = [field for field, value in changes.items() if _form_value(getattr(user, field)) != value]
+        for field, value in changes.items():
+            setattr(user, field, value)
+
+        taken = _save_unique(user, exclude_pk=user.pk)
+        if taken:
+            messages.error(request, _collision_message(
+                taken, "Username already exists.", "Email already exists."))
             return redirect('admin_edit_user', user_id=user.id)
-
-        user.username = username
-        user.email = email
-        user.dob = dob
-        user.gender = gender
-        user.marital_status = marital_status
-        user.is_active = bool(request.POST.get('is_active'))
-        user.is_staff = bool(request.POST.get('is_staff'))
-        user.is_superuser = bool(request.POST.get('is_superuser'))
-
-        user.save()
+        audit.record('user_updated', target=user, fields=changed)
         messages.success(request, "User updated successfully.")
         return redirect('admin_dashboard')
 
     return render(request, 'admin-panel/admin_edit_user.html', {'user': user})
 
 
-@login_required(login_url='admin_login')
-@user_passes_test(is_admin, login_url='admin_login')
+@admin_required
 def admin_soft_delete_user(request, user_id):
-    user = get_object_or_404(CustomUser, id=user_id)
-    user.is_deleted = True
-    user.save()
+    if not CustomUser.objects.filter(id=user_id).soft_delete():
+        get_object_or_404(CustomUser.all_objects, id=user_id)
     messages.success(request, "User soft-deleted")
     return redirect('admin_dashboard')
 
@@ -372,3 +658,218 @@ def admin_logout_view(request):
     logout(request)
     messages.success(request, "Admin logged out")
     return redirect('admin_login')
+
+
+# ================= Async auth views ==================
+# Same behaviour as the views above, but PBKDF2 runs on the bounded pool in
+# web_app.hashing instead of pinning the worker, and a saturated pool answers
+# 503 straight away. Routed in place of the sync views when
+# settings.ASYNC_AUTH_VIEWS is on; serve them through Web_Base.asgi.
+
+def _hashing_busy():
+    response = HttpResponse(
+        "Too many sign-in attempts in progress, please retry shortly.",
+        status=503, content_type='text/plain')
+    response['Retry-After'] = '1'
+    return response
+
+
+async def _aprepare(request):
+    """
+    Resolve the lazy user and session up front, so templates rendered in the
+    event loop never fall back to a synchronous query.
+    """
+    request.user = await request.auser()
+    await request.session.aitems()
+    return request.user
+
+
+@csrf_protect
+@never_cache
+async def alogin_view(request):
+    if (await _aprepare(request)).is_authenticated:
+        return redirect('home')
+
+    if request.method == 'POST':
+        username = request.POST.get('username', '').strip()
+        password = request.POST.get('password', '')
+
+        if not username or not password:
+            messages.error(request, "Both username and password are required.")
+            return redirect('login')
+
+        throttle = get_login_throttle()
+        retry_after = await throttle.acheck(request, username)
+        if retry_after:
+            return _login_throttled(request, 'login.html', retry_after)
+
+        try:
+            user = await aauthenticate(request, username=username, password=password)
+        except HashingPoolSaturated:
+            return _hashing_busy()
+        if user is None:
+            await throttle.arecord_failure(request, username)
+        else:
+            await throttle.arecord_success(request, username)
+
+        if user is not None:
+            if not user.is_deleted:
+                await alogin(request, user)
+                messages.success(request, "Login successful.")
+                return redirect('home')
+            else:
+                messages.error(request, "Your account has been deactivated.")
+                return redirect('login')
+        else:
+            messages.error(request, "Invalid username or password.")
+            return redirect('login')
+
+    return render(request, 'login.html')
+
+
+@csrf_protect
+@never_cache
+async def aregister_view(request):
+    await _aprepare(request)
+    if request.method == 'POST':
+        fields, error = _clean_registration(request.POST)
+        if error:
+            messages.error(request, error)
+            return redirect('register')
+
+        try:
+            fields['password'] = await get_hashing_pool().amake_password(fields['password'])
+        except HashingPoolSaturated:
+            return _hashing_busy()
+        user = CustomUser(**fields)
+        taken = await sync_to_async(_save_unique)(user)
+        if taken:
+            messages.error(request, _collision_message(
+                taken, "Username is already taken.", "Email is already registered."))
+            return redirect('register')
+        audit.record('register', target=user)
+
+        messages.success(request, "Registration successful. Please log in.")
+        return redirect('login')
+
+    return render(request, 'register.html')
+
+
+@csrf_protect
+@never_cache
+async def aadmin_login_view(request):
+    current = await _aprepare(request)
+    if current.is_authenticated and current.is_superuser:
+        return redirect('admin_dashboard')
+
+    if request.method == 'POST':
+        username = request.POST.get('username')
+        password = request.POST.get('password')
+
+        throttle = get_login_throttle()
+        retry_after = await throttle.acheck(request, username)
+        if retry_after:
+            return _login_throttled(request, 'admin-panel/admin_login.html', retry_after)
+
+        try:
+            user = await aauthenticate(request, username=username, password=password)
+        except HashingPoolSaturated:
+            return _hashing_busy()
+        if user is None:
+            await throttle.arecord_failure(request, username)
+        else:
+            await throttle.arecord_success(request, username)
+
+        if user and user.is_superuser:
+            await alogin(request, user)
+            messages.success(request, "Admin login successful.")
+            return redirect('admin_dashboard')
+        else:
+            messages.error(request, 'Invalid credentials or not an admin.')
+
+    return render(request, 'admin-panel/admin_login.html')
+
+
+@admin_required
+async def aadmin_create_user(request):
+    await _aprepare(request)
+    if request.method == 'POST':
+        fields, error = _clean_new_user(request.POST)
+        if error:
+            messages.error(request, error)
+            return redirect('admin_create_user')
+
+        try:
+            fields['password'] = await get_hashing_pool().amake_password(fields['password'])
+        except HashingPoolSaturated:
+            return _hashing_busy()
+        user = CustomUser(**fields)
+        taken = await sync_to_async(_save_unique)(user)
+        if taken:
+            messages.error(request, _collision_message(
+                taken, "Username already exists.", "Email already exists."))
+            return redirect('admin_create_user')
+        audit.record('user_created', target=user)
+        messages.success(request, "User created successfully.")
+        return redirect('admin_dashboard')
+
+    return render(request, 'admin-panel/admin_create_user.html')
+
+
+# ================= Async page views ==================
+# The I/O-bound pages, on the async ORM and cache APIs. Routed in place of
+# the sync views when settings.ASYNC_VIEWS is on (the default with
+# SERVER_MODE=asgi), so a request waiting on the database or cache holds no
+# worker thread.
+
+@csrf_protect
+@never_cache
+async def awelcome_view(request):
+    if (await _aprepare(request)).is_authenticated or len(messages.get_messages(request)):
+        return render(request, 'welcome.html')
+    key = _anonymous_page_key('welcome.html')
+    content = await cache.aget(key)
+    if content is not None:
+        return HttpResponse(content)
+    response = render(request, 'welcome.html')
+    if _shareable(request, response):
+        await cache.aset(key, response.content, timeout=settings.TEMPLATE_CACHE_TIMEOUT)
+    return response
+
+
+@login_required(login_url='login')
+@never_cache
+async def ahome_view(request):
+    await _aprepare(request)
+    return render(request, 'home.html')
+
+
+async def alogout_view(request):
+    await alogout(request)
+    messages.success(request, "You have been logged out successfully.")
+    return redirect('login')
+
+
+def _filter_and_facet_users(filters):
+    # Search backends may look up their index on their connection, and
+    # facets run their grouped query on a miss: both stay sync, in one trip
+    # off the event loop
+    search_backend = get_search_backend()
+    return filter_users(filters, search_backend), get_user_facets(filters['search'], search_backend)
+
+
+@never_cache
+@admin_required
+async def aadmin_dashboard(request):
+    await _aprepare(request)
+    filters = get_user_filters(request)
+    users, facets = await sync_to_async(_filter_and_facet_users)(filters)
+    if facets is not None and not facets.stale:
+        count = facets.count(filters)
+    else:
+        count = await aapproximate_count(users)
+
+    paginator = CursorPaginator(users, 10, ordering=filters['ordering'])
+    page_obj = await paginator.aget_page(request.GET.get('cursor'), count=count)
+
+    return render(request, 'admin-panel/admin_dash.html', _dashboard_context(filters, page_obj, facets))